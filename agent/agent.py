@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 """Agent主程序入口"""
 import asyncio
+import os
 import signal
 import sys
-import subprocess
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # 支持直接运行和作为模块运行
@@ -19,7 +21,22 @@ if __name__ == "__main__":
     from system_monitor import SystemMonitor
     from websocket_client import WebSocketClient
     from task_executor import TaskExecutor
-    from workspace_manager import WorkspaceManager
+    from workspace_manager import WorkspaceManager, WorkspaceOperationCancelled
+    from log_batcher import LogBatcher
+    from process_utils import iter_stream_lines, process_group_kwargs, terminate_process_tree
+    from output_spool import OutputSpool
+    from result_reader import ResultTailer
+    from file_watcher import FileWatcher
+    from result_channel import ResultSocketServer
+    from git_cache import GitRepoCache
+    from slot_scheduler import SlotScheduler
+    from offline_spool import OfflineSpool
+    from file_transfer import FileTransferManager
+    from workspace_gc import WorkspaceGC
+    from sharding import (
+        resolve_shard_count, split_cases,
+        TEST_CASES_FILE_ENV, RESULTS_FILE_ENV, SHARD_INDEX_ENV, SHARD_COUNT_ENV
+    )
 else:
     # 作为模块运行时，使用相对导入
     from .config import Config, parse_args
@@ -28,7 +45,22 @@ else:
     from .system_monitor import SystemMonitor
     from .websocket_client import WebSocketClient
     from .task_executor import TaskExecutor
-    from .workspace_manager import WorkspaceManager
+    from .workspace_manager import WorkspaceManager, WorkspaceOperationCancelled
+    from .log_batcher import LogBatcher
+    from .process_utils import iter_stream_lines, process_group_kwargs, terminate_process_tree
+    from .output_spool import OutputSpool
+    from .result_reader import ResultTailer
+    from .file_watcher import FileWatcher
+    from .result_channel import ResultSocketServer
+    from .git_cache import GitRepoCache
+    from .slot_scheduler import SlotScheduler
+    from .offline_spool import OfflineSpool
+    from .file_transfer import FileTransferManager
+    from .workspace_gc import WorkspaceGC
+    from .sharding import (
+        resolve_shard_count, split_cases,
+        TEST_CASES_FILE_ENV, RESULTS_FILE_ENV, SHARD_INDEX_ENV, SHARD_COUNT_ENV
+    )
 
 
 class Agent:
@@ -49,10 +81,25 @@ class Agent:
         self.ws_client: Optional[WebSocketClient] = None
         self.task_executor: Optional[TaskExecutor] = None
         self.workspace_manager: Optional[WorkspaceManager] = None
+        self.git_cache: Optional[GitRepoCache] = None
+        self.file_transfer: Optional[FileTransferManager] = None
+        # 工作空间操作在专用线程池中执行，并限制同时执行的操作数
+        self.workspace_executor = ThreadPoolExecutor(
+            max_workers=self.config.workspace_max_workers,
+            thread_name_prefix="workspace"
+        )
+        self.workspace_semaphore: Optional[asyncio.Semaphore] = None  # 在start()中创建
+        self.workspace_ops: Dict[str, Tuple[asyncio.Task, threading.Event]] = {}  # request_id -> (任务, 取消标记)，包括搜索
+        self.slot_scheduler: Optional[SlotScheduler] = None
         self.monitor_task: Optional[asyncio.Task] = None
+        self.workspace_gc: Optional[WorkspaceGC] = None
+        self.gc_task: Optional[asyncio.Task] = None
         self.running = False
-        self.running_suites: Dict[str, subprocess.Popen] = {}  # suite_id -> process
+        self.running_suites: Dict[str, List[asyncio.subprocess.Process]] = {}  # suite_id -> 进程列表（分片执行时每个分片一个进程）
         self.suite_execution_ids: Dict[str, str] = {}  # suite_id -> execution_id
+        self.preparing_suites: Dict[str, asyncio.Task] = {}  # suite_id -> 准备阶段（代码更新等）的执行任务
+        self.suite_log_batchers: Dict[str, LogBatcher] = {}  # suite_id -> 日志批量发送器
+        self.suite_output_spools: Dict[str, OutputSpool] = {}  # suite_id -> 执行输出落盘器
 
     def setup(self) -> None:
         """初始化设置"""
@@ -77,6 +124,8 @@ class Agent:
                 # 初始化工作空间管理器
                 self.workspace_manager = WorkspaceManager(self.work_dir)
                 self.logger.info("工作空间管理器已初始化")
+                self.file_transfer = self._create_file_transfer()
+                self.git_cache = self._create_git_cache()
             except Exception as e:
                 self.logger.error(f"创建工作目录失败: {e}")
                 sys.exit(1)
@@ -85,11 +134,18 @@ class Agent:
         """WebSocket连接成功回调"""
         if self.logger:
             self.logger.info("已连接到云端平台")
+        # 新连接的第一次心跳发送完整节点信息
+        self.monitor.reset_heartbeat()
 
     async def on_disconnect(self) -> None:
         """WebSocket断开连接回调"""
         if self.logger:
             self.logger.warning("与云端平台断开连接")
+        # 断线后服务端的传输和搜索请求已失效
+        if self.file_transfer:
+            self.file_transfer.cancel_all()
+        for _, cancel_event in self.workspace_ops.values():
+            cancel_event.set()
 
     async def on_message(self, message: Dict[str, Any]) -> None:
         """
@@ -122,10 +178,37 @@ class Agent:
             await self._handle_workspace_delete(message)
         elif msg_type == "workspace_mkdir":
             await self._handle_workspace_mkdir(message)
+        elif msg_type == "workspace_signature":
+            await self._handle_workspace_signature(message)
+        elif msg_type == "workspace_sync_apply":
+            await self._handle_workspace_sync_apply(message)
+        elif msg_type == "workspace_sync_abort":
+            await self._handle_workspace_sync_abort(message)
+        elif msg_type == "workspace_cancel":
+            await self._handle_workspace_cancel(message)
+        elif msg_type == "workspace_search":
+            await self._handle_workspace_search(message)
+        elif msg_type == "workspace_search_cancel":
+            # 只设置取消标记，搜索线程在下一个文件前退出
+            op = self.workspace_ops.get(message.get("request_id"))
+            if op:
+                op[1].set()
+        elif msg_type in (
+            "workspace_stream_read",
+            "workspace_stream_write",
+            "workspace_stream_chunk",
+            "workspace_stream_ack",
+            "workspace_stream_end",
+            "workspace_stream_cancel"
+        ):
+            if self.file_transfer:
+                await self.file_transfer.handle_message(message)
         elif msg_type == "execute_test_suite":
             await self._handle_execute_test_suite(message)
         elif msg_type == "cancel_test_suite":
             await self._handle_cancel_test_suite(message)
+        elif msg_type == "suite_output_read":
+            await self._handle_suite_output_read(message)
         else:
             if self.logger:
                 self.logger.warning(f"未知消息类型: {msg_type}")
@@ -210,6 +293,11 @@ class Agent:
 
             # 初始化工作空间管理器
             self.workspace_manager = WorkspaceManager(self.work_dir)
+            self.file_transfer = self._create_file_transfer()
+            self.git_cache = self._create_git_cache()
+            if self.ws_client:
+                self.ws_client.set_offline_spool(self._create_offline_spool())
+            self._start_workspace_gc()
         except Exception as e:
             if self.logger:
                 self.logger.error(f"创建工作目录失败: {e}")
@@ -324,8 +412,121 @@ class Agent:
         if self.ws_client:
             await self.ws_client.send_task_log(task_id, level, message)
 
+    async def _submit_workspace_job(
+        self,
+        func: Callable[..., Any],
+        cancel_event: threading.Event,
+        *args: Any
+    ) -> asyncio.Future:
+        """
+        获取并发许可后将任务提交到工作空间线程池
+
+        许可在线程中的任务真正结束时才释放：等待方被取消后线程仍会运行到
+        下一次检查取消标记，期间继续占用许可，保证并发数限制有效。
+
+        Args:
+            func: 在线程池中执行的函数
+            cancel_event: 取消标记，获取许可后若已取消则不再提交
+            *args: 传给func的参数
+
+        Returns:
+            可等待的任务Future
+        """
+        await self.workspace_semaphore.acquire()
+        if cancel_event.is_set():
+            self.workspace_semaphore.release()
+            raise WorkspaceOperationCancelled("操作已取消")
+
+        loop = asyncio.get_event_loop()
+
+        def release(_future) -> None:
+            try:
+                loop.call_soon_threadsafe(self.workspace_semaphore.release)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+        try:
+            job = self.workspace_executor.submit(func, *args)
+        except BaseException:
+            self.workspace_semaphore.release()
+            raise
+        job.add_done_callback(release)
+        return asyncio.wrap_future(job, loop=loop)
+
+    def _start_workspace_op(
+        self,
+        message: Dict[str, Any],
+        response_type: str,
+        operation: Callable[[threading.Event], Any],
+        error_label: str
+    ) -> None:
+        """
+        在后台任务中执行工作空间操作（不阻塞消息接收）
+
+        Args:
+            message: 请求消息
+            response_type: 响应消息类型
+            operation: 在线程池中执行的操作，参数为取消标记
+            error_label: 失败时的日志描述
+        """
+        request_id = message.get("request_id")
+        cancel_event = threading.Event()
+        task = asyncio.create_task(
+            self._run_workspace_op(request_id, response_type, operation, cancel_event, error_label)
+        )
+        if request_id:
+            self.workspace_ops[request_id] = (task, cancel_event)
+
+    async def _run_workspace_op(
+        self,
+        request_id: Optional[str],
+        response_type: str,
+        operation: Callable[[threading.Event], Any],
+        cancel_event: threading.Event,
+        error_label: str
+    ) -> None:
+        """
+        执行工作空间操作：受并发数限制，在专用线程池中运行，可通过workspace_cancel取消
+
+        Args:
+            request_id: 请求ID
+            response_type: 响应消息类型
+            operation: 在线程池中执行的操作，参数为取消标记
+            cancel_event: 取消标记
+            error_label: 失败时的日志描述
+        """
+        try:
+            job = await self._submit_workspace_job(operation, cancel_event, cancel_event)
+            result = await job
+            response = {"type": response_type, "request_id": request_id, "success": True, "data": result}
+        except asyncio.CancelledError:
+            # 线程中的操作无法强制中断，设置取消标记让其尽快退出
+            cancel_event.set()
+            response = {"type": response_type, "request_id": request_id, "success": False, "error": "操作已取消"}
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"{error_label}: {e}")
+            response = {"type": response_type, "request_id": request_id, "success": False, "error": str(e)}
+        finally:
+            if request_id:
+                self.workspace_ops.pop(request_id, None)
+
+        if request_id and self.ws_client:
+            await self.ws_client.send_message(response)
+
+    async def _handle_workspace_cancel(self, message: Dict[str, Any]) -> None:
+        """处理工作空间操作取消请求（服务端等待超时或用户取消）"""
+        op = self.workspace_ops.get(message.get("request_id"))
+        if not op:
+            return
+        task, cancel_event = op
+        cancel_event.set()
+        task.cancel()
+        if self.logger:
+            self.logger.info(f"取消工作空间操作: request_id={message.get('request_id')}")
+
     async def _handle_workspace_list(self, message: Dict[str, Any]) -> None:
-        """处理工作空间文件列表请求"""
+        """处理工作空间文件列表请求（支持offset/limit分页）"""
         request_id = message.get("request_id")
         path = message.get("path", "")
 
@@ -344,140 +545,268 @@ class Agent:
                 })
             return
 
-        try:
-            if self.logger:
-                self.logger.info(f"开始列出文件: path={path}")
-            files = self.workspace_manager.list_files(path)
-            if self.logger:
-                self.logger.info(f"列出文件成功: 找到{len(files)}个文件/文件夹")
-            await self.ws_client.send_message({
-                "type": "workspace_list_response",
-                "request_id": request_id,
-                "success": True,
-                "data": files
-            })
-            if self.logger:
-                self.logger.info(f"已发送响应: request_id={request_id}")
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"列出文件失败: {e}")
-                import traceback
-                self.logger.error(traceback.format_exc())
-            if request_id and self.ws_client:
-                await self.ws_client.send_message({
-                    "type": "workspace_list_response",
-                    "request_id": request_id,
-                    "success": False,
-                    "error": str(e)
-                })
+        workspace_manager = self.workspace_manager
+        offset = int(message.get("offset") or 0)
+        limit = message.get("limit")
+        limit = int(limit) if limit is not None else None
+        self._start_workspace_op(
+            message,
+            "workspace_list_response",
+            lambda cancel_event: workspace_manager.list_files(path, offset, limit, cancel_event.is_set),
+            "列出文件失败"
+        )
 
     async def _handle_workspace_read(self, message: Dict[str, Any]) -> None:
         """处理工作空间文件读取请求"""
         if not self.workspace_manager or not self.ws_client:
             return
 
-        request_id = message.get("request_id")
+        workspace_manager = self.workspace_manager
         path = message.get("path")
         encoding = message.get("encoding", "utf-8")
-
-        try:
-            file_data = self.workspace_manager.read_file(path, encoding)
-            await self.ws_client.send_message({
-                "type": "workspace_read_response",
-                "request_id": request_id,
-                "success": True,
-                "data": file_data
-            })
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"读取文件失败: {e}")
-            await self.ws_client.send_message({
-                "type": "workspace_read_response",
-                "request_id": request_id,
-                "success": False,
-                "error": str(e)
-            })
+        self._start_workspace_op(
+            message,
+            "workspace_read_response",
+            lambda cancel_event: workspace_manager.read_file(path, encoding),
+            "读取文件失败"
+        )
 
     async def _handle_workspace_write(self, message: Dict[str, Any]) -> None:
         """处理工作空间文件写入请求"""
         if not self.workspace_manager or not self.ws_client:
             return
 
-        request_id = message.get("request_id")
+        workspace_manager = self.workspace_manager
         path = message.get("path")
         content = message.get("content")
         encoding = message.get("encoding", "utf-8")
         is_base64 = message.get("is_base64", False)
-
-        try:
-            result = self.workspace_manager.write_file(path, content, encoding, is_base64)
-            await self.ws_client.send_message({
-                "type": "workspace_write_response",
-                "request_id": request_id,
-                "success": True,
-                "data": result
-            })
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"写入文件失败: {e}")
-            await self.ws_client.send_message({
-                "type": "workspace_write_response",
-                "request_id": request_id,
-                "success": False,
-                "error": str(e)
-            })
+        self._start_workspace_op(
+            message,
+            "workspace_write_response",
+            lambda cancel_event: workspace_manager.write_file(path, content, encoding, is_base64),
+            "写入文件失败"
+        )
 
     async def _handle_workspace_delete(self, message: Dict[str, Any]) -> None:
         """处理工作空间文件删除请求"""
         if not self.workspace_manager or not self.ws_client:
             return
 
-        request_id = message.get("request_id")
+        workspace_manager = self.workspace_manager
         path = message.get("path")
-
-        try:
-            result = self.workspace_manager.delete_file(path)
-            await self.ws_client.send_message({
-                "type": "workspace_delete_response",
-                "request_id": request_id,
-                "success": True,
-                "data": result
-            })
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"删除文件失败: {e}")
-            await self.ws_client.send_message({
-                "type": "workspace_delete_response",
-                "request_id": request_id,
-                "success": False,
-                "error": str(e)
-            })
+        self._start_workspace_op(
+            message,
+            "workspace_delete_response",
+            lambda cancel_event: workspace_manager.delete_file(path, cancel_event.is_set),
+            "删除文件失败"
+        )
 
     async def _handle_workspace_mkdir(self, message: Dict[str, Any]) -> None:
         """处理工作空间文件夹创建请求"""
         if not self.workspace_manager or not self.ws_client:
             return
 
-        request_id = message.get("request_id")
+        workspace_manager = self.workspace_manager
         path = message.get("path")
+        self._start_workspace_op(
+            message,
+            "workspace_mkdir_response",
+            lambda cancel_event: workspace_manager.create_directory(path),
+            "创建文件夹失败"
+        )
+
+    async def _handle_workspace_signature(self, message: Dict[str, Any]) -> None:
+        """处理工作空间块签名请求（增量同步第一步）"""
+        if not self.workspace_manager or not self.ws_client:
+            return
+
+        workspace_manager = self.workspace_manager
+        path = message.get("path") or ""
+        self._start_workspace_op(
+            message,
+            "workspace_signature_response",
+            lambda cancel_event: workspace_manager.get_signatures(path, cancel_event.is_set),
+            "计算文件签名失败"
+        )
+
+    async def _handle_workspace_sync_apply(self, message: Dict[str, Any]) -> None:
+        """处理增量同步数据（服务端按批次发送，每批应用后回复）"""
+        if not self.workspace_manager or not self.ws_client:
+            return
+
+        workspace_manager = self.workspace_manager
+        path = message.get("path") or ""
+        sync_id = message.get("sync_id") or message.get("request_id") or ""
+        files = message.get("files") or []
+        deletes = message.get("deletes") or []
+        self._start_workspace_op(
+            message,
+            "workspace_sync_apply_response",
+            lambda cancel_event: workspace_manager.apply_sync(path, sync_id, files, deletes, cancel_event.is_set),
+            "增量同步失败"
+        )
+
+    async def _handle_workspace_sync_abort(self, message: Dict[str, Any]) -> None:
+        """处理增量同步中止通知（服务端同步失败或超时），清理该同步的临时文件"""
+        if not self.workspace_manager:
+            return
+
+        workspace_manager = self.workspace_manager
+        sync_id = message.get("sync_id") or ""
+        if self.logger:
+            self.logger.info(f"中止增量同步: sync_id={sync_id}")
+        self._start_workspace_op(
+            message,
+            "workspace_sync_abort_response",
+            lambda cancel_event: workspace_manager.abort_sync(sync_id),
+            "中止增量同步失败"
+        )
+
+    async def _handle_workspace_search(self, message: Dict[str, Any]) -> None:
+        """处理工作空间搜索请求（在后台任务中执行，不阻塞消息接收）"""
+        if not self.workspace_manager or not self.ws_client:
+            return
+
+        request_id = message.get("request_id")
+        cancel_event = threading.Event()
+        task = asyncio.create_task(self._run_workspace_search(request_id, message, cancel_event))
+        if request_id:
+            self.workspace_ops[request_id] = (task, cancel_event)
+
+    async def _run_workspace_search(
+        self,
+        request_id: str,
+        message: Dict[str, Any],
+        cancel_event: threading.Event
+    ) -> None:
+        """
+        执行工作空间搜索：与其他工作空间操作共用专用线程池和并发数限制，
+        在线程中逐文件搜索，匹配结果分批发送
+
+        Args:
+            request_id: 请求ID
+            message: 搜索请求
+            cancel_event: 取消标记
+        """
+        loop = asyncio.get_event_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stats: Dict[str, Any] = {}
+
+        def run_search() -> None:
+            try:
+                for match in self.workspace_manager.search_files(
+                    message.get("pattern") or "",
+                    path=message.get("path") or "",
+                    regex=bool(message.get("regex")),
+                    ignore_case=bool(message.get("ignore_case")),
+                    include=message.get("include"),
+                    exclude=message.get("exclude"),
+                    max_file_size=int(message.get("max_file_size") or 1024 * 1024 * 1024),
+                    max_hits=min(int(message.get("max_hits") or 1000), 10000),
+                    stats=stats,
+                    should_stop=cancel_event.is_set
+                ):
+                    loop.call_soon_threadsafe(queue.put_nowait, match)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
 
         try:
-            result = self.workspace_manager.create_directory(path)
             await self.ws_client.send_message({
-                "type": "workspace_mkdir_response",
+                "type": "workspace_search_start",
                 "request_id": request_id,
-                "success": True,
-                "data": result
+                "success": True
             })
+            try:
+                search_future = await self._submit_workspace_job(run_search, cancel_event)
+            except WorkspaceOperationCancelled:
+                return
+
+            error = None
+            finished = False
+            while not finished:
+                # 攒批发送：最多100条或等待0.2秒
+                batch = []
+                try:
+                    item = await queue.get()
+                    while True:
+                        if item is done:
+                            finished = True
+                            break
+                        if isinstance(item, Exception):
+                            error = item
+                        else:
+                            batch.append(item)
+                        if len(batch) >= 100:
+                            break
+                        item = await asyncio.wait_for(queue.get(), timeout=0.2)
+                except asyncio.TimeoutError:
+                    pass
+                if batch and not await self.ws_client.send_message({
+                    "type": "workspace_search_result",
+                    "request_id": request_id,
+                    "matches": batch
+                }):
+                    cancel_event.set()
+            await search_future
+
+            if cancel_event.is_set():
+                return
+            end_message = {
+                "type": "workspace_search_end",
+                "request_id": request_id,
+                "success": error is None,
+                "data": stats
+            }
+            if error is not None:
+                end_message["error"] = str(error)
+            await self.ws_client.send_message(end_message)
+        except asyncio.CancelledError:
+            # workspace_cancel取消任务时，让搜索线程尽快退出
+            cancel_event.set()
         except Exception as e:
             if self.logger:
-                self.logger.error(f"创建文件夹失败: {e}")
-            await self.ws_client.send_message({
-                "type": "workspace_mkdir_response",
-                "request_id": request_id,
-                "success": False,
-                "error": str(e)
-            })
+                self.logger.error(f"工作空间搜索失败: {e}")
+        finally:
+            self.workspace_ops.pop(request_id, None)
+
+    def _get_suite_output_dir(self, suite_id: str, execution_id: Optional[str]) -> Path:
+        """获取测试套某次执行的输出落盘目录"""
+        return self.work_dir / "suites" / suite_id / "output" / (execution_id or "latest")
+
+    async def _handle_suite_output_read(self, message: Dict[str, Any]) -> None:
+        """处理测试套执行输出读取请求（按字节偏移量读取落盘输出）"""
+        if not self.work_dir or not self.ws_client:
+            return
+
+        suite_id = message.get("suite_id")
+        execution_id = message.get("execution_id")
+
+        # 正在执行中的落盘器只在事件循环中访问：先在此刷新缓冲并取快照，
+        # 线程池中只读取快照，不触碰落盘器的文件句柄和分段列表
+        snapshot = None
+        output_spool = self.suite_output_spools.get(suite_id) if suite_id else None
+        if output_spool and output_spool.spool_dir == self._get_suite_output_dir(suite_id, execution_id):
+            snapshot = output_spool.snapshot()
+
+        def read_output(cancel_event: threading.Event) -> Dict[str, Any]:
+            if not suite_id:
+                raise ValueError("缺少suite_id")
+            offset = int(message.get("offset", 0))
+            length = min(int(message.get("length", 1024 * 1024)), 4 * 1024 * 1024)
+            if snapshot is not None:
+                return OutputSpool.read_snapshot(snapshot, offset, length)
+            return OutputSpool.read_range(self._get_suite_output_dir(suite_id, execution_id), offset, length)
+
+        self._start_workspace_op(
+            message,
+            "suite_output_read_response",
+            read_output,
+            "读取测试套输出失败"
+        )
 
     async def _handle_execute_test_suite(self, message: Dict[str, Any]) -> None:
         """处理测试套执行请求"""
@@ -494,6 +823,7 @@ class Agent:
         case_ids = message.get("case_ids", [])
         case_codes = message.get("case_codes", [])  # 从消息中获取case_codes
         executor_id = message.get("executor_id", "system")
+        timeout = message.get("timeout")  # 单次执行超时（秒），未指定时使用task.timeout配置
 
         if self.logger:
             self.logger.info(f"收到测试套执行请求: suite_id={suite_id}, execution_id={execution_id}, cases={len(case_ids)}")
@@ -508,8 +838,8 @@ class Agent:
                 self.logger.error(f"测试套执行请求缺少必要参数: suite_id={suite_id}, execution_command={execution_command}, case_ids={case_ids}")
             return
 
-        # 检查是否已经在执行
-        if suite_id in self.running_suites:
+        # 检查是否已经在执行（包括仍在更新代码的测试套）
+        if suite_id in self.running_suites or suite_id in self.preparing_suites:
             if self.logger:
                 self.logger.warning(f"测试套 {suite_id} 正在执行中，忽略重复请求")
             return
@@ -518,7 +848,8 @@ class Agent:
         self.suite_execution_ids[suite_id] = execution_id
 
         # 在后台执行测试套（先启动任务，然后在任务内部发送开始日志）
-        asyncio.create_task(self._execute_test_suite_async(
+        # 进程启动前的准备阶段（代码更新等）可通过取消该任务中断
+        self.preparing_suites[suite_id] = asyncio.create_task(self._execute_test_suite_async(
             suite_id=suite_id,
             plan_id=plan_id,
             execution_id=execution_id,  # 传递执行ID
@@ -528,7 +859,8 @@ class Agent:
             execution_command=execution_command,
             case_ids=case_ids,
             case_codes=case_codes,  # 传递case_codes
-            executor_id=executor_id
+            executor_id=executor_id,
+            timeout=timeout
         ))
 
     async def _handle_cancel_test_suite(self, message: Dict[str, Any]) -> None:
@@ -542,6 +874,11 @@ class Agent:
         if self.logger:
             self.logger.info(f"收到测试套取消指令: {suite_id}")
 
+        if suite_id in self.preparing_suites:
+            # 准备阶段（包括分片进程尚未全部启动时）取消执行任务，已启动的进程由任务负责终止
+            await self._cancel_preparing_suite(suite_id)
+            return
+
         if suite_id not in self.running_suites:
             if self.logger:
                 self.logger.warning(f"测试套 {suite_id} 不在执行中")
@@ -572,59 +909,24 @@ class Agent:
                         self.logger.info(f"已发送测试套完成消息（任务已完成）: suite_id={suite_id}, execution_id={execution_id}")
             return
 
-        process = self.running_suites[suite_id]
+        processes = self.running_suites[suite_id]
         execution_id = self.suite_execution_ids.get(suite_id)  # 获取execution_id
 
         try:
             # 发送取消日志
-            if self.ws_client:
-                log_msg = {
-                    "type": "test_suite_log",
-                    "suite_id": suite_id,
-                    "level": "warning",
-                    "message": "收到取消指令，正在终止执行...",
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-                if execution_id:
-                    log_msg["execution_id"] = execution_id
-                await self.ws_client.send_message(log_msg)
+            await self._send_suite_log(suite_id, execution_id, "warning", "收到取消指令，正在终止执行...")
 
             # 先从running_suites中移除，这样读取循环会检测到并退出
             del self.running_suites[suite_id]
 
-            # 终止进程（发送SIGTERM）
-            try:
-                process.terminate()
-            except ProcessLookupError:
-                # 进程已经不存在
-                if self.logger:
-                    self.logger.warning(f"进程 {suite_id} 已经不存在")
-
-            # 等待进程结束，如果5秒后还没结束，强制杀死
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                if self.logger:
-                    self.logger.warning(f"进程 {suite_id} 在5秒内未结束，强制杀死")
-                try:
-                    process.kill()
-                    process.wait()
-                except ProcessLookupError:
-                    # 进程已经不存在
-                    pass
+            # 终止整个进程树（先发送SIGTERM，超过宽限期还没结束则强制杀死）
+            await asyncio.gather(*(
+                terminate_process_tree(process, grace_period=self.config.kill_grace_period)
+                for process in processes
+            ))
 
             # 发送取消完成日志
-            if self.ws_client:
-                log_msg = {
-                    "type": "test_suite_log",
-                    "suite_id": suite_id,
-                    "level": "info",
-                    "message": "测试套执行已取消",
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-                if execution_id:
-                    log_msg["execution_id"] = execution_id
-                await self.ws_client.send_message(log_msg)
+            await self._send_suite_log(suite_id, execution_id, "info", "测试套执行已取消")
 
             # 发送取消完成状态消息给后端（确保状态同步）
             if self.ws_client and execution_id:
@@ -648,17 +950,128 @@ class Agent:
         except Exception as e:
             if self.logger:
                 self.logger.error(f"取消测试套失败: {e}")
-            if self.ws_client:
-                log_msg = {
-                    "type": "test_suite_log",
-                    "suite_id": suite_id,
-                    "level": "error",
-                    "message": f"取消测试套失败: {str(e)}",
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-                if execution_id:
-                    log_msg["execution_id"] = execution_id
-                await self.ws_client.send_message(log_msg)
+            await self._send_suite_log(suite_id, execution_id, "error", f"取消测试套失败: {str(e)}")
+
+    async def _cancel_preparing_suite(self, suite_id: str) -> None:
+        """
+        取消仍处于准备阶段（如克隆/更新代码）的测试套：取消执行任务，正在执行的git进程随之终止
+
+        Args:
+            suite_id: 测试套ID
+        """
+        task = self.preparing_suites.pop(suite_id)
+        execution_id = self.suite_execution_ids.get(suite_id)
+
+        await self._send_suite_log(suite_id, execution_id, "warning", "收到取消指令，正在终止代码更新...")
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"取消测试套准备任务失败: {e}")
+
+        await self._send_suite_log(suite_id, execution_id, "info", "测试套执行已取消")
+        if self.ws_client and execution_id:
+            await self.ws_client.send_message({
+                "type": "test_suite_completed",
+                "suite_id": suite_id,
+                "execution_id": execution_id,
+                "status": "cancelled",
+                "message": "测试套执行已取消"
+            })
+
+        if suite_id in self.suite_execution_ids:
+            del self.suite_execution_ids[suite_id]
+        if self.logger:
+            self.logger.info(f"测试套 {suite_id} 已在准备阶段取消")
+
+    async def _send_suite_log(
+        self,
+        suite_id: str,
+        execution_id: Optional[str],
+        level: str,
+        message: str
+    ) -> None:
+        """
+        发送测试套日志（执行中的测试套经由其批量发送器，保证与执行输出的顺序一致）
+
+        Args:
+            suite_id: 测试套ID
+            execution_id: 执行ID
+            level: 日志级别
+            message: 日志内容
+        """
+        log_batcher = self.suite_log_batchers.get(suite_id)
+        if log_batcher:
+            await log_batcher.add(level, message)
+            await log_batcher.flush()
+            return
+
+        if self.ws_client:
+            log_msg = {
+                "type": "test_suite_log",
+                "suite_id": suite_id,
+                "level": level,
+                "message": message,
+                "timestamp": datetime.utcnow().isoformat() + "Z"
+            }
+            if execution_id:
+                log_msg["execution_id"] = execution_id
+            await self.ws_client.send_message(log_msg)
+
+    def _create_file_transfer(self) -> FileTransferManager:
+        """创建工作空间文件流式传输管理器"""
+        async def send(message: Dict[str, Any]) -> bool:
+            if not self.ws_client:
+                return False
+            return await self.ws_client.send_message(message)
+
+        return FileTransferManager(self.workspace_manager, send, logger=self.logger)
+
+    def _create_offline_spool(self) -> OfflineSpool:
+        """创建离线发送缓存（位于工作目录的spool下）"""
+        return OfflineSpool(
+            self.work_dir / "spool",
+            max_bytes=self.config.offline_spool_max_bytes,
+            logger=self.logger
+        )
+
+    def _create_git_cache(self) -> GitRepoCache:
+        """创建Git仓库缓存（镜像位于工作目录的cache/git下）"""
+        return GitRepoCache(
+            self.work_dir / "cache" / "git",
+            shallow_depth=self.config.git_shallow_depth,
+            partial_clone_filter=self.config.git_partial_clone_filter,
+            fetch_timeout=self.config.git_fetch_timeout,
+            logger=self.logger
+        )
+
+    def _start_workspace_gc(self) -> None:
+        """创建工作空间清理并启动定期清理任务（工作目录变化时重新创建）"""
+        if self.gc_task:
+            self.gc_task.cancel()
+        self.workspace_gc = WorkspaceGC(
+            self.work_dir,
+            keep_days=self.config.keep_days,
+            keep_tasks=self.config.keep_tasks,
+            max_bytes=self.config.cleanup_max_bytes,
+            interval=self.config.cleanup_interval,
+            get_active_paths=self._get_active_paths,
+            logger=self.logger
+        )
+        self.gc_task = asyncio.create_task(self.workspace_gc.run_forever())
+
+    def _get_active_paths(self) -> List[Path]:
+        """正在使用的目录（排队/准备/执行中的测试套目录、执行中的任务目录），清理时跳过"""
+        paths = [
+            self.work_dir / "suites" / suite_id
+            for suite_id in set(self.running_suites) | set(self.preparing_suites)
+        ]
+        if self.task_executor:
+            paths.extend(self.work_dir / "tasks" / task_id for task_id in self.task_executor.tasks)
+        return paths
 
     async def _execute_test_suite_async(
         self,
@@ -671,43 +1084,80 @@ class Agent:
         execution_command: str,
         case_ids: List[str],
         case_codes: List[str],  # 添加case_codes参数
-        executor_id: str
+        executor_id: str,
+        timeout: Optional[int] = None
     ) -> None:
-        """异步执行测试套"""
-        import subprocess
+        """异步执行测试套（timeout为进程运行阶段的超时秒数，None时使用task.timeout配置，0表示不限制）"""
         import shutil
-        from pathlib import Path
 
         if not self.work_dir or not self.ws_client:
             return
 
         suite_work_dir = self.work_dir / "suites" / suite_id
+        # 测试套已登记为准备中，等待正在进行的清理删除完成后再使用目录
+        if self.workspace_gc:
+            await self.workspace_gc.wait_idle()
         suite_work_dir.mkdir(parents=True, exist_ok=True)
 
+        # 日志批量发送器：逐行日志合并后按时间/大小批量上报
+        log_batcher = LogBatcher(
+            self.ws_client.send_message,
+            suite_id=suite_id,
+            execution_id=execution_id,
+            flush_interval=self.config.log_batch_interval,
+            max_bytes=self.config.log_batch_max_bytes,
+            logger=self.logger
+        )
+        log_batcher.start()
+        self.suite_log_batchers[suite_id] = log_batcher
+
+        # 执行输出落盘（内存中只保留有限尾部用于错误上报）
+        output_spool = OutputSpool(
+            self._get_suite_output_dir(suite_id, execution_id),
+            segment_bytes=self.config.output_segment_bytes,
+            max_segments=self.config.output_max_segments,
+            tail_bytes=self.config.output_tail_bytes,
+            logger=self.logger
+        )
+        output_spool.open()
+        self.suite_output_spools[suite_id] = output_spool
+
         # 辅助函数：发送日志（自动包含execution_id和时间戳）
         async def send_log(level: str, message: str):
             """发送日志消息，自动包含execution_id和时间戳"""
-            if self.ws_client:
-                # 为每行日志添加时间戳前缀
-                timestamp = datetime.utcnow()
-                timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # 保留毫秒（3位）
-                timestamp_prefix = f"[{timestamp_str}]"
+            await log_batcher.add(level, message)
 
-                # 如果消息包含多行，为每行添加时间戳
-                lines = message.split('\n')
-                formatted_lines = [f"{timestamp_prefix} {line}" for line in lines]
-                formatted_message = '\n'.join(formatted_lines)
+        queued_notified = False
 
+        async def on_queued(position: int, reason: str):
+            """测试套在本地排队时通知服务器（排队位置或原因变化时调用）"""
+            nonlocal queued_notified
+            queued_notified = True
+            await send_log("info", f"等待执行槽位（排队位置: {position}）: {reason}")
+            await log_batcher.flush()
+            await self.ws_client.send_message({
+                "type": "test_suite_queued",
+                "suite_id": suite_id,
+                "execution_id": execution_id,
+                "queued": True,
+                "position": position,
+                "reason": reason
+            })
+
+        slot_acquired = False
+        try:
+            # 获取执行槽位（并发已满或资源不足时排队，排队期间可被取消）
+            await self.slot_scheduler.acquire(suite_id, on_queued=on_queued)
+            slot_acquired = True
+            if queued_notified:
+                await send_log("info", "已获得执行槽位，开始执行")
                 await self.ws_client.send_message({
-                    "type": "test_suite_log",
+                    "type": "test_suite_queued",
                     "suite_id": suite_id,
                     "execution_id": execution_id,
-                    "level": level,
-                    "message": formatted_message,
-                    "timestamp": timestamp.isoformat() + "Z"
+                    "queued": False
                 })
 
-        try:
             if self.logger:
                 self.logger.info(f"开始执行测试套: {suite_id}, execution_id={execution_id}")
                 self.logger.info(f"工作目录: {suite_work_dir}")
@@ -727,85 +1177,32 @@ class Agent:
             # 注意：所有git操作（fetch, checkout, pull, clone）都在此if块内
             # 如果没有git配置，将跳过所有git操作，直接使用工作目录执行命令
             if has_git_config:
+                # 仓库镜像按URL共享，测试套目录下只保留worktree
                 repo_dir = suite_work_dir / "repo"
-                if repo_dir.exists():
-                    # 如果已存在，更新代码
-                    log_msg = "代码目录已存在，更新代码..."
-                    await send_log("info", log_msg)
-                    if self.logger:
-                        self.logger.info(log_msg)
-                    try:
-                        fetch_result = subprocess.run(
-                            ["git", "fetch", "origin"],
-                            cwd=repo_dir,
-                            check=True,
-                            capture_output=True,
-                            text=True,
-                            timeout=60
-                        )
-                        if fetch_result.stdout:
-                            await send_log("info", fetch_result.stdout.strip())
-
-                        checkout_result = subprocess.run(
-                            ["git", "checkout", git_branch],
-                            cwd=repo_dir,
-                            check=True,
-                            capture_output=True,
-                            text=True,
-                            timeout=30
-                        )
-                        if checkout_result.stdout:
-                            await send_log("info", checkout_result.stdout.strip())
-
-                        pull_result = subprocess.run(
-                            ["git", "pull", "origin", git_branch],
-                            cwd=repo_dir,
-                            check=True,
-                            capture_output=True,
-                            text=True,
-                            timeout=60
-                        )
-                        if pull_result.stdout:
-                            await send_log("info", pull_result.stdout.strip())
-                    except subprocess.CalledProcessError as e:
-                        error_msg = f"更新代码失败，尝试重新克隆: {e}"
-                        await send_log("warning", error_msg)
-                        if self.logger:
-                            self.logger.warning(error_msg)
-                        shutil.rmtree(repo_dir)
-                        repo_dir.mkdir(parents=True, exist_ok=True)
+                if not self.git_cache:
+                    self.git_cache = self._create_git_cache()
 
-                if not repo_dir.exists() or not (repo_dir / ".git").exists():
-                    # 克隆代码
-                    log_msg = f"克隆代码仓库: {git_repo_url} (分支: {git_branch})"
-                    await send_log("info", log_msg)
-                    if self.logger:
-                        self.logger.info(log_msg)
-
-                    # 构建带token的Git URL
-                    if git_token:
-                        # 从URL中提取仓库路径
-                        if "://" in git_repo_url:
-                            # https://github.com/user/repo.git -> https://token@github.com/user/repo.git
-                            url_parts = git_repo_url.split("://")
-                            if len(url_parts) == 2:
-                                git_url_with_token = f"{url_parts[0]}://{git_token}@{url_parts[1]}"
-                            else:
-                                git_url_with_token = git_repo_url
-                        else:
-                            git_url_with_token = git_repo_url
-                    else:
-                        git_url_with_token = git_repo_url
-
-                    clone_result = subprocess.run(
-                        ["git", "clone", "-b", git_branch, git_url_with_token, str(repo_dir)],
-                        check=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=300
-                    )
-                    if clone_result.stdout:
-                        await send_log("info", clone_result.stdout.strip())
+                log_msg = f"更新代码仓库: {git_repo_url} (分支: {git_branch})"
+                await send_log("info", log_msg)
+                if self.logger:
+                    self.logger.info(log_msg)
+
+                async def send_git_output(line: str):
+                    """转发git进度输出"""
+                    await send_log("info", f"[git] {line}")
+
+                commit = await self.git_cache.prepare(
+                    git_repo_url,
+                    git_branch,
+                    repo_dir,
+                    token=git_token,
+                    on_output=send_git_output
+                )
+
+                log_msg = f"已检出提交 {commit[:12]} 到 {repo_dir}"
+                await send_log("info", log_msg)
+                if self.logger:
+                    self.logger.info(log_msg)
             else:
                 # 没有git配置，直接使用工作目录
                 repo_dir = suite_work_dir
@@ -852,247 +1249,266 @@ class Agent:
                 if self.logger:
                     self.logger.warning(f"case_codes和case_ids长度不匹配: case_codes={len(case_codes) if case_codes else 0}, case_ids={len(case_ids) if case_ids else 0}")
 
-            # 结果文件路径
-            test_results_file = xat_root_dir / "xat" / "test_results.json"
+            # 用例分片：拆分给多个工作进程并行执行，每个分片有独立的用例文件和结果文件
+            # （xat通过环境变量读取分片的用例文件，未配置分片时行为不变）
+            shard_count = 1
+            if case_code_to_id:
+                shard_count = resolve_shard_count(
+                    self.config.shard_count,
+                    len(case_codes),
+                    min_cases_per_shard=self.config.shard_min_cases,
+                    max_concurrent_tasks=self.config.max_concurrent_tasks
+                )
+            shards: List[Tuple[str, Dict[str, str]]] = [("", {})]  # [(输出行前缀, 额外环境变量)]
+            result_tailers: List[ResultTailer] = []
+            if shard_count > 1:
+                shards = []
+                shards_dir = suite_work_dir / "shards"
+                if shards_dir.exists():
+                    shutil.rmtree(shards_dir)
+                for index, (shard_codes, shard_ids) in enumerate(split_cases(case_codes, case_ids, shard_count)):
+                    shard_dir = ensure_dir(shards_dir / str(index))
+                    shard_cases_file = shard_dir / "test_cases.json"
+                    with open(shard_cases_file, 'w', encoding='utf-8') as f:
+                        json.dump({
+                            **test_cases_data,
+                            "case_codes": shard_codes,
+                            "case_ids": shard_ids,
+                            "shard_index": index,
+                            "shard_count": shard_count
+                        }, f, ensure_ascii=False, indent=2)
+                    shards.append((f"[分片{index + 1}/{shard_count}] ", {
+                        TEST_CASES_FILE_ENV: str(shard_cases_file),
+                        RESULTS_FILE_ENV: str(shard_dir / "test_results.jsonl"),
+                        SHARD_INDEX_ENV: str(index),
+                        SHARD_COUNT_ENV: str(shard_count)
+                    }))
+                    result_tailers.append(ResultTailer(shard_dir / "test_results.jsonl", logger=self.logger))
+                await send_log("info", f"用例分为 {shard_count} 个分片并行执行，共 {len(case_codes)} 个用例")
+            else:
+                # 结果文件路径（xat以JSONL格式追加写入，兼容旧版JSON数组格式）
+                result_tailers.append(ResultTailer(
+                    xat_root_dir / "xat" / "test_results.jsonl",
+                    legacy_file=xat_root_dir / "xat" / "test_results.json",
+                    logger=self.logger
+                ))
+            # 删除上一次执行遗留的结果文件，避免误报旧结果
+            for result_tailer in result_tailers:
+                result_tailer.reset()
 
             # 已上报的结果集合（避免重复上报）
             reported_results = set()
 
+            async def report_result(result_data: Dict[str, Any], log_output: str, source: str):
+                """上报单条用例结果"""
+                test_name = result_data.get("test_name")
+
+                # 检查是否已上报（避免重复）
+                if test_name in reported_results:
+                    return
+
+                # 获取case_id
+                case_id = result_data.get("case_id")
+                if not case_id:
+                    # 尝试通过case_code查找
+                    case_code = result_data.get("case_code")
+                    if case_code:
+                        case_id = case_code_to_id.get(case_code)
+                        if not case_id and self.logger:
+                            self.logger.warning(f"未找到case_code对应的case_id: case_code={case_code}, 可用映射: {list(case_code_to_id.keys())[:5]}")
+
+                if not case_id:
+                    if self.logger:
+                        self.logger.warning(f"跳过上报结果（未找到case_id）: test_name={test_name}, case_code={result_data.get('case_code')}, case_id={result_data.get('case_id')}")
+                    return
+
+                status = result_data.get("status", "error")
+                duration_val = result_data.get("duration", 0.0)
+                error_message = result_data.get("error")
+
+                # 转换duration格式
+                if isinstance(duration_val, (int, float)):
+                    duration_str = f"{duration_val:.2f}s"
+                else:
+                    duration_str = str(duration_val) if duration_val else None
+
+                send_success = await self.ws_client.send_message({
+                    "type": "test_suite_result",
+                    "suite_id": suite_id,
+                    "case_id": case_id,
+                    "result": status,
+                    "duration": duration_str,
+                    "log_output": log_output,
+                    "error_message": error_message,
+                    "executor_id": executor_id
+                })
+
+                if send_success:
+                    # 标记为已上报
+                    reported_results.add(test_name)
+                    if self.logger:
+                        self.logger.info(f"{source}上报用例结果成功: case_id={case_id}, status={status}, test_name={test_name}")
+                else:
+                    if self.logger:
+                        self.logger.error(f"{source}上报用例结果失败: case_id={case_id}, status={status}, test_name={test_name}, WebSocket可能未连接")
+
+            # 监听结果文件变化（Linux下基于inotify，结果写入后立即唤醒）
+            result_watcher = FileWatcher(
+                [
+                    path
+                    for result_tailer in result_tailers
+                    for path in (result_tailer.jsonl_file, result_tailer.legacy_file)
+                    if path
+                ],
+                poll_interval=0.5,
+                logger=self.logger
+            )
+            result_watcher.start()
+            results_done = asyncio.Event()
+
             # 启动文件监控任务（实时上报结果）
             async def monitor_test_results():
-                """监控测试结果文件并实时上报"""
+                """监控测试结果文件并实时上报（只解析新增的结果行）"""
                 if not self.ws_client:
                     return
 
-                wait_interval = 0.5  # 检查间隔（秒）
-
-                while suite_id in self.running_suites:
+                while not results_done.is_set():
                     try:
-                        if not test_results_file.exists():
-                            await asyncio.sleep(wait_interval)
-                            continue
-
-                        # 读取整个JSON数组
-                        try:
-                            with open(test_results_file, 'r', encoding='utf-8') as f:
-                                results = json.load(f)
-                                if not isinstance(results, list):
-                                    results = []
-
-                            # 处理新增的结果
-                            for result_data in results:
-                                test_name = result_data.get("test_name")
-
-                                # 检查是否已上报（避免重复）
-                                if test_name in reported_results:
-                                    continue
-
-                                # 获取case_id
-                                case_id = result_data.get("case_id")
-                                if not case_id:
-                                    # 尝试通过case_code查找
-                                    case_code = result_data.get("case_code")
-                                    if case_code:
-                                        case_id = case_code_to_id.get(case_code)
-                                        if not case_id and self.logger:
-                                            self.logger.warning(f"未找到case_code对应的case_id: case_code={case_code}, 可用映射: {list(case_code_to_id.keys())[:5]}")
-                                else:
-                                    if self.logger:
-                                        self.logger.debug(f"从结果数据中获取到case_id: {case_id}")
-
-                                if case_id:
-                                    status = result_data.get("status", "error")
-                                    duration = result_data.get("duration", 0.0)
-                                    error_message = result_data.get("error")
-
-                                    # 转换duration格式
-                                    if isinstance(duration, (int, float)):
-                                        duration_str = f"{duration:.2f}s"
-                                    else:
-                                        duration_str = str(duration) if duration else None
-
-                                    # 上报结果
-                                    send_success = await self.ws_client.send_message({
-                                        "type": "test_suite_result",
-                                        "suite_id": suite_id,
-                                        "case_id": case_id,
-                                        "result": status,
-                                        "duration": duration_str,
-                                        "log_output": "",  # 实时上报时可能还没有完整日志
-                                        "error_message": error_message,
-                                        "executor_id": executor_id
-                                    })
-
-                                    if send_success:
-                                        # 标记为已上报
-                                        reported_results.add(test_name)
-                                        if self.logger:
-                                            self.logger.info(f"实时上报用例结果成功: case_id={case_id}, status={status}, test_name={test_name}")
-                                    else:
-                                        if self.logger:
-                                            self.logger.error(f"实时上报用例结果失败: case_id={case_id}, status={status}, test_name={test_name}, WebSocket可能未连接")
-                                else:
-                                    if self.logger:
-                                        self.logger.warning(f"跳过上报结果（未找到case_id）: test_name={test_name}, case_code={result_data.get('case_code')}, case_id={result_data.get('case_id')}")
-
-                        except json.JSONDecodeError as e:
-                            if self.logger:
-                                self.logger.warning(f"解析结果文件失败: {e}")
-                        except Exception as e:
-                            if self.logger:
-                                self.logger.error(f"读取结果文件失败: {e}")
-
-                        # 等待一段时间后再次检查
-                        await asyncio.sleep(wait_interval)
-
+                        for result_tailer in result_tailers:
+                            for result_data in result_tailer.poll():
+                                # 实时上报时可能还没有完整日志
+                                await report_result(result_data, "", "实时")
                     except Exception as e:
                         if self.logger:
                             self.logger.error(f"监控结果文件出错: {e}")
-                        await asyncio.sleep(wait_interval)
+
+                    # 等待结果文件变化（超时兜底，防止遗漏事件）
+                    await result_watcher.wait(timeout=5.0)
 
             # 启动监控任务
             monitor_task = asyncio.create_task(monitor_test_results())
 
+            async def handle_result_message(message: Dict[str, Any]):
+                """处理xat通过结果流通道发送的消息（结果与用例边界）"""
+                message_type = message.get("type")
+                test_name = message.get("test_name")
+                if message_type == "result":
+                    if self.ws_client:
+                        await report_result(message, "", "实时")
+                elif message_type == "test_start":
+                    await send_log("info", f"===== 开始执行用例: {test_name} =====")
+                elif message_type == "test_end":
+                    await send_log("info", f"===== 用例执行结束: {test_name} =====")
+
+            # 启动结果流通道（Unix Socket），通过环境变量告知xat；不可用时xat回退到结果文件
+            process_env = None
+            result_server: Optional[ResultSocketServer] = None
+            if hasattr(asyncio, "start_unix_server"):
+                result_server = ResultSocketServer(handle_result_message, logger=self.logger)
+                try:
+                    await result_server.start()
+                    process_env = {**os.environ, **result_server.env()}
+                except Exception as e:
+                    if self.logger:
+                        self.logger.warning(f"启动结果流通道失败，使用结果文件: {e}")
+                    result_server = None
+
             # 2. 执行命令
             log_msg = f"开始执行命令: {execution_command}"
             await send_log("info", log_msg)
             if self.logger:
                 self.logger.info(log_msg)
 
-            # 在repo目录中执行命令
-            # 使用行缓冲模式，确保实时输出
-            process = subprocess.Popen(
-                execution_command,
-                shell=True,
-                cwd=repo_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,  # 行缓冲
-                universal_newlines=True
-            )
+            # 在repo目录中执行命令（异步子进程，读取输出不阻塞事件循环），分片执行时每个分片一个进程
+            # 每启动一个进程立即登记；全部启动前仍按准备阶段处理取消（取消任务）
+            processes: List[asyncio.subprocess.Process] = []
+            self.running_suites[suite_id] = processes
+            try:
+                for _, shard_env in shards:
+                    processes.append(await asyncio.create_subprocess_shell(
+                        execution_command,
+                        cwd=str(repo_dir),
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT,
+                        env={**(process_env or os.environ), **shard_env} if shard_env else process_env,
+                        limit=1024 * 1024,  # 单行缓冲上限，超长行分段读取
+                        **process_group_kwargs()  # 独立进程组，取消/超时时终止整个进程树
+                    ))
+            except BaseException:
+                # 启动分片期间被取消或启动失败：终止已启动的进程树，避免留下无人管理的进程组
+                await asyncio.gather(*(
+                    terminate_process_tree(process, grace_period=self.config.kill_grace_period)
+                    for process in processes
+                ), return_exceptions=True)
+                raise
 
-            log_output = ""
             start_time = datetime.now()
 
-            # 存储进程以便取消
-            self.running_suites[suite_id] = process
-            # 使用异步方式读取输出，避免阻塞
-            async def read_stdout():
-                """异步读取进程输出"""
-                nonlocal log_output  # 声明使用外部作用域的log_output变量
-                import select
-                import os
-
-                while True:
-                    # 检查进程是否已被取消（从running_suites中移除）
+            # 全部进程已启动，此后通过终止进程取消，不再取消任务
+            self.preparing_suites.pop(suite_id, None)
+
+            async def read_output(process: asyncio.subprocess.Process, prefix: str) -> None:
+                """逐行读取输出并实时发送到服务器（进程被取消后管道关闭，循环随之结束）"""
+                async for line in iter_stream_lines(process.stdout):
+                    await output_spool.write(prefix + line)
+                    await send_log("info", prefix + line.rstrip())
+                    if self.logger:
+                        self.logger.debug(f"[测试套执行] {prefix}{line.strip()}")
                     if suite_id not in self.running_suites:
                         if self.logger:
                             self.logger.info(f"测试套 {suite_id} 已被取消，停止读取输出")
                         break
 
-                    # 检查进程是否已结束（在每次循环中检查）
-                    poll_result = process.poll()
-
-                    # 使用select检查是否有数据可读（避免完全阻塞）
-                    import select
-                    import os
-
-                    line = None
+            async def finish_process(process: asyncio.subprocess.Process, prefix: str) -> None:
+                """等待进程结束并清理残留的后台子进程"""
+                # 等待进程结束（如果还没结束且未被取消）
+                # 注意：对于 tail -f 等阻塞命令，需要添加超时机制
+                if process.returncode is None:
+                    # 等待进程结束，最多等待 10 秒
+                    # 如果 10 秒后还没结束，强制终止（说明是 tail -f 这类阻塞命令）
                     try:
-                        # 检查文件描述符是否有数据可读
-                        if os.name == 'posix':  # Unix/Linux/Mac
-                            # 获取文件描述符
-                            fd = process.stdout.fileno()
-                            ready, _, _ = select.select([fd], [], [], 0.1)
-                            if ready:
-                                # 有数据可读，读取一行
-                                line = process.stdout.readline()
-                            elif poll_result is not None:
-                                # 进程已结束且没有数据可读，退出循环
-                                break
-                        else:  # Windows
-                            # Windows不支持select，使用readline（会短暂阻塞）
-                            # 但通过检查进程状态来避免长时间阻塞
-                            line = process.stdout.readline()
-                            if not line and poll_result is not None:
-                                # 进程已结束且没有更多输出
-                                break
-                    except (ValueError, OSError) as e:
-                        # 文件描述符可能已关闭
+                        await asyncio.wait_for(process.wait(), timeout=10)
+                    except asyncio.TimeoutError:
                         if self.logger:
-                            self.logger.debug(f"读取stdout时出错（可能已关闭）: {e}")
-                        break
-
-                    if line:
-                        log_output += line
-                        # 实时发送日志到服务器（使用send_log函数，自动包含execution_id）
-                        await send_log("info", line.rstrip())
-                        if self.logger:
-                            self.logger.debug(f"[测试套执行] {line.strip()}")
-                    elif poll_result is None:
-                        # 没有输出但进程还在运行，短暂休眠避免CPU占用过高
-                        await asyncio.sleep(0.05)
-                    else:
-                        # 进程已结束且没有更多输出，退出循环
-                        break
-
-            # 运行异步读取任务
-            await read_stdout()
-
-            # 进程结束后，读取所有剩余的缓冲区数据（关键修复）
-            # 进程可能已经结束，但缓冲区还有数据
-            import select
-            import os
-            while True:
-                poll_result = process.poll()
-                if poll_result is not None:
-                    # 进程已结束，尝试读取剩余数据
-                    if os.name == 'posix':
-                        fd = process.stdout.fileno()
-                        ready, _, _ = select.select([fd], [], [], 0.05)
-                        if ready:
-                            line = process.stdout.readline()
-                            if line:
-                                log_output += line
-                                await send_log("info", line.rstrip())
-                                if self.logger:
-                                    self.logger.debug(f"[测试套执行-剩余] {line.strip()}")
-                                continue  # 继续读取更多数据
-                        # 没有更多数据，退出
-                        break
-                    else:
-                        # Windows
-                        line = process.stdout.readline()
-                        if line:
-                            log_output += line
-                            await send_log("info", line.rstrip())
-                            continue
-                        break
+                            self.logger.warning(f"{prefix}命令执行超时，强制终止: {execution_command[:50]}...")
+                        await terminate_process_tree(process, grace_period=self.config.kill_grace_period)
+
+                # 命令退出后清理残留在进程组中的后台进程（服务、浏览器等），避免占用端口和CPU
+                if await terminate_process_tree(process, grace_period=self.config.kill_grace_period):
+                    await send_log("warning", f"{prefix}命令已退出，已终止残留的后台子进程")
+
+            async def run_processes() -> None:
+                """读取全部分片输出直到管道关闭，未取消时等待进程退出"""
+                await asyncio.gather(*(
+                    read_output(process, prefix) for process, (prefix, _) in zip(processes, shards)
+                ))
+                if suite_id in self.running_suites:
+                    await asyncio.gather(*(
+                        finish_process(process, prefix) for process, (prefix, _) in zip(processes, shards)
+                    ))
+
+            # 进程运行阶段整体超时：挂起的进程（如保持管道打开的浏览器）不会一直占用执行槽位
+            suite_timeout = self.config.default_timeout if timeout is None else timeout
+            timed_out = False
+            try:
+                if suite_timeout and suite_timeout > 0:
+                    await asyncio.wait_for(run_processes(), timeout=suite_timeout)
                 else:
-                    # 进程仍在运行（不应该在这里）
-                    break
+                    await run_processes()
+            except asyncio.TimeoutError:
+                timed_out = True
+                timeout_msg = f"测试套执行超时（超过{suite_timeout}秒），已终止进程树"
+                if self.logger:
+                    self.logger.warning(f"{timeout_msg}: {suite_id}")
+                await asyncio.gather(*(
+                    terminate_process_tree(process, grace_period=self.config.kill_grace_period)
+                    for process in processes
+                ), return_exceptions=True)
+                await send_log("error", timeout_msg)
 
             # 检查是否被取消
             was_cancelled = suite_id not in self.running_suites
 
-            # 等待进程结束（如果还没结束且未被取消）
-            # 注意：对于 tail -f 等阻塞命令，需要添加超时机制
-            if not was_cancelled and process.poll() is None:
-                # 等待进程结束，最多等待 10 秒
-                # 如果 10 秒后还没结束，强制终止（说明是 tail -f 这类阻塞命令）
-                try:
-                    process.wait(timeout=10)
-                except subprocess.TimeoutExpired:
-                    if self.logger:
-                        self.logger.warning(f"命令执行超时，强制终止: {execution_command[:50]}...")
-                    process.terminate()
-                    try:
-                        process.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        process.kill()
-                        process.wait()
-
             # 如果被取消，不继续上报结果
             if was_cancelled:
                 if self.logger:
@@ -1114,81 +1530,36 @@ class Agent:
             end_time = datetime.now()
             duration = str(end_time - start_time)
 
-            # 等待监控任务完成（给一点时间处理最后的结果）
-            await asyncio.sleep(2)
-            monitor_task.cancel()
-            try:
-                await monitor_task
-            except asyncio.CancelledError:
-                pass
+            # 处理结果流通道中尚未读取的消息
+            if result_server:
+                await result_server.drain(timeout=5.0)
+
+            # 进程已退出，结果文件不会再变化：通知监控任务结束，剩余结果由最后检查上报
+            results_done.set()
+            result_watcher.notify()
+            await monitor_task
 
             # 最后检查是否有遗漏的结果
-            if test_results_file.exists():
-                self.logger.info(f"test_results_file path is {test_results_file}")
+            if self.ws_client:
                 try:
-                    with open(test_results_file, 'r', encoding='utf-8') as f:
-                        results = json.load(f)
-                        if not isinstance(results, list):
-                            results = []
-
-                        for result_data in results:
-                            test_name = result_data.get("test_name")
-
-                            if test_name in reported_results:
-                                continue
-
-                            case_id = result_data.get("case_id")
-                            if not case_id:
-                                case_code = result_data.get("case_code")
-                                if case_code:
-                                    case_id = case_code_to_id.get(case_code)
-
-                            if case_id:
-                                status = result_data.get("status", "error")
-                                duration_val = result_data.get("duration", 0.0)
-                                error_message = result_data.get("error")
-
-                                if isinstance(duration_val, (int, float)):
-                                    duration_str = f"{duration_val:.2f}s"
-                                else:
-                                    duration_str = str(duration_val) if duration_val else None
-
-                                send_success = await self.ws_client.send_message({
-                                    "type": "test_suite_result",
-                                    "suite_id": suite_id,
-                                    "case_id": case_id,
-                                    "result": status,
-                                    "duration": duration_str,
-                                    "log_output": log_output,
-                                    "error_message": error_message,
-                                    "executor_id": executor_id
-                                })
-
-                                if send_success:
-                                    reported_results.add(test_name)
-                                    if self.logger:
-                                        self.logger.info(f"最后检查上报用例结果成功: case_id={case_id}, status={status}, test_name={test_name}")
-                                else:
-                                    if self.logger:
-                                        self.logger.error(f"最后检查上报用例结果失败: case_id={case_id}, status={status}, test_name={test_name}, WebSocket可能未连接")
-
-                except json.JSONDecodeError as e:
-                    if self.logger:
-                        self.logger.warning(f"解析结果文件失败: {e}")
+                    for result_tailer in result_tailers:
+                        for result_data in result_tailer.poll():
+                            await report_result(result_data, output_spool.tail(), "最后检查")
                 except Exception as e:
                     if self.logger:
                         self.logger.error(f"最后检查结果文件失败: {e}")
 
             # 发送执行完成日志
-            result_msg = f"测试套执行完成: 用例数={len(case_ids)}, 耗时={duration}, 已上报结果数={len(reported_results)}"
+            result_msg = f"测试套执行{'超时' if timed_out else '完成'}: 用例数={len(case_ids)}, 耗时={duration}, 已上报结果数={len(reported_results)}"
             await send_log("info", result_msg)
+            await log_batcher.flush()
 
             # 发送执行完成状态消息给后端（确保状态同步）
             if self.ws_client:
                 # 检查是否有失败的用例（通过已上报的结果判断）
                 # 注意：这里我们无法直接判断，因为结果已经上报了
                 # 但我们可以发送一个完成消息，让后端根据实际结果更新状态
-                await self.ws_client.send_message({
+                completed_message = {
                     "type": "test_suite_completed",
                     "suite_id": suite_id,
                     "execution_id": execution_id,
@@ -1196,53 +1567,22 @@ class Agent:
                     "reported_case_count": len(reported_results),
                     "total_case_count": len(case_ids),
                     "duration": duration
-                })
+                }
+                if timed_out:
+                    # 超时终止：已产生的结果照常上报，执行记录标记为失败
+                    completed_message["status"] = "failed"
+                    completed_message["message"] = timeout_msg
+                await self.ws_client.send_message(completed_message)
                 if self.logger:
                     self.logger.info(f"已发送测试套完成消息: suite_id={suite_id}, execution_id={execution_id}")
 
             if self.logger:
                 self.logger.info(f"测试套执行完成: {suite_id}, 用例数: {len(case_ids)}, 已上报结果数: {len(reported_results)}")
 
-        except subprocess.TimeoutExpired:
-            error_msg = "执行超时"
-            await send_log("error", f"测试套执行超时: {error_msg}")
-            if self.logger:
-                self.logger.error(f"测试套执行超时: {suite_id}")
-
-            # 取消监控任务
-            if 'monitor_task' in locals():
-                monitor_task.cancel()
-                try:
-                    await monitor_task
-                except asyncio.CancelledError:
-                    pass
-
-            # 为所有用例上报超时错误
-            for case_id in case_ids:
-                await self.ws_client.send_message({
-                    "type": "test_suite_result",
-                    "suite_id": suite_id,
-                    "case_id": case_id,
-                    "result": "error",
-                    "duration": None,
-                    "log_output": log_output if 'log_output' in locals() else "",
-                    "error_message": error_msg,
-                    "executor_id": executor_id
-                })
-            
-            # 发送超时完成状态消息
-            if self.ws_client and execution_id:
-                await self.ws_client.send_message({
-                    "type": "test_suite_completed",
-                    "suite_id": suite_id,
-                    "execution_id": execution_id,
-                    "status": "failed",  # 超时失败
-                    "message": "测试套执行超时"
-                })
-
         except Exception as e:
             error_msg = str(e)
             await send_log("error", f"测试套执行失败: {error_msg}")
+            await log_batcher.flush()
             if self.logger:
                 self.logger.exception(f"测试套执行失败: {suite_id}, 错误: {e}")
 
@@ -1262,7 +1602,7 @@ class Agent:
                     "case_id": case_id,
                     "result": "error",
                     "duration": None,
-                    "log_output": log_output if 'log_output' in locals() else "",
+                    "log_output": output_spool.tail(),
                     "error_message": error_msg,
                     "executor_id": executor_id
                 })
@@ -1281,6 +1621,8 @@ class Agent:
             # 清理进程引用
             if suite_id in self.running_suites:
                 del self.running_suites[suite_id]
+            if self.preparing_suites.get(suite_id) is asyncio.current_task():
+                del self.preparing_suites[suite_id]
             # 清理execution_id
             if suite_id in self.suite_execution_ids:
                 del self.suite_execution_ids[suite_id]
@@ -1291,21 +1633,48 @@ class Agent:
                     await monitor_task
                 except asyncio.CancelledError:
                     pass
-            # 清理临时目录（可选，保留以便调试）
-            # if suite_work_dir.exists():
-            #     shutil.rmtree(suite_work_dir)
-            pass
+            if 'result_watcher' in locals():
+                result_watcher.close()
+            # 释放执行槽位，唤醒排队中的测试套
+            if slot_acquired:
+                await self.slot_scheduler.release(suite_id)
+            # 进程树已退出（或从未获得槽位，如排队/准备阶段被取消、获得槽位前失败），
+            # 总是通知服务器当前槽位占用情况，以便下发队列中的下一个任务
+            if self.ws_client:
+                await self.ws_client.send_message({
+                    "type": "slot_released",
+                    "suite_id": suite_id,
+                    "execution_id": execution_id,
+                    "running": self.slot_scheduler.running_count,
+                    "max_concurrent": self.slot_scheduler.max_concurrent
+                })
+            if locals().get('result_server'):
+                await result_server.close()
+            # 发送剩余日志并停止批量发送器
+            if self.suite_log_batchers.get(suite_id) is log_batcher:
+                del self.suite_log_batchers[suite_id]
+            await log_batcher.close()
+            # 关闭输出落盘（落盘文件保留在执行目录中，可按偏移量读取）
+            if self.suite_output_spools.get(suite_id) is output_spool:
+                del self.suite_output_spools[suite_id]
+            await output_spool.close()
+            # 执行目录保留以便调试，由工作空间清理按保留策略回收
 
     async def _monitor_loop(self) -> None:
         """监控循环"""
         while self.running:
             try:
                 if self.ws_client and self.ws_client.connected:
-                    # 收集系统信息
-                    system_info = self.monitor.get_all_info(self.work_dir)
+                    # 收集系统信息（只包含变化超过阈值的字段）
+                    node_info = self.monitor.get_heartbeat_info(self.work_dir)
+                    # 附带最近一次工作空间清理结果
+                    gc_report = self.workspace_gc.pop_report() if self.workspace_gc else None
+                    if gc_report:
+                        node_info["workspace_gc"] = gc_report
 
-                    # 发送心跳
-                    await self.ws_client.send_heartbeat(system_info)
+                    # 发送心跳，失败时下一次发送完整信息
+                    if not await self.ws_client.send_heartbeat(node_info):
+                        self.monitor.reset_heartbeat()
 
                 # 等待指定间隔
                 await asyncio.sleep(self.config.monitor_interval)
@@ -1319,6 +1688,19 @@ class Agent:
         """启动Agent"""
         self.running = True
 
+        # 创建执行槽位调度器（本地并发与资源准入控制）
+        self.slot_scheduler = SlotScheduler(
+            max_concurrent=self.config.max_concurrent_tasks,
+            max_cpu_percent=self.config.admission_max_cpu_percent,
+            max_memory_percent=self.config.admission_max_memory_percent,
+            check_interval=self.config.admission_check_interval,
+            monitor=self.monitor,
+            logger=self.logger
+        )
+
+        # 限制同时执行的工作空间操作数（超出的请求排队等待）
+        self.workspace_semaphore = asyncio.Semaphore(self.config.workspace_max_concurrent)
+
         # 创建WebSocket客户端
         self.ws_client = WebSocketClient(
             server_url=self.config.server_url,
@@ -1326,8 +1708,13 @@ class Agent:
             on_message=self.on_message,
             on_connect=self.on_connect,
             on_disconnect=self.on_disconnect,
-            logger=self.logger
+            logger=self.logger,
+            max_log_backlog_bytes=self.config.log_max_backlog_bytes,
+            compression=self.config.ws_compression,
+            binary_encoding=self.config.ws_binary_encoding
         )
+        if self.work_dir:
+            self.ws_client.set_offline_spool(self._create_offline_spool())
 
         # 连接到服务器
         connected = await self.ws_client.connect()
@@ -1340,6 +1727,10 @@ class Agent:
         # 启动监控任务
         self.monitor_task = asyncio.create_task(self._monitor_loop())
 
+        # 启动工作空间定期清理
+        if self.work_dir and not self.gc_task:
+            self._start_workspace_gc()
+
         # 启动消息接收任务
         receive_task = asyncio.create_task(self.ws_client.receive_messages())
 
@@ -1378,10 +1769,18 @@ class Agent:
             except asyncio.CancelledError:
                 pass
 
+        if self.gc_task:
+            self.gc_task.cancel()
+
         # 关闭WebSocket连接
         if self.ws_client:
             await self.ws_client.close()
 
+        # 中止进行中的工作空间操作，不等待线程池排空
+        for _, cancel_event in self.workspace_ops.values():
+            cancel_event.set()
+        self.workspace_executor.shutdown(wait=False)
+
         if self.logger:
             self.logger.info("Agent已停止")
 
@@ -12,15 +12,37 @@ class Config:
     def __init__(self):
         self.token: Optional[str] = None
         self.server_url: str = "ws://localhost:8000/ws/agent"
+        self.ws_compression: bool = True  # WebSocket permessage-deflate压缩
+        self.ws_binary_encoding: bool = True  # 服务端支持时使用msgpack二进制编码（需安装msgpack）
         self.log_level: str = "INFO"
         self.work_dir: Optional[Path] = None
         self.max_concurrent_tasks: int = 1
-        self.default_timeout: int = 3600
+        self.admission_max_cpu_percent: Optional[float] = None  # 启动新测试套的CPU使用率上限（%）
+        self.admission_max_memory_percent: Optional[float] = None  # 启动新测试套的内存使用率上限（%）
+        self.admission_check_interval: float = 2.0  # 资源不足时重新检查的间隔（秒）
+        self.default_timeout: int = 3600  # 测试套进程运行超时（秒），0表示不限制
+        self.shard_count: Any = 0  # 测试套用例分片数：0/1不分片，"auto"按CPU核数/最大并发数，整数为上限
+        self.shard_min_cases: int = 20  # 每个分片的最少用例数
+        self.kill_grace_period: float = 5.0  # 取消/超时时SIGTERM后等待进程树退出的宽限期（秒）
         self.monitor_interval: int = 5
         self.keep_tasks: int = 10
         self.keep_days: int = 7
+        self.cleanup_max_bytes: int = 0  # 工作目录可回收部分的总大小上限，0表示不限制
+        self.cleanup_interval: float = 3600.0  # 工作空间清理间隔（秒）
         self.log_max_size: int = 10 * 1024 * 1024  # 10MB
         self.log_backup_count: int = 5
+        self.log_batch_interval: float = 0.2  # 测试套日志批量发送间隔（秒）
+        self.log_batch_max_bytes: int = 64 * 1024  # 测试套日志单批最大字节数
+        self.log_max_backlog_bytes: int = 4 * 1024 * 1024  # 发送队列中日志最大积压量，超过后丢弃最旧日志
+        self.output_segment_bytes: int = 8 * 1024 * 1024  # 测试套输出落盘单个分段大小
+        self.output_max_segments: int = 50  # 测试套输出最多保留的分段数
+        self.output_tail_bytes: int = 64 * 1024  # 内存中保留的输出尾部大小
+        self.offline_spool_max_bytes: int = 256 * 1024 * 1024  # 断线期间离线缓存的最大字节数
+        self.workspace_max_workers: int = 4  # 工作空间操作线程池大小
+        self.workspace_max_concurrent: int = 4  # 同时执行的工作空间操作数上限
+        self.git_shallow_depth: int = 0  # 仓库镜像浅克隆深度，0表示完整历史
+        self.git_partial_clone_filter: Optional[str] = None  # 部分克隆过滤器，如 blob:none
+        self.git_fetch_timeout: int = 300  # 镜像fetch超时时间（秒）
     
     @classmethod
     def from_args(cls, args: argparse.Namespace) -> "Config":
@@ -78,6 +100,10 @@ class Config:
                 server = data["server"]
                 if "url" in server:
                     self.server_url = server["url"]
+                if "compression" in server:
+                    self.ws_compression = bool(server["compression"])
+                if "binary_encoding" in server:
+                    self.ws_binary_encoding = bool(server["binary_encoding"])
             
             # 日志配置
             if "logging" in data:
@@ -89,6 +115,50 @@ class Config:
                 if "backup_count" in logging:
                     self.log_backup_count = logging["backup_count"]
             
+            # 测试套日志上报配置
+            if "log_stream" in data:
+                log_stream = data["log_stream"]
+                if "flush_interval_ms" in log_stream:
+                    self.log_batch_interval = log_stream["flush_interval_ms"] / 1000.0
+                if "flush_max_bytes" in log_stream:
+                    self.log_batch_max_bytes = log_stream["flush_max_bytes"]
+                if "max_backlog_bytes" in log_stream:
+                    self.log_max_backlog_bytes = log_stream["max_backlog_bytes"]
+            
+            # 测试套输出落盘配置
+            if "output_spool" in data:
+                output_spool = data["output_spool"]
+                if "segment_size" in output_spool:
+                    self.output_segment_bytes = output_spool["segment_size"]
+                if "max_segments" in output_spool:
+                    self.output_max_segments = output_spool["max_segments"]
+                if "tail_size" in output_spool:
+                    self.output_tail_bytes = output_spool["tail_size"]
+            
+            # 断线离线缓存配置
+            if "offline_spool" in data:
+                offline_spool = data["offline_spool"]
+                if "max_size" in offline_spool:
+                    self.offline_spool_max_bytes = offline_spool["max_size"]
+            
+            # 工作空间操作配置
+            if "workspace" in data:
+                workspace = data["workspace"]
+                if "max_workers" in workspace:
+                    self.workspace_max_workers = max(1, int(workspace["max_workers"]))
+                if "max_concurrent" in workspace:
+                    self.workspace_max_concurrent = max(1, int(workspace["max_concurrent"]))
+            
+            # Git仓库缓存配置
+            if "git" in data:
+                git = data["git"]
+                if "shallow_depth" in git:
+                    self.git_shallow_depth = git["shallow_depth"]
+                if "partial_clone_filter" in git:
+                    self.git_partial_clone_filter = git["partial_clone_filter"]
+                if "fetch_timeout" in git:
+                    self.git_fetch_timeout = git["fetch_timeout"]
+            
             # 任务配置
             if "task" in data:
                 task = data["task"]
@@ -96,12 +166,32 @@ class Config:
                     self.max_concurrent_tasks = task["max_concurrent"]
                 if "timeout" in task:
                     self.default_timeout = task["timeout"]
+                if "kill_grace_period" in task:
+                    self.kill_grace_period = task["kill_grace_period"]
+                if "sharding" in task:
+                    sharding = task["sharding"] or {}
+                    if "shards" in sharding:
+                        self.shard_count = sharding["shards"]
+                    if "min_cases_per_shard" in sharding:
+                        self.shard_min_cases = max(1, int(sharding["min_cases_per_shard"]))
+                if "admission" in task:
+                    admission = task["admission"] or {}
+                    if "max_cpu_percent" in admission:
+                        self.admission_max_cpu_percent = admission["max_cpu_percent"]
+                    if "max_memory_percent" in admission:
+                        self.admission_max_memory_percent = admission["max_memory_percent"]
+                    if "check_interval" in admission:
+                        self.admission_check_interval = admission["check_interval"]
                 if "cleanup" in task:
                     cleanup = task["cleanup"]
                     if "keep_tasks" in cleanup:
                         self.keep_tasks = cleanup["keep_tasks"]
                     if "keep_days" in cleanup:
                         self.keep_days = cleanup["keep_days"]
+                    if "max_size" in cleanup:
+                        self.cleanup_max_bytes = cleanup["max_size"]
+                    if "interval" in cleanup:
+                        self.cleanup_interval = cleanup["interval"]
             
             # 监控配置
             if "monitor" in data:
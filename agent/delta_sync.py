@@ -0,0 +1,285 @@
+"""增量同步模块 - rsync风格的块签名计算与增量应用"""
+import base64
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+MIN_BLOCK_SIZE = 2 * 1024
+MAX_BLOCK_SIZE = 64 * 1024
+
+# 未完成的同步超过该时间（秒）没有新数据即视为已中断，清理其临时文件
+SYNC_PARTIAL_TTL = 30 * 60
+
+# 同步临时文件名：.{原文件名}.{sync_id前8位}.sync
+SYNC_TEMP_PATTERN = re.compile(r"^\..+\.[0-9a-fA-F]{8}\.sync$")
+
+
+def _temp_path(target: Path, sync_id: str) -> Path:
+    """同步临时文件路径（与目标文件在同一目录，便于原子替换）"""
+    return target.with_name(f".{target.name}.{sync_id[:8]}.sync")
+
+
+def block_size_for(size: int) -> int:
+    """
+    根据文件大小选择块大小（约为文件大小的平方根，按1KB取整）
+
+    Args:
+        size: 文件大小（字节）
+
+    Returns:
+        块大小（字节）
+    """
+    block_size = (math.isqrt(size) // 1024 + 1) * 1024
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, block_size))
+
+
+def weak_checksum(block: bytes) -> int:
+    """
+    计算弱校验和（rsync滚动校验和：a为字节和，b为前缀和之和，各取低16位）
+
+    Args:
+        block: 数据块
+
+    Returns:
+        32位弱校验和
+    """
+    a = sum(block) & 0xFFFF
+    b = sum(accumulate(block)) & 0xFFFF
+    return a | (b << 16)
+
+
+def strong_checksum(block: bytes) -> str:
+    """计算强校验和（MD5前16位十六进制，仅用于确认弱校验和命中）"""
+    return hashlib.md5(block).hexdigest()[:16]
+
+
+def file_signature(file_path: Path) -> Dict[str, Any]:
+    """
+    计算文件的块签名
+
+    只对完整的块计算签名，末尾不足一块的部分由发送方作为字面数据发送。
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        签名：size, sha256, block_size, blocks（[[弱校验和, 强校验和], ...]）
+    """
+    size = file_path.stat().st_size
+    block_size = block_size_for(size)
+    digest = hashlib.sha256()
+    blocks: List[List[Any]] = []
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+            if len(block) == block_size:
+                blocks.append([weak_checksum(block), strong_checksum(block)])
+    return {
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "block_size": block_size,
+        "blocks": blocks
+    }
+
+
+def tree_signatures(root: Path, should_stop=None) -> Dict[str, Dict[str, Any]]:
+    """
+    计算目录树下所有文件的块签名
+
+    跳过增量同步的临时文件，其中超过SYNC_PARTIAL_TTL未修改的视为中断同步的残留并删除。
+
+    Args:
+        root: 目录
+        should_stop: 返回True时中止的回调（用于取消）
+
+    Returns:
+        {相对root的路径（/分隔）: 签名}，目录不存在时返回空字典
+    """
+    signatures: Dict[str, Dict[str, Any]] = {}
+    if not root.exists():
+        return signatures
+
+    for dir_path, _, file_names in os.walk(root):
+        for name in file_names:
+            if should_stop and should_stop():
+                raise InterruptedError("操作已取消")
+            file_path = Path(dir_path) / name
+            if file_path.is_symlink():
+                continue
+            if SYNC_TEMP_PATTERN.match(name):
+                _remove_stale_temp(file_path)
+                continue
+            relative_path = file_path.relative_to(root).as_posix()
+            try:
+                signatures[relative_path] = file_signature(file_path)
+            except OSError:
+                continue
+    return signatures
+
+
+def _remove_stale_temp(file_path: Path) -> None:
+    """删除超过SYNC_PARTIAL_TTL未修改的同步临时文件"""
+    try:
+        if time.time() - file_path.stat().st_mtime > SYNC_PARTIAL_TTL:
+            file_path.unlink()
+    except OSError:
+        pass
+
+
+class DeltaApplier:
+    """增量应用器
+
+    同一文件的增量可以分多条消息发送：每条消息的操作依次追加到临时文件，
+    收到final标记后校验sha256并原子替换目标文件。copy操作始终从原文件读取。
+    服务端同步失败时发送中止通知（abort），未收到通知的中断同步在SYNC_PARTIAL_TTL后清理。
+    """
+
+    def __init__(self):
+        # (sync_id, 目标文件路径) -> 临时文件路径
+        self._partials: Dict[tuple, Path] = {}
+        self._activity: Dict[str, float] = {}  # sync_id -> 最近一次应用的时间
+        self._aborted: "OrderedDict[str, None]" = OrderedDict()  # 最近中止的sync_id，之后到达的批次直接拒绝
+        self._lock = threading.Lock()
+
+    def apply(
+        self,
+        sync_id: str,
+        target: Path,
+        ops: List[List[Any]],
+        block_size: Optional[int],
+        final: bool,
+        sha256: Optional[str]
+    ) -> int:
+        """
+        应用一个文件的增量操作
+
+        Args:
+            sync_id: 同步ID
+            target: 目标文件路径
+            ops: 操作列表：["copy", 起始块序号, 块数] 或 ["data", base64数据]
+            block_size: 原文件签名使用的块大小（copy操作需要）
+            final: 是否为该文件的最后一部分
+            sha256: 目标内容的sha256（final时校验）
+
+        Returns:
+            写入的字节数
+        """
+        self.expire()
+        key = (sync_id, str(target))
+        with self._lock:
+            if sync_id in self._aborted:
+                raise ValueError("同步已中止")
+            self._activity[sync_id] = time.monotonic()
+            tmp_path = self._partials.get(key)
+            if tmp_path is None:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = _temp_path(target, sync_id)
+                tmp_path.write_bytes(b"")
+                self._partials[key] = tmp_path
+
+        written = 0
+        try:
+            source = open(target, "rb") if target.is_file() else None
+            try:
+                with open(tmp_path, "ab") as out:
+                    for op in ops:
+                        if op[0] == "copy":
+                            if source is None or not block_size:
+                                raise ValueError(f"原文件不存在，无法复制数据块: {target}")
+                            source.seek(op[1] * block_size)
+                            data = source.read(op[2] * block_size)
+                            if len(data) != op[2] * block_size:
+                                raise ValueError(f"原文件已变化，数据块不完整: {target}")
+                        elif op[0] == "data":
+                            data = base64.b64decode(op[1])
+                        else:
+                            raise ValueError(f"未知的增量操作: {op[0]}")
+                        out.write(data)
+                        written += len(data)
+            finally:
+                if source is not None:
+                    source.close()
+
+            if final:
+                with self._lock:
+                    self._partials.pop(key, None)
+                if sha256 and _file_sha256(tmp_path) != sha256:
+                    raise ValueError(f"同步后文件校验失败: {target}")
+                os.replace(tmp_path, target)
+        except Exception:
+            self.discard(sync_id, target)
+            raise
+        return written
+
+    def discard(self, sync_id: str, target: Path) -> None:
+        """丢弃未完成的临时文件"""
+        with self._lock:
+            tmp_path = self._partials.pop((sync_id, str(target)), None) or _temp_path(target, sync_id)
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+    def abort(self, sync_id: str) -> int:
+        """
+        中止一次同步：删除其所有未完成的临时文件，之后到达的该同步批次会被拒绝
+
+        Args:
+            sync_id: 同步ID
+
+        Returns:
+            删除的临时文件数
+        """
+        with self._lock:
+            self._aborted[sync_id] = None
+            while len(self._aborted) > 100:
+                self._aborted.popitem(last=False)
+        return self._discard_sync(sync_id)
+
+    def expire(self, max_idle: float = SYNC_PARTIAL_TTL) -> int:
+        """
+        清理超过max_idle秒没有新数据的未完成同步
+
+        Args:
+            max_idle: 最长空闲时间（秒）
+
+        Returns:
+            删除的临时文件数
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [sync_id for sync_id, last in self._activity.items() if now - last > max_idle]
+        return sum(self._discard_sync(sync_id) for sync_id in stale)
+
+    def _discard_sync(self, sync_id: str) -> int:
+        """删除某次同步的所有临时文件"""
+        with self._lock:
+            self._activity.pop(sync_id, None)
+            keys = [key for key in self._partials if key[0] == sync_id]
+            tmp_paths = [self._partials.pop(key) for key in keys]
+        for tmp_path in tmp_paths:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+        return len(tmp_paths)
+
+
+def _file_sha256(file_path: Path) -> str:
+    """计算文件sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,294 @@
+"""文件流式传输模块 - 工作空间文件的分块下载/上传（带流量控制）"""
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+
+# 消息发送函数：返回是否发送成功
+SendFunc = Callable[[Dict[str, Any]], Awaitable[bool]]
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_WINDOW = 8
+ACK_TIMEOUT = 60.0  # 等待对端确认数据块的超时时间（秒）
+
+
+class _Transfer:
+    """单个传输的状态"""
+
+    def __init__(self, request_id: str, window: int):
+        self.request_id = request_id
+        self.window = max(1, window)
+        self.acked = -1  # 已确认的最大数据块序号
+        self.cancelled = False
+        self.changed = asyncio.Event()
+
+        # 上传（服务端 -> Agent）
+        self.path: Optional[Path] = None
+        self.tmp_path: Optional[Path] = None
+        self.file = None
+        self.next_index = 0
+        self.received = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def ack(self, index: int) -> None:
+        if index > self.acked:
+            self.acked = index
+        self.changed.set()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.changed.set()
+
+    async def wait_window(self, index: int) -> None:
+        """等待直到序号为index的数据块可以发送（未确认的数据块数小于窗口）"""
+        while not self.cancelled and index - self.acked > self.window:
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), timeout=ACK_TIMEOUT)
+
+
+class FileTransferManager:
+    """工作空间文件流式传输管理器
+
+    下载：收到 ``workspace_stream_read`` 后先回复 ``workspace_stream_start``（文件大小等），
+    再按序发送二进制数据块 ``workspace_stream_chunk``，最后发送 ``workspace_stream_end``。
+    未被 ``workspace_stream_ack`` 确认的数据块不超过窗口大小。
+
+    上传：收到 ``workspace_stream_write`` 后打开临时文件并回复index为-1的确认，
+    之后每写入一个数据块回复一次确认；收到 ``workspace_stream_end`` 后原子替换目标文件。
+    """
+
+    def __init__(self, workspace_manager, send: SendFunc, logger=None):
+        """
+        初始化文件传输管理器
+
+        Args:
+            workspace_manager: WorkspaceManager实例（用于路径校验）
+            send: 消息发送函数
+            logger: 日志器
+        """
+        self.workspace_manager = workspace_manager
+        self._send = send
+        self.logger = logger
+        self._transfers: Dict[str, _Transfer] = {}
+
+    async def handle_message(self, message: Dict[str, Any]) -> None:
+        """
+        处理文件传输相关消息
+
+        Args:
+            message: 消息字典（workspace_stream_*）
+        """
+        msg_type = message.get("type")
+        request_id = message.get("request_id")
+        if not request_id:
+            return
+
+        if msg_type == "workspace_stream_read":
+            transfer = _Transfer(request_id, int(message.get("window") or DEFAULT_WINDOW))
+            self._transfers[request_id] = transfer
+            transfer.task = asyncio.create_task(self._send_file(transfer, message))
+        elif msg_type == "workspace_stream_write":
+            await self._open_upload(message)
+        elif msg_type == "workspace_stream_chunk":
+            await self._write_chunk(message)
+        elif msg_type == "workspace_stream_ack":
+            transfer = self._transfers.get(request_id)
+            if transfer:
+                transfer.ack(int(message.get("index", -1)))
+        elif msg_type == "workspace_stream_end":
+            await self._finish_upload(request_id)
+        elif msg_type == "workspace_stream_cancel":
+            self._cancel(request_id)
+
+    def cancel_all(self) -> None:
+        """取消所有传输（连接断开时调用）"""
+        for request_id in list(self._transfers):
+            self._cancel(request_id)
+
+    def _cancel(self, request_id: str) -> None:
+        """取消传输，上传中的临时文件会被删除"""
+        transfer = self._transfers.pop(request_id, None)
+        if not transfer:
+            return
+        transfer.cancel()
+        self._discard_upload(transfer)
+        if self.logger:
+            self.logger.info(f"文件传输已取消: request_id={request_id}")
+
+    async def _send_file(self, transfer: _Transfer, message: Dict[str, Any]) -> None:
+        """按块发送文件（支持范围读取）"""
+        request_id = transfer.request_id
+        sent = 0
+        index = 0
+        try:
+            file_path = self.workspace_manager.resolve_path(message.get("path") or "")
+            if not file_path.is_file():
+                raise FileNotFoundError(f"文件不存在: {message.get('path')}")
+
+            size = file_path.stat().st_size
+            offset = int(message.get("offset") or 0)
+            if offset < 0:
+                offset = size + offset  # 负数表示从文件末尾计算（HTTP后缀范围）
+            offset = min(max(offset, 0), size)
+            length = message.get("length")
+            end = size if length is None or int(length) < 0 else min(size, offset + int(length))
+            chunk_size = min(int(message.get("chunk_size") or DEFAULT_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+            await self._send({
+                "type": "workspace_stream_start",
+                "request_id": request_id,
+                "success": True,
+                "data": {
+                    "name": file_path.name,
+                    "size": size,
+                    "offset": offset,
+                    "length": end - offset
+                }
+            })
+
+            loop = asyncio.get_event_loop()
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                position = offset
+                while position < end and not transfer.cancelled:
+                    await transfer.wait_window(index)
+                    if transfer.cancelled:
+                        break
+                    data = await loop.run_in_executor(None, f.read, min(chunk_size, end - position))
+                    if not data:
+                        break  # 文件在读取过程中被截断
+                    if not await self._send({
+                        "type": "workspace_stream_chunk",
+                        "request_id": request_id,
+                        "index": index,
+                        "offset": position,
+                        "data": data
+                    }):
+                        raise ConnectionError("发送数据块失败")
+                    position += len(data)
+                    sent += len(data)
+                    index += 1
+
+            if not transfer.cancelled:
+                await self._send({
+                    "type": "workspace_stream_end",
+                    "request_id": request_id,
+                    "success": True,
+                    "data": {"size": sent, "chunks": index}
+                })
+        except asyncio.TimeoutError:
+            await self._send_error(request_id, f"等待确认超时（已发送 {sent} 字节）")
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"流式读取文件失败: {e}")
+            await self._send_error(request_id, str(e))
+        finally:
+            self._transfers.pop(request_id, None)
+
+    async def _open_upload(self, message: Dict[str, Any]) -> None:
+        """开始接收上传：写入同目录下的临时文件"""
+        request_id = message["request_id"]
+        transfer = _Transfer(request_id, int(message.get("window") or DEFAULT_WINDOW))
+        try:
+            file_path = self.workspace_manager.resolve_path(message.get("path") or "")
+            if file_path.is_dir():
+                raise ValueError(f"路径是目录: {message.get('path')}")
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            transfer.path = file_path
+            transfer.tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.part")
+            transfer.file = open(transfer.tmp_path, "wb")
+        except Exception as e:
+            self._discard_upload(transfer)
+            await self._send_error(request_id, f"写入文件失败: {e}")
+            return
+
+        self._transfers[request_id] = transfer
+        await self._send({
+            "type": "workspace_stream_ack",
+            "request_id": request_id,
+            "index": -1,
+            "window": transfer.window
+        })
+
+    async def _write_chunk(self, message: Dict[str, Any]) -> None:
+        """写入上传的数据块并确认"""
+        request_id = message["request_id"]
+        transfer = self._transfers.get(request_id)
+        if not transfer or transfer.file is None:
+            return
+
+        index = message.get("index")
+        if index != transfer.next_index:
+            self._transfers.pop(request_id, None)
+            self._discard_upload(transfer)
+            await self._send_error(request_id, f"数据块序号错误: 期望 {transfer.next_index}，收到 {index}")
+            return
+
+        data = message.get("data") or b""
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, transfer.file.write, data)
+        except OSError as e:
+            self._transfers.pop(request_id, None)
+            self._discard_upload(transfer)
+            await self._send_error(request_id, f"写入文件失败: {e}")
+            return
+
+        transfer.next_index += 1
+        transfer.received += len(data)
+        await self._send({
+            "type": "workspace_stream_ack",
+            "request_id": request_id,
+            "index": index
+        })
+
+    async def _finish_upload(self, request_id: str) -> None:
+        """上传完成：落盘并替换目标文件"""
+        transfer = self._transfers.pop(request_id, None)
+        if not transfer or transfer.file is None:
+            return
+        try:
+            transfer.file.flush()
+            os.fsync(transfer.file.fileno())
+            transfer.file.close()
+            transfer.file = None
+            os.replace(transfer.tmp_path, transfer.path)
+        except OSError as e:
+            self._discard_upload(transfer)
+            await self._send_error(request_id, f"写入文件失败: {e}")
+            return
+
+        await self._send({
+            "type": "workspace_stream_end",
+            "request_id": request_id,
+            "success": True,
+            "data": {
+                "size": transfer.received,
+                "path": str(transfer.path.relative_to(self.workspace_manager.work_dir))
+            }
+        })
+
+    def _discard_upload(self, transfer: _Transfer) -> None:
+        """关闭并删除上传的临时文件"""
+        if transfer.file is not None:
+            try:
+                transfer.file.close()
+            except OSError:
+                pass
+            transfer.file = None
+        if transfer.tmp_path:
+            try:
+                transfer.tmp_path.unlink()
+            except OSError:
+                pass
+
+    async def _send_error(self, request_id: str, error: str) -> None:
+        """发送传输失败消息"""
+        await self._send({
+            "type": "workspace_stream_end",
+            "request_id": request_id,
+            "success": False,
+            "error": error
+        })
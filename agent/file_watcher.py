@@ -0,0 +1,182 @@
+"""文件变化监听模块 - Linux下使用inotify，其他平台回退为轮询"""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class FileWatcher:
+    """文件变化监听器
+
+    监听若干文件（文件可以尚不存在），有变化时唤醒等待方。
+    Linux下通过inotify监听文件所在目录，事件经事件循环的add_reader
+    送达，不占用轮询开销；inotify不可用时按固定间隔比较文件大小和修改时间。
+    """
+
+    def __init__(self, paths: Iterable[Path], poll_interval: float = 0.5, logger=None):
+        """
+        初始化文件监听器
+
+        Args:
+            paths: 需要监听的文件路径列表
+            poll_interval: 轮询模式下的检查间隔（秒）
+            logger: 日志器
+        """
+        self.paths: List[Path] = [Path(p) for p in paths]
+        self.poll_interval = poll_interval
+        self.logger = logger
+
+        self._event = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inotify_fd: Optional[int] = None
+        self._watch_names: Dict[int, Set[str]] = {}  # wd -> 文件名集合
+        self._snapshot: List[Optional[Tuple[int, int]]] = []
+        self.backend = "polling"
+
+    def start(self) -> None:
+        """启动监听（优先使用inotify）"""
+        self._loop = asyncio.get_event_loop()
+        if sys.platform.startswith("linux"):
+            try:
+                self._start_inotify()
+                self.backend = "inotify"
+            except Exception as e:
+                self._close_inotify()
+                if self.logger:
+                    self.logger.debug(f"inotify不可用，使用轮询监听文件: {e}")
+        self._snapshot = self._take_snapshot()
+
+    def _start_inotify(self) -> None:
+        """初始化inotify并监听文件所在目录"""
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._inotify_fd = fd
+
+        directories: Dict[Path, Set[str]] = {}
+        for path in self.paths:
+            directories.setdefault(path.parent, set()).add(path.name)
+
+        for directory, names in directories.items():
+            wd = libc.inotify_add_watch(fd, os.fsencode(str(directory)), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"{os.strerror(errno)}: {directory}")
+            self._watch_names.setdefault(wd, set()).update(names)
+
+        self._loop.add_reader(fd, self._on_inotify_readable)
+
+    def _on_inotify_readable(self) -> None:
+        """读取inotify事件，命中监听文件时唤醒等待方"""
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"读取inotify事件失败: {e}")
+            self._event.set()
+            return
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW or name in self._watch_names.get(wd, ()):
+                self._event.set()
+
+    def _take_snapshot(self) -> List[Optional[Tuple[int, int]]]:
+        """获取文件状态快照（大小、修改时间），文件不存在时为None"""
+        snapshot = []
+        for path in self.paths:
+            try:
+                stat = path.stat()
+                snapshot.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                snapshot.append(None)
+        return snapshot
+
+    def notify(self) -> None:
+        """主动唤醒等待方（例如需要立即结束监听时）"""
+        self._event.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待文件变化
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            是否检测到变化（超时返回False）
+        """
+        if self._inotify_fd is not None:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+            self._event.clear()
+            return True
+
+        # 轮询模式
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            interval = self.poll_interval
+            if deadline is not None:
+                interval = min(interval, deadline - loop.time())
+                if interval <= 0:
+                    return False
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=interval)
+                self._event.clear()
+                return True
+            except asyncio.TimeoutError:
+                pass
+
+            snapshot = self._take_snapshot()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+
+    def _close_inotify(self) -> None:
+        """关闭inotify文件描述符"""
+        if self._inotify_fd is None:
+            return
+        if self._loop:
+            self._loop.remove_reader(self._inotify_fd)
+        try:
+            os.close(self._inotify_fd)
+        except OSError:
+            pass
+        self._inotify_fd = None
+        self._watch_names.clear()
+
+    def close(self) -> None:
+        """停止监听"""
+        self._close_inotify()
+        self._event.set()
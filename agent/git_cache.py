@@ -0,0 +1,396 @@
+"""Git仓库缓存模块 - 按仓库共享裸镜像，测试套使用独立worktree"""
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+try:
+    from .process_utils import terminate_process
+except ImportError:
+    from process_utils import terminate_process
+
+
+# git输出回调（接收一行进度/提示信息）
+OutputCallback = Callable[[str], Awaitable[None]]
+
+
+class GitCacheError(Exception):
+    """Git缓存操作失败"""
+    pass
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """
+    规范化仓库URL，用作缓存键
+
+    去除认证信息、协议、末尾的斜杠和.git后缀，主机名转为小写，
+    scp风格地址（git@host:path）与ssh://地址视为同一仓库。
+
+    Args:
+        repo_url: 仓库URL
+
+    Returns:
+        规范化后的 ``host/path`` 形式
+    """
+    url = repo_url.strip()
+    scp_match = re.match(r"^(?:[^@/]+@)?([^:/]+):(?!//)(.+)$", url)
+    if "://" not in url and scp_match:
+        host, path = scp_match.group(1), scp_match.group(2)
+    else:
+        parts = urlsplit(url)
+        host = (parts.hostname or "") + (f":{parts.port}" if parts.port else "")
+        path = parts.path
+
+    path = path.strip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    return f"{host.lower()}/{path}"
+
+
+def build_auth_url(repo_url: str, token: Optional[str]) -> str:
+    """
+    构建带token的Git URL
+
+    Args:
+        repo_url: 仓库URL
+        token: 访问token
+
+    Returns:
+        https://github.com/user/repo.git -> https://token@github.com/user/repo.git
+    """
+    if not token or "://" not in repo_url:
+        return repo_url
+    url_parts = repo_url.split("://")
+    if len(url_parts) != 2:
+        return repo_url
+    return f"{url_parts[0]}://{token}@{url_parts[1]}"
+
+
+class GitRepoCache:
+    """Git仓库缓存
+
+    每个仓库（按规范化URL）在缓存目录下维护一个裸镜像，每次只增量fetch
+    需要的分支；测试套通过 ``git worktree`` 检出到自己的目录，对象库共享，
+    不再为每个测试套保存完整克隆。超大仓库可配置浅克隆深度和部分克隆过滤器。
+
+    所有git命令以异步子进程执行，不阻塞事件循环；``--progress`` 输出逐行
+    交给回调，调用方所在任务被取消时正在执行的git进程会被终止。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        shallow_depth: int = 0,
+        partial_clone_filter: Optional[str] = None,
+        fetch_timeout: int = 300,
+        progress_interval: float = 1.0,
+        logger=None
+    ):
+        """
+        初始化仓库缓存
+
+        Args:
+            cache_dir: 镜像缓存目录
+            shallow_depth: 浅克隆深度，0表示完整历史
+            partial_clone_filter: 部分克隆过滤器（如 ``blob:none``），为空表示不过滤
+            fetch_timeout: fetch超时时间（秒）
+            progress_interval: 同一进度行（以\\r刷新）的最小上报间隔（秒）
+            logger: 日志器
+        """
+        self.cache_dir = Path(cache_dir)
+        self.shallow_depth = shallow_depth
+        self.partial_clone_filter = partial_clone_filter or None
+        self.fetch_timeout = fetch_timeout
+        self.progress_interval = progress_interval
+        self.logger = logger
+        self._locks: Dict[Path, asyncio.Lock] = {}  # 镜像目录 -> 锁（同一镜像的操作串行执行）
+
+    def get_mirror_dir(self, repo_url: str) -> Path:
+        """
+        获取仓库对应的镜像目录
+
+        Args:
+            repo_url: 仓库URL
+
+        Returns:
+            镜像目录路径
+        """
+        key = normalize_repo_url(repo_url)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+        name = re.sub(r"[^A-Za-z0-9._-]+", "-", key).strip("-")[-80:]
+        return self.cache_dir / f"{name}-{digest}.git"
+
+    def _get_lock(self, mirror_dir: Path) -> asyncio.Lock:
+        """获取镜像对应的锁"""
+        lock = self._locks.get(mirror_dir)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[mirror_dir] = lock
+        return lock
+
+    async def _run_git(
+        self,
+        args: List[str],
+        cwd: Optional[Path] = None,
+        timeout: int = 60,
+        on_output: Optional[OutputCallback] = None
+    ) -> str:
+        """
+        异步执行git命令
+
+        Args:
+            args: git参数（不含git本身）
+            cwd: 工作目录
+            timeout: 超时时间（秒）
+            on_output: 输出回调，接收stderr中的进度/提示行
+
+        Returns:
+            标准输出
+
+        Raises:
+            GitCacheError: 命令执行失败或超时
+        """
+        command = args[0]
+        env = dict(os.environ)
+        env["GIT_TERMINAL_PROMPT"] = "0"  # 认证失败时直接报错，不等待输入
+        process = await asyncio.create_subprocess_exec(
+            "git", *args,
+            cwd=str(cwd) if cwd else None,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env
+        )
+
+        stderr_lines: List[str] = []
+
+        async def communicate() -> bytes:
+            """同时读取stdout和stderr（stderr逐行上报进度）"""
+            progress_task = asyncio.ensure_future(
+                self._read_progress(process.stderr, stderr_lines, on_output)
+            )
+            try:
+                output = await process.stdout.read()
+                await progress_task
+            finally:
+                progress_task.cancel()
+            return output
+
+        try:
+            stdout = await asyncio.wait_for(communicate(), timeout=timeout)
+            returncode = await process.wait()
+        except asyncio.TimeoutError:
+            await terminate_process(process, grace_period=2)
+            raise GitCacheError(f"git {command} 超时（{timeout}s）")
+        except asyncio.CancelledError:
+            # 测试套被取消，终止正在执行的git进程
+            await terminate_process(process, grace_period=2)
+            raise
+
+        stdout_text = stdout.decode("utf-8", errors="replace")
+        if returncode != 0:
+            detail = "\n".join(stderr_lines[-5:]) or stdout_text.strip()
+            raise GitCacheError(f"git {command} 失败: {detail}")
+        return stdout_text
+
+    async def _read_progress(
+        self,
+        stream: asyncio.StreamReader,
+        lines: List[str],
+        on_output: Optional[OutputCallback]
+    ) -> None:
+        """
+        读取stderr中的进度输出
+
+        git的进度行以\\r原地刷新，完整行以\\n结束；完整行全部上报，
+        进度行按progress_interval限流，避免刷屏。
+        """
+        loop = asyncio.get_event_loop()
+        last_progress = 0.0
+        buffer = ""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += chunk.decode("utf-8", errors="replace")
+            parts = re.split(r"(\r|\n)", buffer)
+            buffer = parts.pop()  # 未结束的部分留到下次
+            for i in range(0, len(parts), 2):
+                line = parts[i].strip()
+                if not line:
+                    continue
+                is_progress = parts[i + 1] == "\r"
+                if is_progress:
+                    now = loop.time()
+                    if now - last_progress < self.progress_interval:
+                        continue
+                    last_progress = now
+                else:
+                    lines.append(line)
+                    del lines[:-20]
+                if on_output:
+                    await on_output(line)
+
+        line = buffer.strip()
+        if line:
+            lines.append(line)
+            if on_output:
+                await on_output(line)
+
+    async def _remove_dir(self, path: Path) -> None:
+        """在线程池中删除目录（大目录删除较慢）"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, shutil.rmtree, str(path), True)
+
+    async def _init_mirror(self, mirror_dir: Path, auth_url: str) -> None:
+        """创建空的裸镜像并配置远端"""
+        if mirror_dir.exists():
+            await self._remove_dir(mirror_dir)
+        mirror_dir.parent.mkdir(parents=True, exist_ok=True)
+        await self._run_git(["init", "--bare", str(mirror_dir)])
+        await self._run_git(["remote", "add", "origin", auth_url], cwd=mirror_dir)
+        if self.partial_clone_filter:
+            # 部分克隆：缺失的对象在检出时按需从远端获取
+            await self._run_git(["config", "core.repositoryformatversion", "1"], cwd=mirror_dir)
+            await self._run_git(["config", "extensions.partialClone", "origin"], cwd=mirror_dir)
+            await self._run_git(["config", "remote.origin.promisor", "true"], cwd=mirror_dir)
+            await self._run_git(["config", "remote.origin.partialclonefilter", self.partial_clone_filter], cwd=mirror_dir)
+
+    async def _is_valid_mirror(self, mirror_dir: Path) -> bool:
+        """检查镜像是否为可用的裸仓库"""
+        if not (mirror_dir / "HEAD").exists():
+            return False
+        try:
+            output = await self._run_git(["rev-parse", "--is-bare-repository"], cwd=mirror_dir)
+            return output.strip() == "true"
+        except GitCacheError:
+            return False
+
+    async def _fetch_branch(
+        self,
+        mirror_dir: Path,
+        auth_url: str,
+        branch: str,
+        on_output: Optional[OutputCallback] = None
+    ) -> str:
+        """增量fetch指定分支，返回分支最新提交"""
+        # token可能变化，每次更新远端地址
+        await self._run_git(["remote", "set-url", "origin", auth_url], cwd=mirror_dir)
+
+        fetch_args = ["fetch", "--progress", "--prune", "--no-tags"]
+        if self.shallow_depth > 0:
+            fetch_args.append(f"--depth={self.shallow_depth}")
+        if self.partial_clone_filter:
+            fetch_args.append(f"--filter={self.partial_clone_filter}")
+        fetch_args += ["origin", f"+refs/heads/{branch}:refs/heads/{branch}"]
+        await self._run_git(fetch_args, cwd=mirror_dir, timeout=self.fetch_timeout, on_output=on_output)
+
+        output = await self._run_git(["rev-parse", f"refs/heads/{branch}^{{commit}}"], cwd=mirror_dir)
+        return output.strip()
+
+    async def update_mirror(
+        self,
+        repo_url: str,
+        branch: str,
+        token: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None
+    ) -> str:
+        """
+        更新（必要时创建）仓库镜像中的指定分支
+
+        Args:
+            repo_url: 仓库URL
+            branch: 分支名
+            token: 访问token
+            on_output: git进度输出回调
+
+        Returns:
+            分支最新提交的SHA
+        """
+        mirror_dir = self.get_mirror_dir(repo_url)
+        auth_url = build_auth_url(repo_url, token)
+
+        async with self._get_lock(mirror_dir):
+            if not await self._is_valid_mirror(mirror_dir):
+                # 首次使用或镜像已损坏，重新创建（fetch失败不重建，避免网络抖动时丢弃整个缓存）
+                if self.logger:
+                    self.logger.info(f"创建仓库镜像: {normalize_repo_url(repo_url)} -> {mirror_dir}")
+                await self._init_mirror(mirror_dir, auth_url)
+
+            return await self._fetch_branch(mirror_dir, auth_url, branch, on_output)
+
+    async def checkout_worktree(
+        self,
+        repo_url: str,
+        commit: str,
+        worktree_dir: Path,
+        on_output: Optional[OutputCallback] = None
+    ) -> None:
+        """
+        将指定提交检出到测试套的worktree（分离HEAD，不占用镜像中的分支）
+
+        Args:
+            repo_url: 仓库URL
+            commit: 提交SHA
+            worktree_dir: worktree目录
+            on_output: git进度输出回调
+        """
+        mirror_dir = self.get_mirror_dir(repo_url)
+        worktree_dir = Path(worktree_dir)
+        git_marker = worktree_dir / ".git"
+
+        if git_marker.is_file():
+            # 已是worktree，直接切换提交
+            try:
+                await self._run_git(
+                    ["checkout", "--progress", "--detach", "--force", commit],
+                    cwd=worktree_dir,
+                    timeout=self.fetch_timeout,
+                    on_output=on_output
+                )
+                return
+            except GitCacheError as e:
+                if self.logger:
+                    self.logger.warning(f"切换worktree失败，重新创建: {e}")
+
+        # 旧版完整克隆或损坏的worktree，删除后重新创建
+        if worktree_dir.exists():
+            await self._remove_dir(worktree_dir)
+        worktree_dir.parent.mkdir(parents=True, exist_ok=True)
+        async with self._get_lock(mirror_dir):
+            await self._run_git(["worktree", "prune"], cwd=mirror_dir)
+            await self._run_git(
+                ["worktree", "add", "--detach", "--force", str(worktree_dir), commit],
+                cwd=mirror_dir,
+                timeout=self.fetch_timeout,
+                on_output=on_output
+            )
+
+    async def prepare(
+        self,
+        repo_url: str,
+        branch: str,
+        worktree_dir: Path,
+        token: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None
+    ) -> str:
+        """
+        更新镜像并检出分支最新提交到worktree
+
+        Args:
+            repo_url: 仓库URL
+            branch: 分支名
+            worktree_dir: worktree目录
+            token: 访问token
+            on_output: git进度输出回调
+
+        Returns:
+            检出的提交SHA
+        """
+        commit = await self.update_mirror(repo_url, branch, token, on_output)
+        await self.checkout_worktree(repo_url, commit, worktree_dir, on_output)
+        return commit
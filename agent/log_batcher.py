@@ -0,0 +1,135 @@
+"""测试套日志批量发送模块"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+
+class LogBatcher:
+    """测试套日志批量发送器
+
+    将逐行产生的日志合并为一条 ``test_suite_log_batch`` 消息，
+    满足"间隔时间到达"或"缓冲字节数达到上限"任一条件即发送。
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[bool]],
+        suite_id: str,
+        execution_id: Optional[str],
+        flush_interval: float = 0.2,
+        max_bytes: int = 64 * 1024,
+        logger=None
+    ):
+        """
+        初始化日志批量发送器
+
+        Args:
+            send: 消息发送函数（通常为WebSocketClient.send_message）
+            suite_id: 测试套ID
+            execution_id: 执行ID
+            flush_interval: 最长缓冲时间（秒）
+            max_bytes: 单批最大字节数（按字符数近似）
+            logger: 日志器
+        """
+        self._send = send
+        self.suite_id = suite_id
+        self.execution_id = execution_id
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.logger = logger
+
+        self._lines: List[str] = []
+        self._size = 0
+        self._level = "info"
+        self._last_timestamp: Optional[datetime] = None
+        self._has_data = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self) -> None:
+        """启动定时刷新任务"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def add(self, level: str, message: str) -> None:
+        """
+        添加一条日志（多行消息会拆分为多行，每行添加时间戳前缀）
+
+        Args:
+            level: 日志级别
+            message: 日志内容
+        """
+        timestamp = datetime.utcnow()
+        timestamp_prefix = f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}]"  # 保留毫秒（3位）
+
+        for line in message.split('\n'):
+            formatted = f"{timestamp_prefix} {line}"
+            self._lines.append(formatted)
+            self._size += len(formatted) + 1
+
+        self._last_timestamp = timestamp
+        # 批次级别取最严重的级别
+        if level == "error" or (level == "warning" and self._level == "info"):
+            self._level = level
+
+        if self._closed or self._size >= self.max_bytes:
+            await self.flush()
+        else:
+            self._has_data.set()
+
+    async def flush(self) -> bool:
+        """
+        立即发送缓冲区中的日志
+
+        Returns:
+            是否发送成功（缓冲区为空时返回True）
+        """
+        async with self._flush_lock:
+            if not self._lines:
+                self._has_data.clear()
+                return True
+
+            lines = self._lines
+            level = self._level
+            timestamp = self._last_timestamp or datetime.utcnow()
+            self._lines = []
+            self._size = 0
+            self._level = "info"
+            self._has_data.clear()
+
+            message: Dict[str, Any] = {
+                "type": "test_suite_log_batch",
+                "suite_id": self.suite_id,
+                "execution_id": self.execution_id,
+                "level": level,
+                "lines": lines,
+                "timestamp": timestamp.isoformat() + "Z"
+            }
+            try:
+                return await self._send(message)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"发送批量日志失败: {e}, suite_id={self.suite_id}")
+                return False
+
+    async def _flush_loop(self) -> None:
+        """定时刷新循环：有数据后等待flush_interval再发送"""
+        while not self._closed:
+            await self._has_data.wait()
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        """发送剩余日志并停止定时刷新任务"""
+        self._closed = True
+        if self._flush_task:
+            # 持锁取消，避免打断正在发送的批次
+            async with self._flush_lock:
+                self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
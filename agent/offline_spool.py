@@ -0,0 +1,172 @@
+"""离线发送缓存模块 - 连接断开时将待发送消息追加到本地文件，重连后按序补发"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from .send_queue import LOG_MESSAGE_TYPES
+except ImportError:
+    from send_queue import LOG_MESSAGE_TYPES
+
+
+class OfflineSpool:
+    """离线发送缓存
+
+    消息以JSON Lines格式追加到 ``outbox.jsonl``，补发进度（已确认的字节偏移）
+    记录在 ``outbox.offset``，Agent重启后可继续补发。全部补发完成后清空文件。
+    服务端支持消息确认时，在线发送的可靠消息也先写入缓存，收到确认后才提交。
+    缓存超过上限时只丢弃日志，结果和完成状态等消息始终写入。
+    无法解析的记录会被跳过（补发进度越过它们），写入中断留下的半行在下次追加前补上换行，
+    使其成为一条独立的损坏记录而不会与新消息拼接。
+    """
+
+    def __init__(self, spool_dir: Path, max_bytes: int = 256 * 1024 * 1024, logger=None):
+        """
+        初始化离线发送缓存
+
+        Args:
+            spool_dir: 缓存目录
+            max_bytes: 待补发数据的最大字节数，超过后丢弃新的日志消息
+            logger: 日志器
+        """
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.spool_dir / "outbox.jsonl"
+        self.offset_path = self.spool_dir / "outbox.offset"
+        self.max_bytes = max_bytes
+        self.logger = logger
+
+        self.dropped_logs = 0  # 因超限丢弃的日志消息数
+        self._offset = self._load_offset()
+        self._tail_checked = False  # 是否已确认文件末尾没有未写完整的行
+
+    def _load_offset(self) -> int:
+        """读取已补发的字节偏移"""
+        try:
+            offset = int(self.offset_path.read_text().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        return min(offset, self._size())
+
+    def _size(self) -> int:
+        """缓存文件大小"""
+        try:
+            return self.path.stat().st_size
+        except OSError:
+            return 0
+
+    @property
+    def committed_offset(self) -> int:
+        """已确认补发的字节偏移"""
+        return self._offset
+
+    @property
+    def pending_bytes(self) -> int:
+        """待补发的字节数"""
+        return max(0, self._size() - self._offset)
+
+    def has_pending(self) -> bool:
+        """是否有待补发的消息"""
+        return self.pending_bytes > 0
+
+    def append(self, message: Dict[str, Any]) -> Optional[int]:
+        """
+        追加一条待补发消息
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            该消息结束位置的字节偏移，写入失败或超限被丢弃的日志返回None
+        """
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.pending_bytes + len(data) > self.max_bytes and message.get("type") in LOG_MESSAGE_TYPES:
+            self.dropped_logs += 1
+            if self.logger and self.dropped_logs % 100 == 1:
+                self.logger.warning(f"离线缓存已达上限 {self.max_bytes} 字节，丢弃日志消息（累计 {self.dropped_logs} 条）")
+            return None
+
+        try:
+            with open(self.path, "ab") as f:
+                if not self._tail_checked:
+                    self._terminate_partial_line(f)
+                f.write(data)
+                return f.tell()
+        except OSError as e:
+            # 可能只写入了一部分，下次追加前重新检查文件末尾
+            self._tail_checked = False
+            if self.logger:
+                self.logger.error(f"写入离线缓存失败: {e}")
+            return None
+
+    def _terminate_partial_line(self, f) -> None:
+        """文件末尾有未写完整的行（进程崩溃或写入失败留下）时补上换行，避免新消息拼接到它后面"""
+        size = f.seek(0, os.SEEK_END)
+        if size > 0:
+            with open(self.path, "rb") as reader:
+                reader.seek(size - 1)
+                if reader.read(1) != b"\n":
+                    f.write(b"\n")
+                    if self.logger:
+                        self.logger.warning("离线缓存末尾有未写完整的记录，已将其隔开")
+        self._tail_checked = True
+
+    def read_pending(self, max_messages: int = 200, offset: Optional[int] = None) -> Tuple[List[Tuple[int, Dict[str, Any]]], int]:
+        """
+        读取待补发的消息
+
+        Args:
+            max_messages: 最多读取的消息数
+            offset: 起始字节偏移，默认从已确认的位置开始
+
+        Returns:
+            ([(该消息结束位置的字节偏移, 消息)], 本次读取结束位置的字节偏移)，消息按写入顺序排列。
+            结束位置包含跳过的无法解析的记录，全部发送后应commit该位置
+        """
+        start = self._offset if offset is None else max(offset, self._offset)
+        entries: List[Tuple[int, Dict[str, Any]]] = []
+        end = start
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # 未写完整的行，下次再读
+                    end += len(line)
+                    try:
+                        message = json.loads(line.decode("utf-8"))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        if self.logger:
+                            self.logger.warning(f"跳过无法解析的离线缓存记录: {line[:100]!r}")
+                        continue
+                    entries.append((end, message))
+                    if len(entries) >= max_messages:
+                        break
+        except OSError:
+            return [], start
+        return entries, end
+
+    def commit(self, offset: int) -> None:
+        """
+        确认offset之前的消息已送达
+
+        Args:
+            offset: append或read_pending返回的字节偏移
+        """
+        if offset <= self._offset:
+            return
+        self._offset = offset
+        try:
+            if self._offset >= self._size():
+                # 全部补发完成，清空缓存
+                self.path.unlink(missing_ok=True)
+                self.offset_path.unlink(missing_ok=True)
+                self._offset = 0
+            else:
+                tmp_path = self.offset_path.with_suffix(".tmp")
+                tmp_path.write_text(str(self._offset))
+                os.replace(tmp_path, self.offset_path)
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f"更新离线缓存进度失败: {e}")
@@ -0,0 +1,320 @@
+"""测试套输出落盘模块 - 分段滚动、压缩存储，支持按偏移量读取"""
+import asyncio
+import gzip
+import json
+import shutil
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+INDEX_FILE = "index.json"
+
+
+class OutputSpool:
+    """测试套输出落盘器
+
+    输出按字节写入当前分段文件，分段达到大小上限后滚动并gzip压缩，
+    超过保留分段数的最旧分段会被删除。偏移量为整个输出流的字节偏移，
+    与分段和压缩无关；内存中只保留有限长度的尾部用于错误上报。
+    """
+
+    def __init__(
+        self,
+        spool_dir: Path,
+        segment_bytes: int = 8 * 1024 * 1024,
+        max_segments: int = 50,
+        tail_bytes: int = 64 * 1024,
+        logger=None
+    ):
+        """
+        初始化输出落盘器
+
+        Args:
+            spool_dir: 落盘目录（每次执行独立）
+            segment_bytes: 单个分段最大字节数
+            max_segments: 最多保留的分段数（含当前分段），0表示不限制
+            tail_bytes: 内存中保留的尾部最大字符数
+            logger: 日志器
+        """
+        self.spool_dir = Path(spool_dir)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.tail_bytes = tail_bytes
+        self.logger = logger
+
+        self._segments: List[Dict[str, Any]] = []  # {"no", "start", "length", "file"}
+        self._file = None
+        self._size = 0  # 已写入的总字节数
+        self._tail: deque = deque()
+        self._tail_size = 0
+        self._compress_tasks: List[asyncio.Future] = []
+
+    @property
+    def size(self) -> int:
+        """已写入的总字节数"""
+        return self._size
+
+    def open(self) -> None:
+        """创建落盘目录并打开第一个分段（清理同目录下的旧数据）"""
+        if self.spool_dir.exists():
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._open_segment(1)
+        self._write_index()
+
+    def _open_segment(self, no: int) -> None:
+        """打开新的分段文件"""
+        file_name = f"segment-{no:06d}.log"
+        self._file = open(self.spool_dir / file_name, "ab")
+        self._segments.append({"no": no, "start": self._size, "length": 0, "file": file_name})
+
+    async def write(self, text: str) -> None:
+        """
+        追加输出
+
+        Args:
+            text: 输出内容（通常为一行）
+        """
+        data = text.encode("utf-8", errors="replace")
+        self._file.write(data)
+        self._size += len(data)
+        self._segments[-1]["length"] += len(data)
+        self._append_tail(text)
+
+        if self._segments[-1]["length"] >= self.segment_bytes:
+            await self._rotate()
+
+    def _append_tail(self, text: str) -> None:
+        """维护内存中的有限尾部"""
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail_size > self.tail_bytes and len(self._tail) > 1:
+            self._tail_size -= len(self._tail.popleft())
+
+    def tail(self) -> str:
+        """获取内存中保留的输出尾部"""
+        text = "".join(self._tail)
+        if len(text) > self.tail_bytes:
+            text = text[-self.tail_bytes:]
+        return text
+
+    async def _rotate(self) -> None:
+        """滚动当前分段：关闭并打开下一个分段，已关闭分段在后台压缩"""
+        self._file.close()
+        closed = self._segments[-1]
+        closed["compressing"] = True
+        self._open_segment(closed["no"] + 1)
+
+        # 压缩在线程池中后台完成，不阻塞输出读取和日志发送
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(None, self._compress_segment, dict(closed))
+        future.add_done_callback(lambda f: self._on_compressed(f, closed))
+        self._compress_tasks.append(future)
+        self._prune_segments()
+        self._write_index()
+
+    def _on_compressed(self, future: asyncio.Future, segment: Dict[str, Any]) -> None:
+        """分段压缩完成回调（在事件循环中执行）"""
+        if future in self._compress_tasks:
+            self._compress_tasks.remove(future)
+        if not future.cancelled() and future.exception() is None and future.result():
+            segment["file"] = future.result()
+        segment.pop("compressing", None)
+        self._prune_segments()
+        self._write_index()
+
+    def _prune_segments(self) -> None:
+        """删除超出保留数量的最旧分段（压缩中的分段等压缩完成后再删除）"""
+        while self.max_segments and len(self._segments) > self.max_segments:
+            oldest = self._segments[0]
+            if oldest.get("compressing"):
+                break
+            self._segments.pop(0)
+            try:
+                (self.spool_dir / oldest["file"]).unlink()
+            except OSError:
+                pass
+
+    def _compress_segment(self, segment: Dict[str, Any]) -> Optional[str]:
+        """
+        gzip压缩已关闭的分段（在线程池中执行）
+
+        Args:
+            segment: 分段信息的副本
+
+        Returns:
+            压缩后的文件名，失败时返回None
+        """
+        source = self.spool_dir / segment["file"]
+        target_name = segment["file"] + ".gz"
+        try:
+            with open(source, "rb") as src, gzip.open(self.spool_dir / target_name, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            source.unlink()
+            return target_name
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"压缩输出分段失败: {source}, 错误: {e}")
+            return None
+
+    def _write_index(self) -> None:
+        """写入分段索引，供其他读取方定位偏移量"""
+        segments = [
+            {key: value for key, value in segment.items() if key != "compressing"}
+            for segment in self._segments
+        ]
+        index = {"segments": segments, "size": self._size}
+        tmp_file = self.spool_dir / (INDEX_FILE + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        tmp_file.replace(self.spool_dir / INDEX_FILE)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取当前落盘状态的快照（需在事件循环中调用）
+
+        刷新写缓冲并复制分段列表，返回的快照不再引用落盘器内部状态，
+        可交给线程池通过 read_snapshot 读取。
+
+        Returns:
+            快照字典，包含 spool_dir、segments、size
+        """
+        if self._file and not self._file.closed:
+            self._file.flush()
+        return {
+            "spool_dir": self.spool_dir,
+            "segments": [dict(segment) for segment in self._segments],
+            "size": self._size
+        }
+
+    @classmethod
+    def read_snapshot(cls, snapshot: Dict[str, Any], offset: int, length: int) -> Dict[str, Any]:
+        """
+        按偏移量读取快照中的输出（可在线程池中执行）
+
+        Args:
+            snapshot: snapshot() 返回的快照
+            offset: 起始字节偏移
+            length: 最大读取字节数
+
+        Returns:
+            读取结果，见 read_range
+        """
+        return cls._read_segments(snapshot["spool_dir"], snapshot["segments"], snapshot["size"], offset, length)
+
+    def read(self, offset: int, length: int) -> Dict[str, Any]:
+        """
+        按偏移量读取输出（读取当前执行中的落盘数据，需在事件循环中调用）
+
+        Args:
+            offset: 起始字节偏移
+            length: 最大读取字节数
+
+        Returns:
+            读取结果，见 read_range
+        """
+        return self.read_snapshot(self.snapshot(), offset, length)
+
+    async def close(self) -> None:
+        """关闭当前分段并写入最终索引"""
+        if self._compress_tasks:
+            await asyncio.gather(*list(self._compress_tasks), return_exceptions=True)
+        if self._file and not self._file.closed:
+            self._file.close()
+        self._prune_segments()
+        self._write_index()
+
+    @classmethod
+    def read_range(cls, spool_dir: Path, offset: int, length: int) -> Dict[str, Any]:
+        """
+        按偏移量读取已落盘的输出（无需持有OutputSpool实例）
+
+        Args:
+            spool_dir: 落盘目录
+            offset: 起始字节偏移
+            length: 最大读取字节数
+
+        Returns:
+            包含以下字段的字典：
+                - offset: 实际起始偏移（早于最旧保留分段时会被调整）
+                - content: 读取到的内容（UTF-8解码）
+                - next_offset: 下一次读取的起始偏移
+                - size: 当前输出总字节数
+                - base_offset: 最旧可读取的偏移
+        """
+        spool_dir = Path(spool_dir)
+        index_file = spool_dir / INDEX_FILE
+        if not index_file.exists():
+            raise FileNotFoundError(f"输出落盘文件不存在: {spool_dir}")
+
+        with open(index_file, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        segments = index.get("segments", [])
+
+        # 当前分段可能仍在写入，以实际文件大小为准
+        size = index.get("size", 0)
+        if segments:
+            last = segments[-1]
+            last_path = spool_dir / last["file"]
+            if not last["file"].endswith(".gz") and last_path.exists():
+                last["length"] = last_path.stat().st_size
+                size = last["start"] + last["length"]
+
+        return cls._read_segments(spool_dir, segments, size, offset, length)
+
+    @staticmethod
+    def _read_segments(
+        spool_dir: Path,
+        segments: List[Dict[str, Any]],
+        size: int,
+        offset: int,
+        length: int
+    ) -> Dict[str, Any]:
+        """从分段列表中读取指定范围"""
+        base_offset = segments[0]["start"] if segments else 0
+        offset = max(offset, base_offset)
+        end = min(offset + max(length, 0), size)
+
+        chunks: List[bytes] = []
+        position = offset
+        for segment in segments:
+            seg_start = segment["start"]
+            seg_end = seg_start + segment["length"]
+            if seg_end <= position or seg_start >= end:
+                continue
+
+            # 读取期间分段可能被压缩改名或按保留策略删除，依次尝试两种文件名
+            name = segment["file"][:-3] if segment["file"].endswith(".gz") else segment["file"]
+            candidates = [name, name + ".gz"]
+            if segment["file"].endswith(".gz"):
+                candidates.reverse()
+            data = None
+            for file_name in candidates:
+                opener = gzip.open if file_name.endswith(".gz") else open
+                try:
+                    with opener(spool_dir / file_name, "rb") as f:
+                        f.seek(position - seg_start)
+                        data = f.read(min(end, seg_end) - position)
+                    break
+                except FileNotFoundError:
+                    continue
+            if data is None:
+                if chunks:
+                    break
+                # 分段已被删除，从下一个分段继续读取
+                position = seg_end
+                offset = base_offset = seg_end
+                continue
+            chunks.append(data)
+            position += len(data)
+            if position >= end:
+                break
+
+        return {
+            "offset": offset,
+            "content": b"".join(chunks).decode("utf-8", errors="replace"),
+            "next_offset": position,
+            "size": size,
+            "base_offset": base_offset
+        }
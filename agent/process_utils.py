@@ -0,0 +1,205 @@
+"""异步子进程工具模块"""
+import asyncio
+import os
+import signal
+import subprocess
+from typing import AsyncIterator, Dict, Any, List
+
+import psutil
+
+
+PROCESS_POLL_INTERVAL = 0.1  # 等待进程树退出时的轮询间隔（秒）
+
+
+async def iter_stream_lines(
+    stream: asyncio.StreamReader,
+    encoding: str = "utf-8"
+) -> AsyncIterator[str]:
+    """
+    异步逐行读取子进程输出流，直到EOF
+
+    超过StreamReader缓冲上限的超长行会被分段返回，而不是丢弃。
+
+    Args:
+        stream: 子进程的stdout/stderr流
+        encoding: 输出编码，无法解码的字节会被替换
+
+    Yields:
+        解码后的行（保留末尾换行符）
+    """
+    while True:
+        try:
+            chunk = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # 到达EOF，返回最后不带换行符的部分
+            if e.partial:
+                yield e.partial.decode(encoding, errors="replace")
+            return
+        except asyncio.LimitOverrunError as e:
+            # 行过长，先取出缓冲区中已有的部分
+            chunk = await stream.read(e.consumed)
+            if not chunk:
+                return
+        yield chunk.decode(encoding, errors="replace")
+
+
+async def terminate_process(
+    process: asyncio.subprocess.Process,
+    grace_period: float = 5.0
+) -> None:
+    """
+    终止子进程：先发送SIGTERM，超过宽限期仍未退出则强制杀死
+
+    Args:
+        process: 异步子进程
+        grace_period: 宽限期（秒）
+    """
+    if process.returncode is not None:
+        return
+
+    try:
+        process.terminate()
+    except ProcessLookupError:
+        # 进程已经不存在
+        return
+
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace_period)
+    except asyncio.TimeoutError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            return
+        await process.wait()
+
+
+def process_group_kwargs() -> Dict[str, Any]:
+    """
+    创建子进程的额外参数：子进程成为新会话（进程组）的首进程，便于终止整个进程树
+
+    Returns:
+        传给create_subprocess_shell/exec的关键字参数
+    """
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _signal_group(pgid: int, sig: int) -> None:
+    """向进程组发送信号（进程组已不存在时忽略）"""
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _group_exists(pgid: int) -> bool:
+    """进程组中是否还有运行中的进程（容器中init可能不回收僵尸进程，僵尸进程不计入）"""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    for proc in psutil.process_iter():
+        try:
+            if os.getpgid(proc.pid) == pgid and proc.status() != psutil.STATUS_ZOMBIE:
+                return True
+        except (OSError, psutil.Error):
+            continue
+    return False
+
+
+def _alive(processes: List[psutil.Process]) -> List[psutil.Process]:
+    """过滤出仍在运行（非僵尸）的进程"""
+    alive = []
+    for proc in processes:
+        try:
+            if proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE:
+                alive.append(proc)
+        except psutil.Error:
+            continue
+    return alive
+
+
+async def terminate_process_tree(
+    process: asyncio.subprocess.Process,
+    grace_period: float = 5.0
+) -> bool:
+    """
+    终止子进程及其全部后代进程：先发送SIGTERM，超过宽限期仍有进程未退出则全部强制杀死
+
+    子进程需要通过 ``process_group_kwargs()`` 创建（POSIX下进程组ID即子进程PID），
+    这样shell退出后被托管给init的孙进程也能通过进程组找到；
+    另外通过psutil收集脱离进程组（如自行setsid）的后代进程。
+    子进程已经退出时只清理残留在进程组中的进程。
+
+    Args:
+        process: 异步子进程
+        grace_period: 宽限期（秒）
+
+    Returns:
+        除子进程本身外是否还有残留的后代进程
+    """
+    pgid = process.pid if os.name != "nt" else None
+    descendants: List[psutil.Process] = []
+    if process.returncode is None:
+        try:
+            descendants = psutil.Process(process.pid).children(recursive=True)
+        except psutil.Error:
+            pass
+
+    def tree_alive() -> bool:
+        return bool(_alive(descendants)) or (pgid is not None and _group_exists(pgid))
+
+    had_descendants = tree_alive()
+    if process.returncode is not None and not had_descendants:
+        return False
+
+    # 1. SIGTERM：进程组 + 脱离进程组的后代进程
+    if pgid is not None:
+        _signal_group(pgid, signal.SIGTERM)
+    elif process.returncode is None:
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            pass
+    for proc in _alive(descendants):
+        try:
+            proc.terminate()
+        except psutil.Error:
+            pass
+
+    # 2. 等待宽限期
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + grace_period
+    while True:
+        if process.returncode is None:
+            try:
+                await asyncio.wait_for(process.wait(), timeout=PROCESS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        if process.returncode is not None and not tree_alive():
+            return had_descendants
+        if loop.time() >= deadline:
+            break
+        if process.returncode is not None:
+            await asyncio.sleep(PROCESS_POLL_INTERVAL)
+
+    # 3. 宽限期后仍未退出：SIGKILL
+    if pgid is not None:
+        _signal_group(pgid, signal.SIGKILL)
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    for proc in _alive(descendants):
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    await process.wait()
+    return had_descendants
+
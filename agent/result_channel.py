@@ -0,0 +1,125 @@
+"""测试结果流通道模块 - 通过Unix Socket接收xat实时发送的结果事件"""
+import asyncio
+import json
+import os
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Callable, Awaitable, Optional, Set
+
+
+# 导出给子进程的Socket路径环境变量（与xat约定）
+RESULT_SOCKET_ENV = "ATS_RESULT_SOCKET"
+
+
+class ResultSocketServer:
+    """结果流Socket服务端
+
+    每次执行创建一个Unix Socket，xat连接后逐行发送JSON消息
+    （``result``、``test_start``、``test_end``）。同一连接内的消息
+    按发送顺序依次交给回调处理。
+    """
+
+    def __init__(
+        self,
+        on_message: Callable[[Dict[str, Any]], Awaitable[None]],
+        socket_dir: Optional[Path] = None,
+        logger=None
+    ):
+        """
+        初始化结果流Socket服务端
+
+        Args:
+            on_message: 消息处理回调
+            socket_dir: Socket文件目录，默认使用系统临时目录（Unix Socket路径长度有限制）
+            logger: 日志器
+        """
+        self._on_message = on_message
+        self.logger = logger
+        socket_dir = Path(socket_dir or tempfile.gettempdir())
+        self.path = socket_dir / f"ats-result-{uuid.uuid4().hex[:12]}.sock"
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """启动监听"""
+        if self.path.exists():
+            self.path.unlink()
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection,
+            path=str(self.path),
+            limit=1024 * 1024
+        )
+        os.chmod(self.path, 0o600)
+
+    def env(self) -> Dict[str, str]:
+        """返回需要导出给子进程的环境变量"""
+        return {RESULT_SOCKET_ENV: str(self.path)}
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """处理一个连接：逐行解析消息直到对端关闭"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError) as e:
+                    if self.logger:
+                        self.logger.warning(f"结果消息过长，已关闭连接: {e}")
+                    break
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    message = json.loads(line.decode("utf-8"))
+                except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                    if self.logger:
+                        self.logger.warning(f"解析结果消息失败: {e}, 内容: {line[:100]!r}")
+                    continue
+
+                try:
+                    await self._on_message(message)
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"处理结果消息失败: {e}")
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def drain(self, timeout: float = 5.0) -> None:
+        """
+        等待已有连接处理完剩余消息（子进程退出后对端会关闭连接）
+
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        if not self._connections:
+            return
+        done, pending = await asyncio.wait(set(self._connections), timeout=timeout)
+        if pending and self.logger:
+            self.logger.warning(f"结果流连接在 {timeout}s 内未关闭，剩余连接数: {len(pending)}")
+
+    async def close(self) -> None:
+        """停止监听并删除Socket文件"""
+        if self._server:
+            self._server.close()
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,125 @@
+"""测试结果读取模块 - 增量读取xat写出的结果文件"""
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+class ResultTailer:
+    """测试结果增量读取器
+
+    xat以JSONL格式（每行一条结果）追加写入结果文件，读取器记录已解析的
+    字节偏移量，每次只解析新增的完整行。未写完的行会保留到下一次读取。
+    对于旧版xat写出的JSON数组文件，提供兼容读取（整体解析，只返回新增记录）。
+    """
+
+    def __init__(
+        self,
+        jsonl_file: Path,
+        legacy_file: Optional[Path] = None,
+        logger=None
+    ):
+        """
+        初始化结果读取器
+
+        Args:
+            jsonl_file: JSONL结果文件路径（test_results.jsonl）
+            legacy_file: 旧版JSON数组结果文件路径（test_results.json）
+            logger: 日志器
+        """
+        self.jsonl_file = Path(jsonl_file)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.logger = logger
+        self._offset = 0
+        self._legacy_count = 0
+        self._legacy_mtime: Optional[float] = None
+
+    def reset(self) -> None:
+        """删除上一次执行遗留的结果文件，并重置读取位置"""
+        for result_file in (self.jsonl_file, self.legacy_file):
+            if result_file and result_file.exists():
+                try:
+                    result_file.unlink()
+                except OSError as e:
+                    if self.logger:
+                        self.logger.warning(f"删除旧结果文件失败: {result_file}, 错误: {e}")
+        self._offset = 0
+        self._legacy_count = 0
+        self._legacy_mtime = None
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """
+        读取自上次调用以来新增的结果
+
+        Returns:
+            新增的结果列表
+        """
+        if self.jsonl_file.exists():
+            return self._poll_jsonl()
+        if self.legacy_file and self.legacy_file.exists():
+            return self._poll_legacy()
+        return []
+
+    def _poll_jsonl(self) -> List[Dict[str, Any]]:
+        """增量读取JSONL文件中新增的完整行"""
+        try:
+            size = self.jsonl_file.stat().st_size
+        except OSError:
+            return []
+
+        if size < self._offset:
+            # 文件被截断（重新初始化），从头读取
+            self._offset = 0
+        if size == self._offset:
+            return []
+
+        with open(self.jsonl_file, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+
+        # 只处理到最后一个换行符为止，未写完的行留到下次
+        end = data.rfind(b"\n")
+        if end < 0:
+            return []
+        self._offset += end + 1
+
+        results = []
+        for raw_line in data[:end].split(b"\n"):
+            raw_line = raw_line.strip()
+            if not raw_line:
+                continue
+            try:
+                record = json.loads(raw_line.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                if self.logger:
+                    self.logger.warning(f"解析结果行失败: {e}, 内容: {raw_line[:100]!r}")
+                continue
+            if isinstance(record, dict):
+                results.append(record)
+        return results
+
+    def _poll_legacy(self) -> List[Dict[str, Any]]:
+        """兼容读取旧版JSON数组结果文件（仅在文件变化时整体解析）"""
+        try:
+            mtime = self.legacy_file.stat().st_mtime
+        except OSError:
+            return []
+        if mtime == self._legacy_mtime:
+            return []
+
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                results = json.load(f)
+        except json.JSONDecodeError as e:
+            # 文件可能正在被重写，下次再读
+            if self.logger:
+                self.logger.warning(f"解析结果文件失败: {e}")
+            return []
+        self._legacy_mtime = mtime
+
+        if not isinstance(results, list):
+            return []
+        if len(results) < self._legacy_count:
+            self._legacy_count = 0
+        new_results = [r for r in results[self._legacy_count:] if isinstance(r, dict)]
+        self._legacy_count = len(results)
+        return new_results
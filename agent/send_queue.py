@@ -0,0 +1,211 @@
+"""发送队列模块 - 按消息类别区分优先级的有界发送队列"""
+import asyncio
+from collections import deque
+from typing import Dict, Any, Deque, List, Optional, Tuple
+
+
+# 消息类别（数字越小优先级越高）
+PRIORITY_CONTROL = 0    # 结果、完成状态、工作空间响应等控制消息
+PRIORITY_LOG = 1        # 测试套/任务日志
+PRIORITY_TELEMETRY = 2  # 心跳等遥测数据
+
+LOG_MESSAGE_TYPES = {"test_suite_log", "test_suite_log_batch", "task_log"}
+TELEMETRY_MESSAGE_TYPES = {"heartbeat"}
+
+# 发送前需要先送出同一测试套已排队日志的控制消息（保证服务端在完成/结果之前收到全部日志）
+SUITE_ORDERED_MESSAGE_TYPES = {"test_suite_completed", "test_suite_result"}
+
+
+def classify_message(message: Dict[str, Any]) -> int:
+    """
+    根据消息类型确定发送优先级
+
+    Args:
+        message: 消息字典
+
+    Returns:
+        优先级类别
+    """
+    message_type = message.get("type")
+    if message_type in LOG_MESSAGE_TYPES:
+        return PRIORITY_LOG
+    if message_type in TELEMETRY_MESSAGE_TYPES:
+        return PRIORITY_TELEMETRY
+    return PRIORITY_CONTROL
+
+
+def _estimate_size(message: Dict[str, Any]) -> int:
+    """估算日志消息大小（字符数）"""
+    lines = message.get("lines")
+    if lines is not None:
+        return sum(len(line) + 1 for line in lines)
+    return len(message.get("message") or "")
+
+
+class OutboundQueue:
+    """按类别区分优先级的发送队列
+
+    - 控制消息：不丢弃、不合并，发送方等待实际发送结果；测试套的完成/结果消息入队时，
+      该测试套已排队的日志会被提到它前面，避免完成消息越过最后一批日志；
+    - 日志：发送方入队即返回，同一测试套相邻的批量日志合并为一帧，
+      积压超过上限时丢弃最旧的日志，并在该测试套下一批日志中注明丢弃行数；
+    - 遥测：只保留最新一条，增量心跳的字段合并后发送。
+    """
+
+    def __init__(self, max_log_bytes: int = 4 * 1024 * 1024, max_batch_bytes: int = 256 * 1024):
+        """
+        初始化发送队列
+
+        Args:
+            max_log_bytes: 日志队列最大积压字符数，超过后丢弃最旧日志
+            max_batch_bytes: 合并后单帧批量日志的最大字符数
+        """
+        self.max_log_bytes = max_log_bytes
+        self.max_batch_bytes = max_batch_bytes
+
+        self._control: Deque[Tuple[Dict[str, Any], asyncio.Future]] = deque()
+        self._logs: Deque[Dict[str, Any]] = deque()
+        self._log_bytes = 0
+        self._telemetry: Optional[Dict[str, Any]] = None
+        self._dropped_lines: Dict[Tuple[Any, Any], int] = {}  # (suite_id, execution_id) -> 丢弃行数
+        self._has_items = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._control) + len(self._logs) + (1 if self._telemetry else 0)
+
+    def put(self, message: Dict[str, Any]) -> Optional[asyncio.Future]:
+        """
+        消息入队
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            控制消息返回Future（结果为是否发送成功），其他类别返回None
+        """
+        priority = classify_message(message)
+        future = None
+        if priority == PRIORITY_CONTROL:
+            future = asyncio.get_event_loop().create_future()
+            if message.get("type") in SUITE_ORDERED_MESSAGE_TYPES:
+                self._promote_logs(message.get("suite_id"), message.get("execution_id"))
+            self._control.append((message, future))
+        elif priority == PRIORITY_LOG:
+            self._put_log(message)
+        else:
+            self._put_telemetry(message)
+        self._has_items.set()
+        return future
+
+    def _put_log(self, message: Dict[str, Any]) -> None:
+        """日志入队：尝试与队尾同一测试套的批量日志合并，超限时丢弃最旧日志"""
+        size = _estimate_size(message)
+        last = self._logs[-1] if self._logs else None
+        if (
+            last is not None
+            and message.get("type") == "test_suite_log_batch"
+            and last.get("type") == "test_suite_log_batch"
+            and last.get("suite_id") == message.get("suite_id")
+            and last.get("execution_id") == message.get("execution_id")
+            and _estimate_size(last) + size <= self.max_batch_bytes
+        ):
+            # 合并为一帧：行追加，级别取更严重的，时间戳取最新的
+            last["lines"] = list(last["lines"]) + list(message.get("lines") or [])
+            if message.get("level") == "error" or (message.get("level") == "warning" and last.get("level") == "info"):
+                last["level"] = message.get("level")
+            if "timestamp" in message:
+                last["timestamp"] = message["timestamp"]
+        else:
+            self._logs.append(message)
+        self._log_bytes += size
+
+        # 积压超限：丢弃最旧的日志（至少保留最新一条）
+        while self._log_bytes > self.max_log_bytes and len(self._logs) > 1:
+            dropped = self._logs.popleft()
+            self._log_bytes -= _estimate_size(dropped)
+            key = (dropped.get("suite_id"), dropped.get("execution_id"))
+            line_count = len(dropped.get("lines") or [None])
+            self._dropped_lines[key] = self._dropped_lines.get(key, 0) + line_count
+
+    def _put_telemetry(self, message: Dict[str, Any]) -> None:
+        """遥测入队：只保留最新一条，增量字段合并"""
+        if self._telemetry is not None and isinstance(self._telemetry.get("data"), dict) and isinstance(message.get("data"), dict):
+            merged = dict(message)
+            merged["data"] = {**self._telemetry["data"], **message["data"]}
+            self._telemetry = merged
+        else:
+            self._telemetry = message
+
+    def _promote_logs(self, suite_id: Any, execution_id: Any) -> None:
+        """把指定测试套（有execution_id时只匹配该执行）已排队的日志按原顺序移到控制队列末尾"""
+        if suite_id is None or not self._logs:
+            return
+        remaining: Deque[Dict[str, Any]] = deque()
+        for message in self._logs:
+            if message.get("suite_id") == suite_id and (execution_id is None or message.get("execution_id") == execution_id):
+                self._control.append((self._take_log(message), None))
+            else:
+                remaining.append(message)
+        self._logs = remaining
+
+    def _pop_log(self) -> Dict[str, Any]:
+        """取出一条日志"""
+        return self._take_log(self._logs.popleft())
+
+    def _take_log(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """扣减已出队日志的积压字符数，并注明该测试套此前被丢弃的行数"""
+        self._log_bytes -= _estimate_size(message)
+        key = (message.get("suite_id"), message.get("execution_id"))
+        dropped = self._dropped_lines.pop(key, 0)
+        if dropped:
+            notice = f"[Agent] 发送队列积压，已丢弃 {dropped} 行日志"
+            if message.get("type") == "test_suite_log_batch":
+                message["lines"] = [notice] + list(message.get("lines") or [])
+            else:
+                message["message"] = f"{notice}\n{message.get('message', '')}"
+        return message
+
+    def pop(self) -> Optional[Tuple[Dict[str, Any], Optional[asyncio.Future]]]:
+        """
+        按优先级取出下一条消息
+
+        Returns:
+            (消息, Future或None)，队列为空时返回None
+        """
+        if self._control:
+            return self._control.popleft()
+        if self._logs:
+            return self._pop_log(), None
+        if self._telemetry is not None:
+            message = self._telemetry
+            self._telemetry = None
+            return message, None
+        self._has_items.clear()
+        return None
+
+    async def wait(self) -> None:
+        """等待队列中有消息"""
+        await self._has_items.wait()
+
+    def wake(self) -> None:
+        """唤醒写任务（例如需要补发离线缓存时）"""
+        self._has_items.set()
+
+    def take_all(self) -> List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]:
+        """
+        取出队列中全部消息（连接断开时调用）
+
+        Returns:
+            [(消息, Future或None)]，按优先级顺序排列
+        """
+        pending: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = list(self._control)
+        pending.extend((message, None) for message in self._logs)
+        if self._telemetry is not None:
+            pending.append((self._telemetry, None))
+        self._control.clear()
+        self._logs.clear()
+        self._log_bytes = 0
+        self._telemetry = None
+        self._dropped_lines.clear()
+        self._has_items.clear()
+        return pending
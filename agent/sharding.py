@@ -0,0 +1,62 @@
+"""用例分片模块 - 将测试套的用例拆分给多个本地工作进程并行执行"""
+import os
+from typing import Any, List, Optional, Tuple, Union
+
+
+# 分片工作进程的环境变量（xat据此读取各自的用例文件、写入各自的结果文件）
+TEST_CASES_FILE_ENV = "ATS_TEST_CASES_FILE"
+RESULTS_FILE_ENV = "ATS_RESULTS_FILE"
+SHARD_INDEX_ENV = "ATS_SHARD_INDEX"
+SHARD_COUNT_ENV = "ATS_SHARD_COUNT"
+
+
+def resolve_shard_count(
+    setting: Union[int, str, None],
+    case_count: int,
+    min_cases_per_shard: int = 20,
+    max_concurrent_tasks: int = 1,
+    cpu_count: Optional[int] = None
+) -> int:
+    """
+    计算测试套的分片数
+
+    Args:
+        setting: 分片配置：0/1不分片，"auto"按CPU核数除以最大并发测试套数，整数为分片数上限
+        case_count: 用例数
+        min_cases_per_shard: 每个分片的最少用例数
+        max_concurrent_tasks: Agent最大并发测试套数（auto模式下平分CPU）
+        cpu_count: CPU核数，默认取os.cpu_count()
+
+    Returns:
+        分片数（1表示不分片）
+    """
+    if not setting or setting == 1:
+        return 1
+    if setting == "auto":
+        limit = (cpu_count or os.cpu_count() or 1) // max(1, max_concurrent_tasks)
+    else:
+        limit = int(setting)
+    by_cases = case_count // max(1, min_cases_per_shard)
+    return max(1, min(limit, by_cases))
+
+
+def split_cases(
+    case_codes: List[Any],
+    case_ids: List[Any],
+    shard_count: int
+) -> List[Tuple[List[Any], List[Any]]]:
+    """
+    按轮询方式将用例分配到各分片（相邻用例通常耗时相近，轮询分配更均衡）
+
+    Args:
+        case_codes: 用例编号列表
+        case_ids: 用例ID列表（与case_codes一一对应）
+        shard_count: 分片数
+
+    Returns:
+        [(分片的case_codes, 分片的case_ids)]
+    """
+    return [
+        (list(case_codes[index::shard_count]), list(case_ids[index::shard_count]))
+        for index in range(shard_count)
+    ]
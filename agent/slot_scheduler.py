@@ -0,0 +1,171 @@
+"""执行槽位调度模块 - 本地并发与资源余量准入控制"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional, Set
+
+
+# 排队通知回调：(排队位置（从1开始）, 排队原因)
+QueuedCallback = Callable[[int, str], Awaitable[None]]
+
+
+class SlotScheduler:
+    """执行槽位调度器
+
+    按到达顺序（FIFO）发放执行槽位：同时执行的测试套数不超过max_concurrent；
+    已有测试套在执行时，CPU或内存使用率超过阈值则暂缓启动新的测试套，
+    避免节点超额占用资源进入swap。没有测试套在执行时不检查资源阈值，
+    防止外部负载导致任务永远无法启动。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 1,
+        max_cpu_percent: Optional[float] = None,
+        max_memory_percent: Optional[float] = None,
+        check_interval: float = 2.0,
+        monitor=None,
+        logger=None
+    ):
+        """
+        初始化槽位调度器
+
+        Args:
+            max_concurrent: 最大并发测试套数
+            max_cpu_percent: CPU使用率阈值（%），None表示不检查
+            max_memory_percent: 内存使用率阈值（%），None表示不检查
+            check_interval: 资源不足时重新检查的间隔（秒）
+            monitor: SystemMonitor实例（用于读取资源使用率）
+            logger: 日志器
+        """
+        self.max_concurrent = max(1, max_concurrent or 1)
+        self.max_cpu_percent = max_cpu_percent
+        self.max_memory_percent = max_memory_percent
+        self.check_interval = check_interval
+        self.monitor = monitor
+        self.logger = logger
+
+        self._queue: deque = deque()  # 等待中的suite_id（FIFO）
+        self._running: Set[str] = set()
+        self._queued_at: Dict[str, float] = {}
+        self._condition = asyncio.Condition()
+        self._generation = 0  # 每次槽位/队列变化时递增，用于避免错过唤醒
+
+    @property
+    def running_count(self) -> int:
+        """正在执行的测试套数"""
+        return len(self._running)
+
+    @property
+    def queued_count(self) -> int:
+        """排队中的测试套数"""
+        return len(self._queue)
+
+    def _check_resources(self) -> Optional[str]:
+        """
+        检查资源余量
+
+        Returns:
+            资源不足的原因，资源充足时返回None
+        """
+        if not self.monitor or (self.max_cpu_percent is None and self.max_memory_percent is None):
+            return None
+
+        usage = self.monitor.get_resource_usage()
+        if self.max_cpu_percent is not None and usage["cpu_percent"] > self.max_cpu_percent:
+            return f"CPU使用率 {usage['cpu_percent']:.1f}% 超过阈值 {self.max_cpu_percent}%"
+        if self.max_memory_percent is not None and usage["memory_percent"] > self.max_memory_percent:
+            return f"内存使用率 {usage['memory_percent']:.1f}% 超过阈值 {self.max_memory_percent}%"
+        return None
+
+    def _admission_blocker(self, suite_id: str) -> Optional[str]:
+        """返回suite_id当前不能启动的原因，可以启动时返回None"""
+        if self._queue[0] != suite_id:
+            return "等待前序测试套启动"
+        if len(self._running) >= self.max_concurrent:
+            return f"并发已满（{len(self._running)}/{self.max_concurrent}）"
+        if self._running:
+            return self._check_resources()
+        return None
+
+    async def acquire(self, suite_id: str, on_queued: Optional[QueuedCallback] = None) -> None:
+        """
+        获取执行槽位，不能立即启动时排队等待（可取消，取消后自动出队）
+
+        Args:
+            suite_id: 测试套ID
+            on_queued: 排队通知回调，排队位置或原因变化时调用
+        """
+        self._queue.append(suite_id)
+        self._queued_at[suite_id] = time.time()
+        last_state = None
+        try:
+            while True:
+                async with self._condition:
+                    reason = self._admission_blocker(suite_id)
+                    if reason is None:
+                        self._queue.remove(suite_id)
+                        self._running.add(suite_id)
+                        waited = time.time() - self._queued_at.pop(suite_id, time.time())
+                        if last_state is not None and self.logger:
+                            self.logger.info(f"测试套 {suite_id} 获得执行槽位，排队 {waited:.1f}s")
+                        # 队首变化，通知后续排队者重新检查
+                        self._generation += 1
+                        self._condition.notify_all()
+                        return
+                    position = self._queue.index(suite_id) + 1
+                    generation = self._generation
+
+                # 通知回调在锁外执行（可能涉及网络发送）
+                if (position, reason) != last_state:
+                    last_state = (position, reason)
+                    if self.logger:
+                        self.logger.info(f"测试套 {suite_id} 排队中: 位置={position}, 原因={reason}")
+                    if on_queued:
+                        await on_queued(position, reason)
+
+                # 槽位释放时被唤醒；资源不足时按间隔重新检查
+                async with self._condition:
+                    if generation != self._generation:
+                        continue
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=self.check_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        except BaseException:
+            # 取消或异常时出队，避免阻塞后续测试套
+            if suite_id in self._queue:
+                self._queue.remove(suite_id)
+                self._queued_at.pop(suite_id, None)
+                await self._notify()
+            raise
+
+    async def release(self, suite_id: str) -> None:
+        """
+        释放执行槽位
+
+        Args:
+            suite_id: 测试套ID
+        """
+        if suite_id in self._running:
+            self._running.discard(suite_id)
+            await self._notify()
+
+    async def _notify(self) -> None:
+        """唤醒所有排队者重新检查"""
+        async with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取调度状态（用于心跳上报）
+
+        Returns:
+            包含最大并发、执行中和排队中的测试套信息
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": sorted(self._running),
+            "queued": list(self._queue)
+        }
@@ -1,5 +1,6 @@
 """系统监控模块"""
 import platform
+import time
 import psutil
 from typing import Dict, Any, Optional
 from pathlib import Path
@@ -8,76 +9,132 @@ from pathlib import Path
 class SystemMonitor:
     """系统监控类"""
     
+    # 心跳变化阈值：动态指标变化超过阈值才上报
+    CPU_DELTA_PERCENT = 5.0
+    MEMORY_DELTA_PERCENT = 2.0
+    DISK_DELTA_PERCENT = 1.0
+    
+    # 静态信息（IP等）重新检查的间隔（秒）
+    STATIC_REFRESH_INTERVAL = 300
+    
     def __init__(self):
         self._last_cpu_percent: Optional[float] = None
         self._last_memory_info: Optional[Dict[str, Any]] = None
         self._last_disk_info: Optional[Dict[str, Any]] = None
+        self._static_info: Optional[Dict[str, Any]] = None
+        self._static_collected_at: float = 0.0
+        self._last_sent: Dict[str, Any] = {}  # 上一次心跳已上报的字段值
+        
+        # 预热：cpu_percent(interval=None) 首次调用返回无意义的0.0
+        try:
+            psutil.cpu_percent(interval=None)
+        except Exception:
+            pass
     
-    def get_cpu_info(self) -> Dict[str, Any]:
+    def _get_cpu_model(self) -> str:
+        """获取CPU型号（平台相关，只在采集静态信息时调用）"""
+        cpu_model = "Unknown"
+        try:
+            if platform.system() == "Linux":
+                with open("/proc/cpuinfo", "r") as f:
+                    for line in f:
+                        if "model name" in line:
+                            cpu_model = line.split(":")[1].strip()
+                            break
+            elif platform.system() == "Darwin":  # macOS
+                import subprocess
+                result = subprocess.run(
+                    ["sysctl", "-n", "machdep.cpu.brand_string"],
+                    capture_output=True,
+                    text=True
+                )
+                if result.returncode == 0:
+                    cpu_model = result.stdout.strip()
+            elif platform.system() == "Windows":
+                import subprocess
+                result = subprocess.run(
+                    ["wmic", "cpu", "get", "name"],
+                    capture_output=True,
+                    text=True
+                )
+                if result.returncode == 0:
+                    lines = result.stdout.strip().split("\n")
+                    if len(lines) > 1:
+                        cpu_model = lines[1].strip()
+        except Exception:
+            pass
+        return cpu_model
+    
+    def get_static_info(self, refresh: bool = False) -> Dict[str, Any]:
         """
-        获取CPU信息
+        获取静态信息（CPU型号/核数、操作系统、网络），采集一次后缓存
+        
+        Args:
+            refresh: 是否强制重新采集
         
         Returns:
-            CPU信息字典
+            包含cpu、os、network的字典
         """
-        try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            cpu_count = psutil.cpu_count(logical=True)
-            cpu_freq = psutil.cpu_freq()
-            
-            # 获取CPU型号（平台相关）
-            cpu_model = "Unknown"
+        now = time.monotonic()
+        if refresh or self._static_info is None:
             try:
-                if platform.system() == "Linux":
-                    with open("/proc/cpuinfo", "r") as f:
-                        for line in f:
-                            if "model name" in line:
-                                cpu_model = line.split(":")[1].strip()
-                                break
-                elif platform.system() == "Darwin":  # macOS
-                    import subprocess
-                    result = subprocess.run(
-                        ["sysctl", "-n", "machdep.cpu.brand_string"],
-                        capture_output=True,
-                        text=True
-                    )
-                    if result.returncode == 0:
-                        cpu_model = result.stdout.strip()
-                elif platform.system() == "Windows":
-                    import subprocess
-                    result = subprocess.run(
-                        ["wmic", "cpu", "get", "name"],
-                        capture_output=True,
-                        text=True
-                    )
-                    if result.returncode == 0:
-                        lines = result.stdout.strip().split("\n")
-                        if len(lines) > 1:
-                            cpu_model = lines[1].strip()
+                cpu_freq = psutil.cpu_freq()
             except Exception:
-                pass
-            
-            return {
-                "usage_percent": round(cpu_percent, 2),
-                "cores": cpu_count,
-                "model": cpu_model,
-                "frequency": f"{cpu_freq.current:.2f}MHz" if cpu_freq else "Unknown"
+                cpu_freq = None
+            self._static_info = {
+                "cpu": {
+                    "cores": psutil.cpu_count(logical=True) or 0,
+                    "model": self._get_cpu_model(),
+                    "frequency": f"{cpu_freq.current:.2f}MHz" if cpu_freq else "Unknown"
+                },
+                "os": self.get_os_info(),
+                "network": self.get_network_info()
             }
-        except Exception as e:
+            self._static_collected_at = now
+        elif now - self._static_collected_at >= self.STATIC_REFRESH_INTERVAL:
+            # 只有网络信息（IP）可能在运行期间变化，定期重新检查
+            self._static_info["network"] = self.get_network_info()
+            self._static_collected_at = now
+        return self._static_info
+    
+    def get_cpu_info(self) -> Dict[str, Any]:
+        """
+        获取CPU信息（使用率非阻塞采样，型号等静态信息使用缓存）
+        
+        Returns:
+            CPU信息字典
+        """
+        static_cpu = self.get_static_info()["cpu"]
+        try:
+            # interval=None 返回自上次调用以来的平均使用率，不阻塞事件循环
+            cpu_percent = psutil.cpu_percent(interval=None)
+            self._last_cpu_percent = round(cpu_percent, 2)
+        except Exception:
             # 如果采集失败，使用上一次的值
-            if self._last_cpu_percent is not None:
-                return {
-                    "usage_percent": self._last_cpu_percent,
-                    "cores": psutil.cpu_count(logical=True) or 0,
-                    "model": "Unknown",
-                    "frequency": "Unknown"
-                }
+            pass
+        
+        return {
+            "usage_percent": self._last_cpu_percent if self._last_cpu_percent is not None else 0.0,
+            **static_cpu
+        }
+    
+    def get_resource_usage(self) -> Dict[str, float]:
+        """
+        获取当前CPU和内存使用率（非阻塞，用于准入控制）
+        
+        Returns:
+            包含cpu_percent和memory_percent的字典
+        """
+        try:
+            # interval=None 返回自上次调用以来的平均使用率，不阻塞
+            cpu_percent = psutil.cpu_percent(interval=None)
+            memory_percent = psutil.virtual_memory().percent
             return {
-                "usage_percent": 0.0,
-                "cores": 0,
-                "model": "Unknown",
-                "frequency": "Unknown"
+                "cpu_percent": round(cpu_percent, 2),
+                "memory_percent": round(memory_percent, 2)
             }
+        except Exception:
+            return {"cpu_percent": 0.0, "memory_percent": 0.0}
     
     def get_memory_info(self) -> Dict[str, Any]:
         """
@@ -244,11 +301,61 @@ class SystemMonitor:
         Returns:
             包含所有系统信息的字典
         """
+        static_info = self.get_static_info()
         return {
             "cpu": self.get_cpu_info(),
             "memory": self.get_memory_info(),
             "disk": self.get_disk_info(work_dir),
-            "network": self.get_network_info(),
-            "os": self.get_os_info()
+            "network": static_info["network"],
+            "os": static_info["os"]
         }
-
+    
+    def reset_heartbeat(self) -> None:
+        """重置已上报状态，下一次心跳发送完整信息（连接建立时调用）"""
+        self._last_sent = {}
+    
+    def get_heartbeat_info(self, work_dir: Optional[Path] = None) -> Dict[str, Any]:
+        """
+        获取心跳节点信息（增量）
+        
+        静态字段只在首次（或变化时）上报；动态指标的使用率变化超过阈值才上报。
+        没有字段变化时返回空字典，心跳仍用于保活。
+        
+        Args:
+            work_dir: 工作目录路径
+        
+        Returns:
+            后端节点信息格式的字典（node_ip、os_type、os_version、cpu_info、memory_info、disk_info 的子集）
+        """
+        system_info = self.get_all_info(work_dir)
+        node_info = {
+            "node_ip": system_info["network"].get("ip", ""),
+            "os_type": system_info["os"].get("type", ""),
+            "os_version": system_info["os"].get("version", ""),
+            "cpu_info": system_info["cpu"],
+            "memory_info": system_info["memory"],
+            "disk_info": system_info["disk"],
+        }
+        thresholds = {
+            "cpu_info": self.CPU_DELTA_PERCENT,
+            "memory_info": self.MEMORY_DELTA_PERCENT,
+            "disk_info": self.DISK_DELTA_PERCENT,
+        }
+        
+        changed = {}
+        for key, value in node_info.items():
+            last = self._last_sent.get(key)
+            if last is None:
+                changed[key] = value
+            elif key in thresholds:
+                # 除使用率以外的字段（总量、型号等）变化也需要上报
+                usage_delta = abs(value.get("usage_percent", 0.0) - last.get("usage_percent", 0.0))
+                static_changed = {k: v for k, v in value.items() if k not in ("usage_percent", "used", "free")} != \
+                    {k: v for k, v in last.items() if k not in ("usage_percent", "used", "free")}
+                if usage_delta >= thresholds[key] or static_changed:
+                    changed[key] = value
+            elif value != last:
+                changed[key] = value
+        
+        self._last_sent.update(changed)
+        return changed
@@ -1,12 +1,35 @@
 """WebSocket客户端模块"""
 import asyncio
-import json
+import uuid
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, Optional, Callable, Awaitable
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque, Tuple
 from urllib.parse import urlparse, parse_qs, urlencode
 import websockets
 from websockets.exceptions import ConnectionClosed
 
+try:
+    from .send_queue import OutboundQueue
+    from .offline_spool import OfflineSpool
+    from .message_codec import ENCODING_JSON, supported_encodings, encode_message, decode_message
+except ImportError:
+    from send_queue import OutboundQueue
+    from offline_spool import OfflineSpool
+    from message_codec import ENCODING_JSON, supported_encodings, encode_message, decode_message
+
+
+# 需要保证送达的消息类型：断线时写入离线缓存，重连后按序补发；
+# 服务端支持确认时，在线发送也先写入离线缓存，收到确认后才提交
+DURABLE_MESSAGE_TYPES = {
+    "test_suite_result",
+    "test_suite_completed",
+    "slot_released",
+    "test_suite_log",
+    "test_suite_log_batch",
+    "task_result",
+    "task_log"
+}
+
 
 class WebSocketClient:
     """WebSocket客户端类"""
@@ -18,7 +41,10 @@ class WebSocketClient:
         on_message: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
         on_connect: Optional[Callable[[], Awaitable[None]]] = None,
         on_disconnect: Optional[Callable[[], Awaitable[None]]] = None,
-        logger=None
+        logger=None,
+        max_log_backlog_bytes: int = 4 * 1024 * 1024,
+        compression: bool = True,
+        binary_encoding: bool = True
     ):
         """
         初始化WebSocket客户端
@@ -30,6 +56,9 @@ class WebSocketClient:
             on_connect: 连接成功回调函数
             on_disconnect: 断开连接回调函数
             logger: 日志器
+            max_log_backlog_bytes: 发送队列中日志最大积压字符数，超过后丢弃最旧日志
+            compression: 是否启用permessage-deflate压缩
+            binary_encoding: 是否允许协商msgpack二进制编码（需安装msgpack）
         """
         self.server_url = server_url
         self.token = token
@@ -45,6 +74,28 @@ class WebSocketClient:
         self.reconnect_delay = 3  # 重连延迟时间（秒），从服务器配置获取
         self._reconnect_task: Optional[asyncio.Task] = None
         self._should_reconnect = True
+        
+        # 传输编码：连接时在URL中声明支持的编码，服务端在welcome消息中确定
+        self.compression = compression
+        self.binary_encoding = binary_encoding
+        self.encoding = ENCODING_JSON
+        
+        # 发送队列：所有消息由单个写任务按优先级发送（控制/结果 > 日志 > 心跳）
+        self._send_queue = OutboundQueue(max_log_bytes=max_log_backlog_bytes)
+        self._writer_task: Optional[asyncio.Task] = None
+        self._writer_busy = False
+        
+        # 离线缓存：可靠消息带(session, seq)，服务端据此对补发的消息去重
+        self.session_id = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._spool: Optional[OfflineSpool] = None
+        self._replay_needed = False
+        
+        # 消息确认：服务端在welcome中声明acks后，会对处理完的可靠消息回复ack，
+        # 已发送未确认的消息按发送顺序记录(session, seq, 离线缓存中的结束偏移)
+        self._server_acks = False
+        self._unacked: Deque[Tuple[Optional[str], Optional[int], int]] = deque()
+        self._early_message: Optional[Dict[str, Any]] = None
     
     def _build_url(self) -> str:
         """
@@ -56,6 +107,9 @@ class WebSocketClient:
         parsed = urlparse(self.server_url)
         query_params = parse_qs(parsed.query)
         query_params["token"] = [self.token]
+        encodings = supported_encodings(self.binary_encoding)
+        if encodings != [ENCODING_JSON]:
+            query_params["encodings"] = [",".join(encodings)]
         new_query = urlencode(query_params, doseq=True)
         
         # 重建URL
@@ -82,15 +136,31 @@ class WebSocketClient:
             if self.logger:
                 self.logger.info(f"正在连接到WebSocket服务器: {self.server_url}")
             
+            # 新连接在协商前使用JSON
+            self.encoding = ENCODING_JSON
             self.websocket = await websockets.connect(
                 url,
                 ping_interval=20,
                 ping_timeout=10,
-                close_timeout=10
+                close_timeout=10,
+                compression="deflate" if self.compression else None
             )
             
+            # 服务端连接后首先发送welcome，在写任务启动前读取，确定编码以及是否支持消息确认
+            self._server_acks = False
+            self._early_message = None
+            try:
+                first = decode_message(await asyncio.wait_for(self.websocket.recv(), timeout=10))
+                if first.get("type") == "welcome":
+                    self._apply_welcome(first)
+                self._early_message = first  # 交给接收循环处理
+            except (asyncio.TimeoutError, ValueError) as e:
+                if self.logger:
+                    self.logger.warning(f"未收到welcome消息，按旧版本服务端处理: {e}")
+            
             self.connected = True
             self.reconnect_interval = 1  # 重置重连间隔
+            self._start_writer()
             
             if self.logger:
                 self.logger.info("WebSocket连接成功")
@@ -124,32 +194,78 @@ class WebSocketClient:
             "agent_info": {
                 "version": "1.0.0",
                 "platform": platform_info["platform"],
-                "python_version": platform_info["python_version"]
+                "python_version": platform_info["python_version"],
+                "capabilities": ["workspace_stream", "workspace_search", "workspace_sync", "slot_release"]  # 支持文件流式传输、远程搜索、增量同步和槽位释放通知
             }
         }
         await self.send_message(auth_message)
     
+    def set_offline_spool(self, spool: Optional[OfflineSpool]) -> None:
+        """
+        设置离线缓存（工作目录确定后调用）
+        
+        Args:
+            spool: 离线缓存，None表示不缓存
+        """
+        self._spool = spool
+        self._unacked.clear()
+        if spool and spool.has_pending():
+            if self.logger:
+                self.logger.info(f"离线缓存中有 {spool.pending_bytes} 字节待补发消息")
+            if self.connected:
+                self._replay_needed = True
+                self._send_queue.wake()
+    
     async def send_message(self, message: Dict[str, Any]) -> bool:
         """
-        发送消息
+        发送消息（放入发送队列，由写任务按优先级发送）
+        
+        控制/结果消息等待实际发送完成；日志和心跳入队即返回，
+        积压时日志合并或丢弃最旧部分，心跳只保留最新一条。
+        结果、完成状态和日志等可靠消息在连接不可用时写入离线缓存，重连后补发。
         
         Args:
             message: 要发送的消息字典
         
         Returns:
-            是否发送成功
+            是否发送成功（日志和心跳为是否成功入队，可靠消息写入离线缓存也视为成功）
         """
+        if message.get("type") in DURABLE_MESSAGE_TYPES and "seq" not in message:
+            self._seq += 1
+            message["session"] = self.session_id
+            message["seq"] = self._seq
+        
         if not self.connected or not self.websocket:
+            if "seq" in message and self._spool:
+                return self._spool.append(message) is not None
             if self.logger:
                 self.logger.warning("WebSocket未连接，无法发送消息")
             return False
         
+        future = self._send_queue.put(message)
+        if future is None:
+            return True
+        return await future
+    
+    async def _send_now(self, message: Dict[str, Any]) -> bool:
+        """
+        立即发送一条消息（仅由写任务调用）
+        
+        Args:
+            message: 要发送的消息字典
+        
+        Returns:
+            是否发送成功
+        """
+        if not self.connected or not self.websocket:
+            return False
+        
         try:
-            message_str = json.dumps(message, ensure_ascii=False)
+            frame = encode_message(message, self.encoding)
             message_type = message.get("type", "unknown")
             if self.logger:
-                self.logger.debug(f"[WebSocket] 发送消息: type={message_type}, message_size={len(message_str)}")
-            await self.websocket.send(message_str)
+                self.logger.debug(f"[WebSocket] 发送消息: type={message_type}, encoding={self.encoding}, message_size={len(frame)}")
+            await self.websocket.send(frame)
             if self.logger and message_type == "test_suite_result":
                 self.logger.info(f"[WebSocket] 成功发送test_suite_result消息: suite_id={message.get('suite_id')}, case_id={message.get('case_id')}, result={message.get('result')}")
             return True
@@ -159,27 +275,172 @@ class WebSocketClient:
             self.connected = False
             return False
     
-    async def send_heartbeat(self, system_info: Dict[str, Any]) -> bool:
+    def _start_writer(self) -> None:
+        """启动写任务（已在运行则跳过）"""
+        if self._writer_task and not self._writer_task.done():
+            return
+        self._writer_task = asyncio.create_task(self._writer_loop())
+    
+    async def _writer_loop(self) -> None:
+        """写任务：认证后先补发离线缓存，再按优先级逐条发送队列中的消息"""
+        while True:
+            await self._send_queue.wait()
+            if self._replay_needed:
+                self._replay_needed = False
+                if not await self._replay_spool():
+                    self._drop_pending()
+                    continue
+            
+            item = self._send_queue.pop()
+            if item is None:
+                continue
+            message, future = item
+            self._writer_busy = True
+            try:
+                spooled_offset = self._write_ahead(message)
+                success = await self._send_now(message)
+            finally:
+                self._writer_busy = False
+            if spooled_offset is not None:
+                # 已在离线缓存中：收到确认后提交，发送失败或断线时重连后从缓存补发
+                self._unacked.append((message["session"], message["seq"], spooled_offset))
+                success = True
+            elif not success and "seq" in message and self._spool:
+                success = self._spool.append(message) is not None
+            if future is not None and not future.done():
+                future.set_result(success)
+            
+            if not self.connected:
+                self._drop_pending()
+            elif message.get("type") == "auth" and self._spool and self._spool.has_pending():
+                # 认证消息发出后、新消息之前补发离线缓存，保证顺序
+                self._replay_needed = True
+                self._send_queue.wake()
+    
+    def _write_ahead(self, message: Dict[str, Any]) -> Optional[int]:
+        """
+        服务端支持确认时，可靠消息发送前先写入离线缓存
+        
+        Args:
+            message: 要发送的消息字典
+        
+        Returns:
+            消息在离线缓存中的结束偏移，未写入时返回None
+        """
+        if "seq" not in message or not self._server_acks or not self._spool or not self.connected:
+            return None
+        return self._spool.append(message)
+    
+    def _handle_ack(self, session: Optional[str], seq: Optional[int]) -> None:
+        """
+        处理服务端确认：服务端按接收顺序处理消息，确认某条消息即表示之前发送的消息都已处理，
+        离线缓存提交到该消息（及其后跳过的无法解析记录）的结束位置
+        
+        Args:
+            session: 确认的消息所属session
+            seq: 确认的消息序号，None表示只提交队首跳过的记录
+        """
+        offset = None
+        if seq is not None and any(entry[0] == session and entry[1] == seq for entry in self._unacked):
+            while self._unacked:
+                entry_session, entry_seq, offset = self._unacked.popleft()
+                if entry_session == session and entry_seq == seq:
+                    break
+        while self._unacked and self._unacked[0][1] is None:
+            offset = self._unacked.popleft()[2]
+        if offset is not None and self._spool:
+            self._spool.commit(offset)
+    
+    async def _replay_spool(self) -> bool:
+        """
+        按写入顺序补发离线缓存中的消息
+        
+        服务端支持确认时，补发的消息在收到确认后才提交；否则发送后立即提交。
+        
+        Returns:
+            是否全部补发完成（发送失败时返回False，未补发的部分保留在缓存中）
+        """
+        if not self._spool:
+            return True
+        
+        replayed = 0
+        # 本连接上已发送未确认的消息不再重复补发
+        offset = self._unacked[-1][2] if self._unacked else self._spool.committed_offset
+        self._writer_busy = True
+        try:
+            while self.connected:
+                entries, end = self._spool.read_pending(offset=offset)
+                if end <= offset:
+                    break
+                committed = 0
+                for entry_end, message in entries:
+                    if not await self._send_now(message):
+                        if not self._server_acks:
+                            self._spool.commit(committed)
+                        if self.logger:
+                            self.logger.warning(f"补发离线缓存中断，已补发 {replayed} 条消息")
+                        return False
+                    if self._server_acks:
+                        self._unacked.append((message.get("session"), message.get("seq"), entry_end))
+                    committed = entry_end
+                    replayed += 1
+                # 提交到读取结束位置，越过其中无法解析的记录
+                if self._server_acks:
+                    if end > committed:
+                        self._unacked.append((None, None, end))
+                else:
+                    self._spool.commit(end)
+                offset = end
+                # 让出事件循环，避免长时间补发阻塞其他协程
+                await asyncio.sleep(0)
+            self._handle_ack(None, None)
+        finally:
+            self._writer_busy = False
+        
+        if replayed and self.logger:
+            self.logger.info(f"离线缓存补发完成，共 {replayed} 条消息")
+        return True
+    
+    def _drop_pending(self) -> None:
+        """连接不可用时清空发送队列：可靠消息写入离线缓存，其余消息的发送方返回失败"""
+        # 已发送未确认的消息仍在离线缓存中，重连后从已确认位置补发
+        self._unacked.clear()
+        pending = self._send_queue.take_all()
+        if not pending:
+            return
+        
+        # 按seq顺序写入离线缓存，补发时保持原始发送顺序
+        durable = sorted(
+            (item for item in pending if "seq" in item[0]),
+            key=lambda item: item[0]["seq"]
+        )
+        spooled = 0
+        for message, future in durable:
+            success = bool(self._spool) and self._spool.append(message) is not None
+            spooled += 1 if success else 0
+            if future is not None and not future.done():
+                future.set_result(success)
+        for message, future in pending:
+            if future is not None and not future.done():
+                future.set_result(False)
+        
+        if self.logger:
+            self.logger.warning(
+                f"WebSocket连接不可用，发送队列中 {len(pending)} 条消息未发送，"
+                f"其中 {spooled} 条已写入离线缓存"
+            )
+    
+    async def send_heartbeat(self, node_info: Dict[str, Any]) -> bool:
         """
         发送心跳消息
         
         Args:
-            system_info: 系统信息字典
+            node_info: 节点信息（SystemMonitor.get_heartbeat_info 生成的增量字段，可以为空）
         
         Returns:
             是否发送成功
         """
-        # 后端期望的格式: {"type": "heartbeat", "data": {...}}
-        # 需要将system_info转换为后端期望的格式
-        node_info = {
-            "node_ip": system_info.get("network", {}).get("ip", ""),
-            "os_type": system_info.get("os", {}).get("type", ""),
-            "os_version": system_info.get("os", {}).get("version", ""),
-            "cpu_info": system_info.get("cpu", {}),
-            "memory_info": system_info.get("memory", {}),
-            "disk_info": system_info.get("disk", {}),
-        }
-        
+        # 后端期望的格式: {"type": "heartbeat", "data": {...}}，data中只包含变化的字段
         message = {
             "type": "heartbeat",
             "data": node_info
@@ -260,12 +521,27 @@ class WebSocketClient:
                 continue
             
             try:
+                if self._early_message is not None:
+                    # connect()中提前读取的welcome消息
+                    data, self._early_message = self._early_message, None
+                    if self.on_message:
+                        try:
+                            await self.on_message(data)
+                        except Exception as e:
+                            if self.logger:
+                                self.logger.error(f"处理消息时出错: {e}")
+                
                 async for message in self.websocket:
                     try:
-                        data = json.loads(message)
+                        data = decode_message(message)
+                        if data.get("type") == "welcome":
+                            self._apply_welcome(data)
+                        elif data.get("type") == "ack":
+                            self._handle_ack(data.get("session"), data.get("seq"))
+                            continue
                         if self.on_message:
                             await self.on_message(data)
-                    except json.JSONDecodeError as e:
+                    except ValueError as e:
                         if self.logger:
                             self.logger.error(f"解析消息失败: {e}, 消息内容: {message[:100]}")
                     except Exception as e:
@@ -276,6 +552,7 @@ class WebSocketClient:
                 if self.logger:
                     self.logger.warning("WebSocket连接已关闭")
                 self.connected = False
+                self._drop_pending()
                 
                 # 清理websocket对象
                 self.websocket = None
@@ -334,6 +611,7 @@ class WebSocketClient:
                 if self.logger:
                     self.logger.error(f"接收消息时出错: {e}")
                 self.connected = False
+                self._drop_pending()
                 self.websocket = None
                 
                 # 如果应该重连，启动重连任务并等待
@@ -374,6 +652,22 @@ class WebSocketClient:
         if self.logger:
             self.logger.info("消息接收循环已退出")
     
+    def _apply_welcome(self, welcome: Dict[str, Any]) -> None:
+        """
+        根据welcome消息确定发送编码和是否使用消息确认（旧版本服务端不返回encoding和acks，
+        继续使用JSON，可靠消息发送后即视为送达）
+        
+        Args:
+            welcome: welcome消息
+        """
+        encoding = welcome.get("encoding") or ENCODING_JSON
+        if encoding not in supported_encodings(self.binary_encoding):
+            encoding = ENCODING_JSON
+        self.encoding = encoding
+        self._server_acks = bool(welcome.get("acks"))
+        if self.logger:
+            self.logger.info(f"WebSocket消息编码: {self.encoding}, 消息确认: {self._server_acks}")
+    
     async def _start_reconnect(self) -> None:
         """启动重连任务"""
         if self._reconnect_task and not self._reconnect_task.done():
@@ -430,6 +724,20 @@ class WebSocketClient:
             except asyncio.CancelledError:
                 pass
         
+        # 尽量发完队列中剩余的消息并等待确认（未确认的消息保留在离线缓存中，下次启动后补发）
+        for _ in range(50):
+            if (not len(self._send_queue) and not self._writer_busy and not self._unacked) or not self.connected:
+                break
+            await asyncio.sleep(0.1)
+        
+        if self._writer_task and not self._writer_task.done():
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._drop_pending()
+        
         if self.websocket:
             try:
                 await self.websocket.close()
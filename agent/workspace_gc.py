@@ -0,0 +1,325 @@
+"""工作空间清理模块 - 按保留天数、数量和总大小回收测试套输出、任务目录、worktree和仓库镜像"""
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set, Tuple
+
+
+# 可回收项类型
+KIND_SUITE_OUTPUT = "suite_output"  # suites/<suite_id>/output/<execution_id>
+KIND_WORKTREE = "worktree"          # suites/<suite_id>/repo（可从镜像重新检出）
+KIND_TASK = "task"                  # tasks/<task_id> 及 logs/tasks/<task_id>.log
+KIND_MIRROR = "mirror"              # cache/git/<name>.git
+
+
+class _GcItem:
+    """可回收项"""
+
+    __slots__ = ("kind", "group", "paths", "size", "last_used")
+
+    def __init__(self, kind: str, group: str, paths: List[Path], size: int, last_used: float):
+        self.kind = kind
+        self.group = group  # 数量保留的分组（测试套ID，任务统一为一组）
+        self.paths = paths
+        self.size = size
+        self.last_used = last_used
+
+
+def _path_stats(path: Path) -> Tuple[int, float]:
+    """
+    统计文件或目录树的大小和最近修改时间（不跟随符号链接）
+
+    Args:
+        path: 文件或目录
+
+    Returns:
+        (字节数, 最近修改时间戳)
+    """
+    try:
+        stat = path.lstat()
+    except OSError:
+        return 0, 0.0
+    if not path.is_dir() or path.is_symlink():
+        return stat.st_size, stat.st_mtime
+
+    size = 0
+    latest = stat.st_mtime
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    latest = max(latest, entry_stat.st_mtime)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        size += entry_stat.st_size
+        except OSError:
+            continue
+    return size, latest
+
+
+def _is_related(path: Path, protected: Iterable[Path]) -> bool:
+    """path与任一受保护路径相同、位于其中或包含它"""
+    for other in protected:
+        if path == other or path in other.parents or other in path.parents:
+            return True
+    return False
+
+
+class WorkspaceGC:
+    """工作空间清理
+
+    定期扫描工作目录，按以下顺序回收空间：
+
+    1. 最近使用时间超过 ``keep_days`` 天的项；
+    2. 每个测试套只保留最近 ``keep_tasks`` 次执行的输出，任务目录同样只保留最近 ``keep_tasks`` 个；
+    3. 总占用仍超过 ``max_bytes`` 时，按最近使用时间从旧到新继续回收。
+
+    未配置Git的测试套目录中是用户上传的脚本，只回收其执行输出。
+    正在执行的测试套和任务（以及其worktree使用的仓库镜像）不会被回收。
+    """
+
+    def __init__(
+        self,
+        work_dir: Path,
+        keep_days: int = 7,
+        keep_tasks: int = 10,
+        max_bytes: int = 0,
+        interval: float = 3600.0,
+        get_active_paths: Optional[Callable[[], Iterable[Path]]] = None,
+        logger=None
+    ):
+        """
+        初始化工作空间清理
+
+        Args:
+            work_dir: 工作目录
+            keep_days: 保留天数，0表示不按时间回收
+            keep_tasks: 每个测试套保留的执行输出数（及保留的任务数），0表示不按数量回收
+            max_bytes: 工作目录可回收部分的总大小上限，0表示不限制
+            interval: 清理间隔（秒）
+            get_active_paths: 返回正在使用的目录（正在执行的测试套、任务目录）
+            logger: 日志器
+        """
+        self.work_dir = Path(work_dir)
+        self.keep_days = keep_days
+        self.keep_tasks = keep_tasks
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._get_active_paths = get_active_paths
+        self.logger = logger
+
+        self._lock = asyncio.Lock()  # 删除期间持有，测试套开始执行前等待
+        self.reclaimed_bytes = 0  # 累计回收字节数
+        self._report: Optional[Dict[str, Any]] = None  # 待随心跳上报的清理结果
+
+    async def run_forever(self) -> None:
+        """按间隔循环清理"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"工作空间清理出错: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def wait_idle(self) -> None:
+        """等待正在进行的删除完成（测试套登记为执行中之后调用，之后不会再被回收）"""
+        async with self._lock:
+            pass
+
+    def pop_report(self) -> Optional[Dict[str, Any]]:
+        """
+        取出最近一次清理的结果（用于心跳上报）
+
+        Returns:
+            清理结果，没有新结果时返回None
+        """
+        report = self._report
+        self._report = None
+        return report
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        执行一次清理
+
+        Returns:
+            清理结果：last_run, reclaimed_bytes（本次）, total_reclaimed_bytes, removed, usage_bytes
+        """
+        loop = asyncio.get_event_loop()
+        items, fixed_bytes = await loop.run_in_executor(None, self._scan)
+        usage = fixed_bytes + sum(item.size for item in items)
+
+        reclaimed = 0
+        removed = 0
+        for item in self._select(items, usage):
+            async with self._lock:
+                # 删除前重新检查：扫描之后可能有测试套开始执行
+                if _is_related(item.paths[0], self._protected_paths()):
+                    continue
+                await loop.run_in_executor(None, self._remove, item)
+            reclaimed += item.size
+            removed += 1
+            if self.logger:
+                self.logger.info(f"已清理{item.kind}: {item.paths[0]}（{item.size} 字节）")
+
+        self.reclaimed_bytes += reclaimed
+        report = {
+            "last_run": datetime.now().isoformat(),
+            "reclaimed_bytes": reclaimed,
+            "total_reclaimed_bytes": self.reclaimed_bytes,
+            "removed": removed,
+            "usage_bytes": usage - reclaimed
+        }
+        self._report = report
+        if self.logger and removed:
+            self.logger.info(f"工作空间清理完成: 回收 {reclaimed} 字节，删除 {removed} 项，当前占用 {usage - reclaimed} 字节")
+        return report
+
+    def _protected_paths(self) -> Set[Path]:
+        """正在使用的目录，以及这些目录中的worktree所使用的仓库镜像"""
+        protected = set()
+        for path in (self._get_active_paths() if self._get_active_paths else []):
+            path = Path(path)
+            protected.add(path)
+            git_file = path / "repo" / ".git"
+            try:
+                if git_file.is_file():
+                    # worktree的.git文件内容为 "gitdir: <镜像>/worktrees/<名称>"
+                    gitdir = git_file.read_text(encoding="utf-8").strip()
+                    if gitdir.startswith("gitdir:"):
+                        protected.add(Path(gitdir[len("gitdir:"):].strip()).parent.parent)
+            except OSError:
+                continue
+        return protected
+
+    def _scan(self) -> Tuple[List[_GcItem], int]:
+        """
+        扫描工作目录中的可回收项
+
+        Returns:
+            (可回收项列表, 不可回收部分的字节数)
+        """
+        items: List[_GcItem] = []
+        fixed_bytes = 0
+
+        suites_dir = self.work_dir / "suites"
+        if suites_dir.is_dir():
+            for suite_dir in suites_dir.iterdir():
+                if not suite_dir.is_dir():
+                    continue
+                suite_id = suite_dir.name
+                for child in suite_dir.iterdir():
+                    if child.name == "output" and child.is_dir():
+                        for execution_dir in child.iterdir():
+                            size, last_used = _path_stats(execution_dir)
+                            items.append(_GcItem(KIND_SUITE_OUTPUT, suite_id, [execution_dir], size, last_used))
+                    elif child.name == "repo" and (child / ".git").is_file():
+                        size, last_used = _path_stats(child)
+                        items.append(_GcItem(KIND_WORKTREE, suite_id, [child], size, last_used))
+                    else:
+                        fixed_bytes += _path_stats(child)[0]
+
+        tasks_dir = self.work_dir / "tasks"
+        task_logs_dir = self.work_dir / "logs" / "tasks"
+        if tasks_dir.is_dir():
+            for task_dir in tasks_dir.iterdir():
+                paths = [task_dir]
+                size, last_used = _path_stats(task_dir)
+                log_file = task_logs_dir / f"{task_dir.name}.log"
+                if log_file.is_file():
+                    paths.append(log_file)
+                    log_size, log_used = _path_stats(log_file)
+                    size += log_size
+                    last_used = max(last_used, log_used)
+                items.append(_GcItem(KIND_TASK, "tasks", paths, size, last_used))
+
+        mirrors_dir = self.work_dir / "cache" / "git"
+        if mirrors_dir.is_dir():
+            for mirror_dir in mirrors_dir.iterdir():
+                if mirror_dir.is_dir() and mirror_dir.name.endswith(".git"):
+                    size, _ = _path_stats(mirror_dir)
+                    # 镜像的最近使用时间取最近一次fetch的时间
+                    last_used = max(
+                        _path_stats(mirror_dir / name)[1] for name in ("FETCH_HEAD", "HEAD")
+                    )
+                    items.append(_GcItem(KIND_MIRROR, "mirrors", [mirror_dir], size, last_used))
+
+        return items, fixed_bytes
+
+    def _select(self, items: List[_GcItem], usage: int) -> List[_GcItem]:
+        """
+        按保留策略选出要回收的项（已排除正在使用的项）
+
+        Args:
+            items: 可回收项
+            usage: 当前总占用字节数
+
+        Returns:
+            要回收的项，按回收顺序排列
+        """
+        protected = self._protected_paths()
+        candidates = [item for item in items if not _is_related(item.paths[0], protected)]
+        selected: List[_GcItem] = []
+        selected_ids = set()
+
+        def select(item: _GcItem) -> None:
+            if id(item) not in selected_ids:
+                selected_ids.add(id(item))
+                selected.append(item)
+
+        # 1. 超过保留天数
+        if self.keep_days and self.keep_days > 0:
+            cutoff = time.time() - self.keep_days * 86400
+            for item in candidates:
+                if item.last_used < cutoff:
+                    select(item)
+
+        # 2. 超过保留数量（每个测试套的执行输出、全部任务）
+        if self.keep_tasks and self.keep_tasks > 0:
+            groups: Dict[Tuple[str, str], List[_GcItem]] = {}
+            for item in items:
+                if item.kind in (KIND_SUITE_OUTPUT, KIND_TASK):
+                    groups.setdefault((item.kind, item.group), []).append(item)
+            candidate_ids = {id(item) for item in candidates}
+            for group_items in groups.values():
+                group_items.sort(key=lambda item: item.last_used, reverse=True)
+                for item in group_items[self.keep_tasks:]:
+                    if id(item) in candidate_ids:
+                        select(item)
+
+        # 3. 超过总大小上限，从最久未使用的开始回收
+        if self.max_bytes and self.max_bytes > 0:
+            remaining = usage - sum(item.size for item in selected)
+            for item in sorted(candidates, key=lambda item: item.last_used):
+                if remaining <= self.max_bytes:
+                    break
+                if id(item) not in selected_ids:
+                    select(item)
+                    remaining -= item.size
+
+        return selected
+
+    def _remove(self, item: _GcItem) -> None:
+        """删除回收项的所有路径"""
+        for path in item.paths:
+            try:
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"清理 {path} 失败: {e}")
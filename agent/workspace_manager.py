@@ -1,11 +1,29 @@
 """工作空间管理模块 - 处理文件系统操作"""
 import os
+import re
 import shutil
 import base64
+import fnmatch
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 from datetime import datetime
 
+try:
+    from .delta_sync import DeltaApplier, tree_signatures
+except ImportError:
+    from delta_sync import DeltaApplier, tree_signatures
+
+
+# 工作空间搜索参数
+SEARCH_MAX_FILE_SIZE = 1024 * 1024 * 1024  # 默认跳过超过1GB的文件
+SEARCH_MAX_HITS = 1000  # 默认最多返回的匹配数
+SEARCH_LINE_LIMIT = 64 * 1024  # 单次读取的最大行长度，超长行分段匹配
+SEARCH_TEXT_LIMIT = 500  # 返回的匹配行最大字符数
+
+
+class WorkspaceOperationCancelled(Exception):
+    """工作空间操作被取消"""
+
 
 class WorkspaceManager:
     """工作空间管理器"""
@@ -18,6 +36,7 @@ class WorkspaceManager:
             work_dir: 工作目录路径
         """
         self.work_dir = work_dir
+        self._delta_applier = DeltaApplier()
     
     def _get_absolute_path(self, relative_path: str) -> Path:
         """
@@ -47,15 +66,40 @@ class WorkspaceManager:
         
         return absolute_path
     
-    def list_files(self, path: str = "") -> List[Dict[str, Any]]:
+    def resolve_path(self, path: str) -> Path:
+        """
+        将相对路径解析为工作目录内的绝对路径（不允许访问工作目录外的路径）
+        
+        Args:
+            path: 相对路径
+            
+        Returns:
+            绝对路径
+        """
+        return self._get_absolute_path(path) if path else self.work_dir
+    
+    def list_files(
+        self,
+        path: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+        should_stop=None
+    ) -> Any:
         """
         列出指定路径下的文件和文件夹
         
+        使用os.scandir遍历，先按类型和名称排序，只对当前页的条目调用stat，
+        大目录分页列出时不需要stat全部条目。
+        
         Args:
             path: 相对路径，默认为工作目录根
+            offset: 分页起始位置
+            limit: 每页条目数，None表示不分页
+            should_stop: 返回True时中止列出的回调（用于取消）
             
         Returns:
-            文件列表，每个文件包含：name, type, size, modified, path
+            不分页时返回文件列表，每个文件包含：name, type, size, modified, path；
+            分页时返回字典：items（文件列表）, total, offset, limit
         """
         try:
             target_path = self._get_absolute_path(path) if path else self.work_dir
@@ -66,26 +110,49 @@ class WorkspaceManager:
             if not target_path.is_dir():
                 raise ValueError(f"路径不是目录: {path}")
             
+            # 第一遍只读取目录项类型（来自readdir，无需stat）
+            entries = []
+            with os.scandir(target_path) as it:
+                for index, entry in enumerate(it):
+                    if should_stop and index % 1000 == 0 and should_stop():
+                        raise WorkspaceOperationCancelled("操作已取消")
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    entries.append((not is_dir, entry.name.lower(), entry, is_dir))
+            
+            # 按类型和名称排序：目录在前，然后按名称排序
+            entries.sort(key=lambda x: (x[0], x[1]))
+            total = len(entries)
+            offset = max(0, offset or 0)
+            page = entries[offset:offset + limit] if limit is not None else entries[offset:]
+            
             files = []
-            for item in target_path.iterdir():
+            for index, (_, _, entry, is_dir) in enumerate(page):
+                if should_stop and index % 1000 == 0 and should_stop():
+                    raise WorkspaceOperationCancelled("操作已取消")
                 try:
-                    stat = item.stat()
-                    file_info = {
-                        "name": item.name,
-                        "type": "directory" if item.is_dir() else "file",
-                        "size": stat.st_size if item.is_file() else 0,
+                    stat = entry.stat()
+                    files.append({
+                        "name": entry.name,
+                        "type": "directory" if is_dir else "file",
+                        "size": stat.st_size if not is_dir else 0,
                         "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "path": str(item.relative_to(self.work_dir))
-                    }
-                    files.append(file_info)
-                except (OSError, PermissionError) as e:
+                        "path": str(Path(entry.path).relative_to(self.work_dir))
+                    })
+                except (OSError, PermissionError):
                     # 跳过无法访问的文件
                     continue
             
-            # 按类型和名称排序：目录在前，然后按名称排序
-            files.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
-            
-            return files
+            if limit is None:
+                return files
+            return {
+                "items": files,
+                "total": total,
+                "offset": offset,
+                "limit": limit
+            }
         
         except Exception as e:
             raise Exception(f"列出文件失败: {str(e)}")
@@ -171,12 +238,13 @@ class WorkspaceManager:
         except Exception as e:
             raise Exception(f"写入文件失败: {str(e)}")
     
-    def delete_file(self, path: str) -> Dict[str, Any]:
+    def delete_file(self, path: str, should_stop=None) -> Dict[str, Any]:
         """
         删除文件或文件夹
         
         Args:
             path: 文件或文件夹相对路径
+            should_stop: 返回True时中止删除的回调（用于取消，已删除的部分不会恢复）
             
         Returns:
             操作结果：success, message
@@ -187,8 +255,11 @@ class WorkspaceManager:
             if not target_path.exists():
                 raise FileNotFoundError(f"路径不存在: {path}")
             
-            if target_path.is_dir():
-                shutil.rmtree(target_path)
+            if target_path.is_dir() and not target_path.is_symlink():
+                if should_stop:
+                    self._remove_tree(target_path, should_stop)
+                else:
+                    shutil.rmtree(target_path)
                 message = f"文件夹删除成功: {path}"
             else:
                 target_path.unlink()
@@ -202,6 +273,24 @@ class WorkspaceManager:
         except Exception as e:
             raise Exception(f"删除失败: {str(e)}")
     
+    def _remove_tree(self, root: Path, should_stop) -> None:
+        """逐项删除目录树，每删除一批检查一次是否取消"""
+        removed = 0
+        for dir_path, dir_names, file_names in os.walk(root, topdown=False):
+            for name in file_names:
+                os.unlink(os.path.join(dir_path, name))
+                removed += 1
+                if removed % 500 == 0 and should_stop():
+                    raise WorkspaceOperationCancelled(f"操作已取消（已删除 {removed} 项）")
+            for name in dir_names:
+                sub_path = os.path.join(dir_path, name)
+                # 指向目录的符号链接只删除链接本身
+                if os.path.islink(sub_path):
+                    os.unlink(sub_path)
+                else:
+                    os.rmdir(sub_path)
+        os.rmdir(root)
+    
     def create_directory(self, path: str) -> Dict[str, Any]:
         """
         创建文件夹
@@ -256,4 +345,207 @@ class WorkspaceManager:
         
         except Exception as e:
             raise Exception(f"获取文件信息失败: {str(e)}")
+    
+    def _match_globs(self, relative_path: str, patterns: List[str]) -> bool:
+        """相对路径或文件名是否匹配任一glob模式"""
+        name = relative_path.rsplit("/", 1)[-1]
+        return any(
+            fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern)
+            for pattern in patterns
+        )
+    
+    def search_files(
+        self,
+        pattern: str,
+        path: str = "",
+        regex: bool = False,
+        ignore_case: bool = False,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_file_size: int = SEARCH_MAX_FILE_SIZE,
+        max_hits: int = SEARCH_MAX_HITS,
+        stats: Optional[Dict[str, Any]] = None,
+        should_stop=None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        在工作空间中逐行搜索文本（流式，找到即返回，不把文件整体读入内存）
+        
+        Args:
+            pattern: 搜索内容
+            path: 搜索的相对路径（目录或文件），默认为工作目录根
+            regex: pattern是否为正则表达式
+            ignore_case: 是否忽略大小写
+            include: 只搜索匹配这些glob模式的文件（匹配相对路径或文件名）
+            exclude: 跳过匹配这些glob模式的文件和目录
+            max_file_size: 跳过超过该大小的文件（字节）
+            max_hits: 最多返回的匹配数
+            stats: 搜索统计（files_scanned, files_skipped, hits, truncated），由本方法填写
+            should_stop: 返回True时停止搜索的回调（用于取消）
+            
+        Yields:
+            匹配信息：path, line, column, text
+        """
+        if not pattern:
+            raise ValueError("搜索内容不能为空")
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            source = pattern.encode("utf-8")
+            matcher = re.compile(source if regex else re.escape(source), flags)
+        except re.error as e:
+            raise ValueError(f"无效的正则表达式: {e}")
+        
+        include = [p for p in (include or []) if p]
+        exclude = [p for p in (exclude or []) if p]
+        if stats is None:
+            stats = {}
+        stats.update({"files_scanned": 0, "files_skipped": 0, "hits": 0, "truncated": False})
+        
+        root = self.resolve_path(path)
+        if not root.exists():
+            raise FileNotFoundError(f"路径不存在: {path}")
+        work_dir = self.work_dir.resolve()
+        
+        def iter_files() -> Iterator[Path]:
+            if root.is_file():
+                yield root
+                return
+            for dir_path, dir_names, file_names in os.walk(root):
+                relative_dir = os.path.relpath(dir_path, work_dir).replace(os.sep, "/")
+                prefix = "" if relative_dir == "." else f"{relative_dir}/"
+                # 跳过被排除的目录，不再向下遍历
+                dir_names[:] = sorted(
+                    name for name in dir_names
+                    if not (exclude and self._match_globs(f"{prefix}{name}", exclude))
+                )
+                for name in sorted(file_names):
+                    yield Path(dir_path) / name
+        
+        for file_path in iter_files():
+            if should_stop and should_stop():
+                return
+            relative_path = str(file_path.relative_to(self.work_dir)).replace(os.sep, "/")
+            if include and not self._match_globs(relative_path, include):
+                continue
+            if exclude and self._match_globs(relative_path, exclude):
+                continue
+            
+            try:
+                if file_path.is_symlink() or file_path.stat().st_size > max_file_size:
+                    stats["files_skipped"] += 1
+                    continue
+                with open(file_path, "rb") as f:
+                    # 含NUL字节的视为二进制文件
+                    if b"\0" in f.read(8192):
+                        stats["files_skipped"] += 1
+                        continue
+                    f.seek(0)
+                    stats["files_scanned"] += 1
+                    
+                    line_no = 1
+                    while True:
+                        line = f.readline(SEARCH_LINE_LIMIT)
+                        if not line:
+                            break
+                        match = matcher.search(line)
+                        if match:
+                            text = line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+                            stats["hits"] += 1
+                            yield {
+                                "path": relative_path,
+                                "line": line_no,
+                                "column": len(line[:match.start()].decode("utf-8", errors="replace")) + 1,
+                                "text": text[:SEARCH_TEXT_LIMIT]
+                            }
+                            if stats["hits"] >= max_hits:
+                                stats["truncated"] = True
+                                return
+                        if line.endswith(b"\n"):
+                            line_no += 1
+                            if line_no % 10000 == 0 and should_stop and should_stop():
+                                return
+            except (OSError, PermissionError):
+                stats["files_skipped"] += 1
+                continue
+    
+    def get_signatures(self, path: str, should_stop=None) -> Dict[str, Any]:
+        """
+        计算目录下所有文件的块签名（用于增量同步）
+        
+        Args:
+            path: 目录相对路径，不存在时返回空签名
+            should_stop: 返回True时中止的回调（用于取消）
+            
+        Returns:
+            签名信息：files（{相对该目录的路径: 签名}）
+        """
+        try:
+            root = self.resolve_path(path)
+            if root.is_file():
+                raise ValueError(f"同步路径必须是目录: {path}")
+            return {"files": tree_signatures(root, should_stop)}
+        except Exception as e:
+            raise Exception(f"计算文件签名失败: {str(e)}")
+    
+    def apply_sync(
+        self,
+        path: str,
+        sync_id: str,
+        files: List[Dict[str, Any]],
+        deletes: Optional[List[str]] = None,
+        should_stop=None
+    ) -> Dict[str, Any]:
+        """
+        应用增量同步（一次同步可以分多批调用）
+        
+        Args:
+            path: 同步的目录相对路径
+            sync_id: 同步ID（同一次同步的各批次相同）
+            files: 文件增量列表：path（相对该目录）, ops, block_size, final, sha256
+            deletes: 需要删除的文件（相对该目录）
+            should_stop: 返回True时中止的回调（用于取消）
+            
+        Returns:
+            应用结果：files, written, deleted
+        """
+        try:
+            written = 0
+            for entry in files:
+                if should_stop and should_stop():
+                    raise WorkspaceOperationCancelled("操作已取消")
+                target = self._get_absolute_path(os.path.join(path, entry["path"]))
+                written += self._delta_applier.apply(
+                    sync_id,
+                    target,
+                    entry.get("ops") or [],
+                    entry.get("block_size"),
+                    entry.get("final", True),
+                    entry.get("sha256")
+                )
+            
+            deleted = 0
+            for relative_path in deletes or []:
+                target = self._get_absolute_path(os.path.join(path, relative_path))
+                if target.is_file() or target.is_symlink():
+                    target.unlink()
+                    deleted += 1
+            
+            return {
+                "files": len(files),
+                "written": written,
+                "deleted": deleted
+            }
+        except Exception as e:
+            raise Exception(f"增量同步失败: {str(e)}")
+    
+    def abort_sync(self, sync_id: str) -> Dict[str, Any]:
+        """
+        中止增量同步（服务端同步失败或超时后通知），删除该同步未完成的临时文件
+        
+        Args:
+            sync_id: 同步ID
+            
+        Returns:
+            中止结果：discarded（删除的临时文件数）
+        """
+        return {"discarded": self._delta_applier.abort(sync_id)}
 
@@ -386,6 +386,7 @@ async def get_environment_suite_executions(
 ):
     """获取环境的测试套执行历史"""
     from models.test_suite import TestSuiteExecution, TestSuite, TestSuiteLog
+    from services.suite_log_service import SuiteLogService
     from models.user import User
     from sqlalchemy import func, or_
     from datetime import datetime, timedelta
@@ -478,12 +479,7 @@ async def get_environment_suite_executions(
             
             if not exec_records:
                 # 如果没有执行记录，检查是否有取消相关的日志
-                from models.test_suite import TestSuiteLog
-                cancel_log = db.query(TestSuiteLog).filter(
-                    TestSuiteLog.suite_id == suite_id_val,
-                    TestSuiteLog.execution_id == execution_id_val,
-                    TestSuiteLog.message.like("%取消%")
-                ).first()
+                cancel_log = SuiteLogService.execution_log_contains(db, suite_id_val, execution_id_val, "取消")
                 if cancel_log:
                     overall_result = "cancelled"
                 else:
@@ -501,12 +497,7 @@ async def get_environment_suite_executions(
                 # 确定整体结果
                 # 优先级：取消 > 失败/错误 > 跳过 > 通过
                 # 先检查是否有取消相关的日志（即使有执行记录，也可能是被取消的）
-                from models.test_suite import TestSuiteLog
-                cancel_log = db.query(TestSuiteLog).filter(
-                    TestSuiteLog.suite_id == suite_id_val,
-                    TestSuiteLog.execution_id == execution_id_val,
-                    TestSuiteLog.message.like("%取消%")
-                ).first()
+                cancel_log = SuiteLogService.execution_log_contains(db, suite_id_val, execution_id_val, "取消")
                 
                 if cancel_log:
                     # 如果有取消日志，优先标记为取消
@@ -597,6 +588,11 @@ async def get_queue_status(
     """获取环境任务队列状态"""
     try:
         queue_status = TaskQueueService.get_queue_status(db, environment_id)
+        # 已下发但在Agent本地排队等待执行槽位的测试套
+        from api.v1.websocket import manager
+        agent_queued = manager.get_agent_queued(environment_id)
+        queue_status["agentQueuedCount"] = len(agent_queued)
+        queue_status["agentQueued"] = agent_queued
         return APIResponse(
             status=ResponseStatus.SUCCESS,
             message="获取成功",
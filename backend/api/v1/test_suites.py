@@ -568,9 +568,9 @@ async def get_suite_logs(
     execution_id: Optional[str] = Query(None, alias="executionId"),
     log_id: Optional[str] = Query(None, alias="logId")
 ):
-    """获取测试套日志"""
+    """获取测试套日志（日志内容由分段按顺序拼接）"""
     from models.test_suite import TestSuiteLog
-    from utils.serializer import serialize_model
+    from services.suite_log_service import SuiteLogService
     from core.logger import logger
     
     logger.info(f"[API] 获取测试套日志: suite_id={suite_id}, log_id={log_id}, execution_id={execution_id}, skip={skip}, limit={limit}")
@@ -597,7 +597,7 @@ async def get_suite_logs(
             status=ResponseStatus.SUCCESS,
             message="获取成功",
             data={
-                "items": [serialize_model(item, camel_case=True) for item in items],
+                "items": [SuiteLogService.serialize_log(db, item) for item in items],
                 "total": total,
                 "skip": skip,
                 "limit": limit
@@ -624,6 +624,7 @@ async def get_suite_suite_executions(
 ):
     """获取测试套的执行历史（按execution_id分组）"""
     from models.test_suite import TestSuiteExecution, TestSuite, TestSuiteLog
+    from services.suite_log_service import SuiteLogService
     from models.user import User
     from sqlalchemy import func
     from datetime import datetime, timedelta
@@ -854,11 +855,7 @@ async def get_suite_suite_executions(
                     overall_result = "running"
                 else:
                     # 检查是否有取消相关的日志
-                    cancel_log = db.query(TestSuiteLog).filter(
-                        TestSuiteLog.suite_id == suite_id,
-                        TestSuiteLog.execution_id == execution_id_val,
-                        TestSuiteLog.message.like("%取消%")
-                    ).first()
+                    cancel_log = SuiteLogService.execution_log_contains(db, suite_id, execution_id_val, "取消")
                     if cancel_log:
                         overall_result = "cancelled"
                     else:
@@ -887,11 +884,7 @@ async def get_suite_suite_executions(
                     overall_result = "pending"
                 else:
                     # 先检查是否有取消相关的日志（即使有执行记录，也可能是被取消的）
-                    cancel_log = db.query(TestSuiteLog).filter(
-                        TestSuiteLog.suite_id == suite_id,
-                        TestSuiteLog.execution_id == execution_id_val,
-                        TestSuiteLog.message.like("%取消%")
-                    ).first()
+                    cancel_log = SuiteLogService.execution_log_contains(db, suite_id, execution_id_val, "取消")
                     
                     if cancel_log:
                         # 如果有取消日志，优先标记为取消
@@ -984,6 +977,7 @@ async def delete_suite_execution(
 ):
     """删除测试套执行历史"""
     from models.test_suite import TestSuite, TestSuiteLog, TestSuiteExecution
+    from services.suite_log_service import SuiteLogService
     from datetime import timedelta
     
     try:
@@ -1030,7 +1024,8 @@ async def delete_suite_execution(
                 detail="无法删除等待中的记录，请先取消任务"
             )
         
-        # 删除日志记录
+        # 删除日志记录及其分段
+        SuiteLogService.delete_segments(db, [log_record.id for log_record in log_records])
         for log_record in log_records:
             db.delete(log_record)
         
@@ -1,13 +1,19 @@
 """WebSocket服务器 - 用于Agent连接和前端连接"""
 from fastapi import WebSocket, WebSocketDisconnect
 from services.environment_service import EnvironmentService
+from services.log_ingestion_service import LogIngestionBuffer
 from core.logger import logger
-from typing import Dict, List
+from config import settings
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-import json
 import asyncio
+from collections import OrderedDict, deque
 from datetime import datetime
 from utils.datetime_utils import beijing_now
+from utils.message_codec import ENCODING_JSON, select_encoding, encode_message, decode_message
+
+
+MAX_MESSAGE_ATTEMPTS = 3  # 可靠消息处理失败的最大尝试次数（含重连后补发），超过后确认并丢弃
 
 
 class ConnectionManager:
@@ -18,6 +24,17 @@ class ConnectionManager:
         self.active_connections: Dict[str, WebSocket] = {}
         # 存储token到environment_id的映射: {token: environment_id}
         self.token_to_env: Dict[str, str] = {}
+        # 在Agent本地排队等待执行槽位的测试套: {environment_id: {suite_id: 排队信息}}
+        self.agent_queued_suites: Dict[str, Dict[str, dict]] = {}
+        # 已处理的Agent可靠消息序号，用于丢弃断线重连后补发的重复消息（断开连接后保留）
+        # {environment_id: {session: {seq: None}}}
+        self.seen_message_seqs: Dict[str, OrderedDict] = {}
+        # 处理失败的Agent可靠消息的尝试次数: {(environment_id, session, seq): 次数}
+        self.failed_message_attempts: Dict[tuple, int] = {}
+        # 与Agent协商的消息编码（welcome消息发送后生效）: {environment_id: encoding}
+        self.encodings: Dict[str, str] = {}
+        # Agent在auth消息中声明的能力: {environment_id: [capability]}
+        self.agent_capabilities: Dict[str, List[str]] = {}
     
     async def connect(self, websocket: WebSocket, environment_id: str, token: str = None):
         """注册WebSocket连接（连接已在外部accept）"""
@@ -33,6 +50,10 @@ class ConnectionManager:
             del self.active_connections[environment_id]
         # 清理token映射
         self.token_to_env = {k: v for k, v in self.token_to_env.items() if v != environment_id}
+        # Agent断开后本地排队信息失效
+        self.agent_queued_suites.pop(environment_id, None)
+        self.encodings.pop(environment_id, None)
+        self.agent_capabilities.pop(environment_id, None)
         logger.info(f"[WebSocket] 环境 {environment_id} 已断开")
     
     async def disconnect_and_notify(self, environment_id: str, reason: str = "Token已失效，请重新连接"):
@@ -41,7 +62,7 @@ class ConnectionManager:
             websocket = self.active_connections[environment_id]
             try:
                 # 发送token失效通知
-                await websocket.send_json({
+                await self.send_frame(websocket, environment_id, {
                     "type": "token_invalid",
                     "message": reason,
                     "reason": "token_regenerated"
@@ -53,11 +74,104 @@ class ConnectionManager:
             finally:
                 self.disconnect(environment_id)
     
+    def set_agent_queued(self, environment_id: str, suite_id: str, queue_info: Optional[dict]):
+        """记录或清除测试套在Agent本地的排队信息（queue_info为None表示已开始执行）"""
+        queued = self.agent_queued_suites.setdefault(environment_id, {})
+        if queue_info is None:
+            queued.pop(suite_id, None)
+        else:
+            queued[suite_id] = queue_info
+        if not queued:
+            self.agent_queued_suites.pop(environment_id, None)
+    
+    def get_agent_queued(self, environment_id: str) -> List[dict]:
+        """获取在Agent本地排队的测试套列表"""
+        return [
+            {"suiteId": suite_id, **queue_info}
+            for suite_id, queue_info in self.agent_queued_suites.get(environment_id, {}).items()
+        ]
+    
+    def has_capability(self, environment_id: str, capability: str) -> bool:
+        """Agent是否声明支持某项能力"""
+        return capability in self.agent_capabilities.get(environment_id, [])
+    
+    def is_duplicate_message(self, environment_id: str, message: dict) -> bool:
+        """检查Agent消息是否已处理过（按消息中的session和seq判断）"""
+        session = message.get("session")
+        seq = message.get("seq")
+        if session is None or seq is None:
+            return False
+        seen = self.seen_message_seqs.get(environment_id, {}).get(session)
+        return seen is not None and seq in seen
+    
+    def mark_message_processed(self, environment_id: str, message: dict) -> None:
+        """
+        记录Agent可靠消息已处理（处理成功后调用，之后补发的同一消息会被丢弃）
+        
+        每个环境最多保留最近8个session，每个session最多保留最近20000个序号。
+        """
+        session = message.get("session")
+        seq = message.get("seq")
+        if session is None or seq is None:
+            return
+        self.failed_message_attempts.pop((environment_id, session, seq), None)
+        
+        sessions = self.seen_message_seqs.setdefault(environment_id, OrderedDict())
+        seen = sessions.get(session)
+        if seen is None:
+            seen = sessions[session] = OrderedDict()
+            while len(sessions) > 8:
+                sessions.popitem(last=False)
+        else:
+            sessions.move_to_end(session)
+        
+        seen[seq] = None
+        while len(seen) > 20000:
+            seen.popitem(last=False)
+    
+    def record_message_failure(self, environment_id: str, message: dict) -> int:
+        """
+        记录Agent可靠消息处理失败
+        
+        Returns:
+            该消息累计的失败次数
+        """
+        key = (environment_id, message.get("session"), message.get("seq"))
+        attempts = self.failed_message_attempts.get(key, 0) + 1
+        self.failed_message_attempts[key] = attempts
+        return attempts
+    
+    async def send_ack(self, websocket: WebSocket, environment_id: str, message: dict) -> None:
+        """
+        确认Agent的可靠消息已处理（Agent收到后提交离线缓存，未确认的消息重连后补发）
+        
+        服务端按接收顺序处理消息，确认某条消息即表示同一连接上之前的消息都已处理，
+        因此消息处理失败时不再确认后续消息，而是关闭连接让Agent从失败的消息开始补发。
+        日志消息进入写入缓冲即确认，可靠投递到缓冲为止：落库连续失败
+        MAX_STORE_ATTEMPTS次的日志由缓冲丢弃，不会再由Agent补发。
+        """
+        try:
+            await self.send_frame(websocket, environment_id, {
+                "type": "ack",
+                "session": message.get("session"),
+                "seq": message.get("seq")
+            })
+        except Exception as e:
+            logger.warning(f"[WebSocket] 发送消息确认失败: {e}")
+    
+    async def send_frame(self, websocket: WebSocket, environment_id: str, message: dict):
+        """按协商的编码发送消息（msgpack使用二进制帧，JSON使用文本帧）"""
+        frame = encode_message(message, self.encodings.get(environment_id, ENCODING_JSON))
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+    
     async def send_message(self, environment_id: str, message: dict):
         """向指定环境发送消息"""
         if environment_id in self.active_connections:
             try:
-                await self.active_connections[environment_id].send_json(message)
+                await self.send_frame(self.active_connections[environment_id], environment_id, message)
                 return True
             except Exception as e:
                 logger.error(f"[WebSocket] 发送消息失败 {environment_id}: {e}")
@@ -70,7 +184,7 @@ class ConnectionManager:
         disconnected = []
         for environment_id, websocket in self.active_connections.items():
             try:
-                await websocket.send_json(message)
+                await self.send_frame(websocket, environment_id, message)
             except Exception as e:
                 logger.error(f"[WebSocket] 广播失败 {environment_id}: {e}")
                 disconnected.append(environment_id)
@@ -84,55 +198,349 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+class LogSubscriber:
+    """前端日志订阅者
+
+    每个订阅者有独立的有界发送队列和发送任务，推送日志只入队、不等待发送，
+    慢速的浏览器不会拖慢Agent消息的处理。发送跟不上时，队列中同一执行的相邻日志会合并为一条；
+    积压超过上限时丢弃积压的日志，发送 ``resync`` 提示后关闭连接，由前端重新拉取日志。
+    
+    日志消息带有行号（``first_line``、``line_count``），订阅者为每条日志记录维护游标（已发送到的行号）。
+    前端断线重连时带上游标，发送任务先发送连接成功消息，再从数据库回放游标之后的日志，最后发送实时日志；
+    回放和实时日志的重叠部分按游标裁掉，因此不会重复。日志起始行号超过游标（中间有行缺失）时
+    不跳过，而是要求前端重新同步。
+    """
+    
+    MAX_QUEUE_MESSAGES = 256  # 队列中最多的消息数（合并后）
+    MAX_QUEUE_BYTES = 4 * 1024 * 1024  # 队列中日志内容的最大字符数
+    SEND_TIMEOUT = 10.0  # 单条消息的发送超时（秒）
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        suite_id: str,
+        on_closed,
+        cursors: Optional[Dict[str, int]] = None,
+        replay=None,
+        greeting: Optional[dict] = None
+    ):
+        """
+        Args:
+            websocket: 前端WebSocket连接
+            suite_id: 测试套ID
+            on_closed: 订阅者关闭时的回调
+            cursors: 各日志记录已接收到的行号 {log_id: 下一行行号}
+            replay: 回放函数，返回回放日志消息的异步迭代器（在发送实时日志之前执行）
+            greeting: 最先发送的消息（如connected），在回放之前发出
+        """
+        self.websocket = websocket
+        self.suite_id = suite_id
+        self._on_closed = on_closed
+        self.cursors: Dict[str, int] = dict(cursors or {})
+        self._replay = replay
+        self._greeting = greeting
+        self._queue: deque = deque()
+        self._queue_bytes = 0
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.sent_messages = 0
+        self.coalesced_messages = 0
+        self._task = asyncio.create_task(self._run())
+    
+    def send(self, message: dict) -> None:
+        """发送控制消息（connected、ping、pong等），不参与合并"""
+        if self.closed:
+            return
+        self._queue.append(message)
+        self._ready.set()
+    
+    def push_log(self, log_data: dict) -> None:
+        """推送日志：与队尾同一日志记录的消息合并，积压过多时要求前端重新同步"""
+        if self.closed:
+            return
+        size = len(log_data.get("message") or "")
+        
+        last = self._queue[-1] if self._queue else None
+        if (
+            last is not None
+            and last.get("type") == "test_suite_log"
+            and last["data"].get("id") == log_data.get("id")
+            and last["data"].get("first_line", 0) + last["data"].get("line_count", 0) == log_data.get("first_line", 0)
+        ):
+            # 前一条还没发出去且行号连续，合并为一条
+            last["data"] = dict(last["data"])
+            last["data"]["message"] = last["data"]["message"] + "\n" + (log_data.get("message") or "")
+            last["data"]["timestamp"] = log_data.get("timestamp")
+            if "line_count" in log_data:
+                last["data"]["line_count"] = last["data"].get("line_count", 0) + log_data["line_count"]
+            self.coalesced_messages += 1
+        elif len(self._queue) >= self.MAX_QUEUE_MESSAGES:
+            self._resync("发送队列已满")
+            return
+        else:
+            self._queue.append({
+                "type": "test_suite_log",
+                "suite_id": self.suite_id,
+                "data": log_data
+            })
+        
+        self._queue_bytes += size
+        if self._queue_bytes > self.MAX_QUEUE_BYTES:
+            self._resync("积压日志过多")
+            return
+        self._ready.set()
+    
+    def close(self) -> None:
+        """停止发送任务"""
+        if not self.closed:
+            self.closed = True
+            self._task.cancel()
+    
+    def _resync(self, reason: str) -> None:
+        """丢弃积压的日志，发送重新同步提示后断开（发送跟不上或日志缺失时）"""
+        logger.warning(f"[Frontend WebSocket] 要求订阅者重新同步（{reason}）: suite_id={self.suite_id}")
+        self._queue.clear()
+        self._queue_bytes = 0
+        self._queue.append({"type": "resync", "suite_id": self.suite_id, "reason": reason})
+        self._queue.append(None)  # 发送完提示后关闭连接
+        self._ready.set()
+        self.closed = True
+    
+    def _apply_cursor(self, message: dict) -> Optional[dict]:
+        """
+        按游标裁掉已发送过的行并推进游标（起始行号超过游标说明中间有行缺失，要求前端重新同步）
+        
+        Returns:
+            要发送的消息，全部行都已发送过或需要重新同步时返回None
+        """
+        data = message["data"]
+        log_id = data.get("id")
+        first_line = data.get("first_line")
+        if not log_id or first_line is None:
+            return message
+        line_count = data.get("line_count") or 0
+        end = first_line + line_count
+        cursor = self.cursors.get(log_id)
+        if cursor is not None and first_line > cursor:
+            self._resync(f"日志缺失（第 {cursor} 行到第 {first_line} 行）")
+            return None
+        if cursor is not None and cursor > first_line:
+            if end <= cursor:
+                return None
+            skip = cursor - first_line
+            data = dict(data)
+            data["message"] = "\n".join(data["message"].split("\n")[skip:])
+            data["first_line"] = cursor
+            data["line_count"] = line_count - skip
+            message = dict(message, data=data)
+        self.cursors[log_id] = max(end, cursor or 0)
+        return message
+    
+    async def _send(self, message: dict) -> None:
+        """发送一条消息（日志消息先按游标去重）"""
+        if message.get("type") == "test_suite_log":
+            message = self._apply_cursor(message)
+            if message is None:
+                return
+        await asyncio.wait_for(self.websocket.send_json(message), timeout=self.SEND_TIMEOUT)
+        self.sent_messages += 1
+    
+    async def _run(self) -> None:
+        """发送循环：先发送连接成功消息，再回放游标之后的历史日志，最后发送队列中的实时日志"""
+        try:
+            if self._greeting is not None:
+                await self._send(self._greeting)
+            if self._replay is not None:
+                async for message in self._replay(self.suite_id, dict(self.cursors)):
+                    await self._send(message)
+                    if self.closed:
+                        break  # 回放中发现日志缺失，改为发送重新同步提示
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._queue:
+                    message = self._queue.popleft()
+                    if message is None:
+                        await self.websocket.close(code=1013, reason="Resync required")
+                        return
+                    if message.get("type") == "test_suite_log":
+                        self._queue_bytes = max(0, self._queue_bytes - len(message["data"].get("message") or ""))
+                    await self._send(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[Frontend WebSocket] 推送日志失败: {e}")
+            try:
+                await self.websocket.close(code=1011)
+            except Exception:
+                pass
+        finally:
+            self.closed = True
+            self._on_closed(self)
+
+
 class FrontendConnectionManager:
     """前端WebSocket连接管理器"""
     
     def __init__(self):
-        # 存储前端连接: {suite_id: [websocket1, websocket2, ...]}
-        self.frontend_connections: Dict[str, List[WebSocket]] = {}
+        # 存储前端订阅者: {suite_id: [subscriber1, subscriber2, ...]}
+        self.frontend_connections: Dict[str, List[LogSubscriber]] = {}
     
-    async def connect(self, websocket: WebSocket, suite_id: str):
-        """注册前端WebSocket连接"""
-        if suite_id not in self.frontend_connections:
-            self.frontend_connections[suite_id] = []
+    async def connect(
+        self,
+        websocket: WebSocket,
+        suite_id: str,
+        sequence: Optional[int] = None,
+        cursors: Optional[Dict[str, int]] = None,
+        greeting: Optional[dict] = None
+    ) -> LogSubscriber:
+        """
+        注册前端WebSocket连接，返回订阅者（通过订阅者发送消息）
         
-        self.frontend_connections[suite_id].append(websocket)
+        Args:
+            websocket: 前端WebSocket连接
+            suite_id: 测试套ID
+            sequence: 前端已有日志记录的最大序号，指定时先回放缺失的日志再发送实时日志
+            cursors: 前端已有日志记录接收到的行号 {log_id: 下一行行号}
+            greeting: 最先发送的消息（在回放之前）
+        
+        Returns:
+            订阅者
+        """
+        replay = None
+        if sequence is not None:
+            replay = lambda suite_id, replay_cursors: iter_log_replay(suite_id, sequence, replay_cursors)
+        subscriber = LogSubscriber(websocket, suite_id, self._remove, cursors=cursors, replay=replay, greeting=greeting)
+        self.frontend_connections.setdefault(suite_id, []).append(subscriber)
         logger.info(f"[Frontend WebSocket] 订阅测试套 {suite_id} 日志，当前连接数: {len(self.frontend_connections[suite_id])}")
+        return subscriber
     
     def disconnect(self, websocket: WebSocket, suite_id: str):
         """断开前端WebSocket连接"""
-        if suite_id in self.frontend_connections:
-            connections = self.frontend_connections[suite_id]
-            if websocket in connections:
-                connections.remove(websocket)
-                if not connections:
-                    del self.frontend_connections[suite_id]
-                logger.info(f"[Frontend WebSocket] 取消订阅测试套 {suite_id} 日志，剩余连接数: {len(connections) if suite_id in self.frontend_connections else 0}")
+        for subscriber in list(self.frontend_connections.get(suite_id, [])):
+            if subscriber.websocket is websocket:
+                subscriber.close()
+                self._remove(subscriber)
+    
+    def _remove(self, subscriber: LogSubscriber):
+        """移除订阅者"""
+        connections = self.frontend_connections.get(subscriber.suite_id)
+        if connections and subscriber in connections:
+            connections.remove(subscriber)
+            if not connections:
+                del self.frontend_connections[subscriber.suite_id]
+            logger.info(f"[Frontend WebSocket] 取消订阅测试套 {subscriber.suite_id} 日志，剩余连接数: {len(connections)}")
     
     async def broadcast_log(self, suite_id: str, log_data: dict):
-        """向所有订阅该测试套日志的前端推送日志"""
-        if suite_id not in self.frontend_connections:
-            return
-        
-        disconnected = []
-        for websocket in self.frontend_connections[suite_id]:
-            try:
-                await websocket.send_json({
-                    "type": "test_suite_log",
-                    "suite_id": suite_id,
-                    "data": log_data
-                })
-            except Exception as e:
-                logger.error(f"[Frontend WebSocket] 推送日志失败: {e}")
-                disconnected.append(websocket)
-        
-        # 清理断开的连接
-        for websocket in disconnected:
-            self.disconnect(websocket, suite_id)
+        """向所有订阅该测试套日志的前端推送日志（只入队，不等待发送）"""
+        for subscriber in list(self.frontend_connections.get(suite_id, [])):
+            subscriber.push_log(log_data)
 
 # 全局前端连接管理器
 frontend_manager = FrontendConnectionManager()
 
+REPLAY_CHUNK_LINES = 1000  # 回放时每条消息的最大行数
+
+
+def parse_log_cursors(value: Optional[str]) -> Dict[str, int]:
+    """
+    解析前端传来的日志游标
+
+    Args:
+        value: 格式为 "log_id:行号,log_id:行号"
+
+    Returns:
+        {log_id: 下一行行号}，格式错误的项会被忽略
+    """
+    cursors: Dict[str, int] = {}
+    for item in (value or "").split(","):
+        log_id, _, line = item.partition(":")
+        try:
+            cursors[log_id.strip()] = max(0, int(line))
+        except ValueError:
+            continue
+    return cursors
+
+
+def _load_replay_logs(suite_id: str, sequence: int, cursors: Dict[str, int]) -> List[tuple]:
+    """
+    读取需要回放的日志（在线程池中执行）：前端已有记录中游标之后的行，以及序号大于sequence的新记录的全部行
+
+    Returns:
+        [(日志数据, 起始行号, 日志行)]，按序号排列
+    """
+    from database import SessionLocal
+    from models.test_suite import TestSuiteLog
+    from services.suite_log_service import SuiteLogService
+    from sqlalchemy import or_
+    
+    db = SessionLocal()
+    try:
+        conditions = [TestSuiteLog.sequence_number > sequence]
+        if cursors:
+            conditions.append(TestSuiteLog.id.in_(list(cursors)))
+        log_entries = db.query(TestSuiteLog).filter(
+            TestSuiteLog.suite_id == suite_id,
+            or_(*conditions)
+        ).order_by(TestSuiteLog.sequence_number.asc()).all()
+        
+        result = []
+        for log_entry in log_entries:
+            from_line = cursors.get(log_entry.id, 0)
+            if log_entry.segment_count and log_entry.line_count <= from_line:
+                continue
+            lines = list(SuiteLogService.iter_lines(db, log_entry, from_line))
+            if not lines:
+                continue
+            result.append(({
+                "id": log_entry.id,
+                "timestamp": log_entry.timestamp.isoformat(),
+                "execution_id": log_entry.execution_id,
+                "sequence_number": log_entry.sequence_number
+            }, from_line, lines))
+        return result
+    finally:
+        db.close()
+
+
+async def iter_log_replay(suite_id: str, sequence: int, cursors: Dict[str, int]):
+    """
+    回放前端缺失的日志
+
+    Args:
+        suite_id: 测试套ID
+        sequence: 前端已有日志记录的最大序号
+        cursors: 前端已有日志记录接收到的行号
+
+    Yields:
+        test_suite_log消息（每条最多REPLAY_CHUNK_LINES行）
+    """
+    loop = asyncio.get_event_loop()
+    logs = await loop.run_in_executor(None, _load_replay_logs, suite_id, sequence, cursors)
+    for log_data, from_line, lines in logs:
+        for start in range(0, len(lines), REPLAY_CHUNK_LINES):
+            chunk = lines[start:start + REPLAY_CHUNK_LINES]
+            yield {
+                "type": "test_suite_log",
+                "suite_id": suite_id,
+                "data": dict(
+                    log_data,
+                    message="\n".join(chunk),
+                    first_line=from_line + start,
+                    line_count=len(chunk)
+                )
+            }
+
+
+async def receive_agent_frame(websocket: WebSocket):
+    """接收Agent的一帧消息（文本帧返回str，二进制帧返回bytes）"""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    if frame.get("bytes") is not None:
+        return frame["bytes"]
+    return frame.get("text") or ""
+
 
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -203,8 +611,11 @@ async def websocket_endpoint(
             # 获取工作目录
             work_dir = environment.get("remote_work_dir") or environment.get("remoteWorkDir") or ""
             
-            # 发送欢迎消息（包含配置信息）
-            logger.info(f"[WebSocket] 准备发送欢迎消息，环境ID: {environment_id}")
+            # 协商消息编码：Agent在URL的encodings参数中声明支持的编码，未声明（旧版本）则使用JSON
+            encoding = select_encoding(websocket.query_params.get("encodings"))
+            
+            # 发送欢迎消息（包含配置信息），欢迎消息始终使用JSON文本帧
+            logger.info(f"[WebSocket] 准备发送欢迎消息，环境ID: {environment_id}, 消息编码: {encoding}")
             try:
                 await websocket.send_json({
                     "type": "welcome",
@@ -212,8 +623,12 @@ async def websocket_endpoint(
                     "environment_id": environment_id,
                     "environment_name": environment.get("name"),
                     "work_dir": work_dir,
-                    "reconnect_delay": reconnect_delay_int  # 重连延迟时间（秒）
+                    "reconnect_delay": reconnect_delay_int,  # 重连延迟时间（秒）
+                    "protocol_version": 3,
+                    "encoding": encoding,
+                    "acks": True  # 对带session/seq的可靠消息回复ack
                 })
+                manager.encodings[environment_id] = encoding
                 logger.debug(f"[WebSocket] 欢迎消息已发送")
             except Exception as e:
                 logger.error(f"[WebSocket] 发送欢迎消息失败: {e}", exc_info=True)
@@ -221,7 +636,7 @@ async def websocket_endpoint(
             
             # 发送认证成功消息（兼容旧版本agent）
             try:
-                await websocket.send_json({
+                await manager.send_frame(websocket, environment_id, {
                     "type": "auth_success",
                     "environment_id": environment_id,
                     "work_dir": work_dir,
@@ -235,19 +650,34 @@ async def websocket_endpoint(
             # 保持连接，接收消息
             logger.info(f"[WebSocket] 进入消息接收循环，环境ID: {environment_id}")
             while True:
+                pending_message = None  # 正在处理、尚未确认的可靠消息
                 try:
                     # 接收消息（超时30秒）
                     logger.debug(f"[WebSocket] 等待接收消息...")
-                    data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+                    data = await asyncio.wait_for(receive_agent_frame(websocket), timeout=30.0)
                     logger.debug(f"[WebSocket] 收到原始数据: {data[:200] if len(data) > 200 else data}")
-                    message = json.loads(data)
+                    message = decode_message(data)
                     message_type = message.get('type', 'unknown')
-                    logger.info(f"[WebSocket] 收到消息: type={message_type}, message={message}")
+                    if message_type == "test_suite_log_batch":
+                        # 批量日志体积较大，只记录摘要
+                        logger.debug(f"[WebSocket] 收到消息: type={message_type}, suite_id={message.get('suite_id')}, lines={len(message.get('lines') or [])}")
+                    elif message_type in ("workspace_stream_chunk", "workspace_stream_ack", "workspace_search_result"):
+                        # 文件传输数据块、确认和搜索结果消息数量多，只记录摘要
+                        logger.debug(f"[WebSocket] 收到消息: type={message_type}, request_id={message.get('request_id')}, index={message.get('index')}")
+                    else:
+                        logger.info(f"[WebSocket] 收到消息: type={message_type}, message={message}")
                     
                     # 特别记录test_suite_result消息
                     if message_type == "test_suite_result":
                         logger.info(f"[WebSocket] ===== 收到test_suite_result消息 ===== suite_id={message.get('suite_id')}, case_id={message.get('case_id')}, result={message.get('result')}")
                     
+                    # Agent断线重连后会补发离线缓存，已处理过的消息直接丢弃
+                    pending_message = message if message.get("seq") is not None else None
+                    if manager.is_duplicate_message(environment_id, message):
+                        logger.info(f"[WebSocket] 丢弃重复消息: type={message_type}, session={message.get('session')}, seq={message.get('seq')}")
+                        await manager.send_ack(websocket, environment_id, message)
+                        continue
+                    
                     # 处理心跳消息
                     if message.get("type") == "heartbeat":
                         node_info = message.get("data", {})
@@ -255,7 +685,7 @@ async def websocket_endpoint(
                         EnvironmentService.update_node_info(db, environment_id, node_info)
                         # 回复心跳确认
                         try:
-                            await websocket.send_json({
+                            await manager.send_frame(websocket, environment_id, {
                                 "type": "heartbeat_ack",
                                 "timestamp": beijing_now().isoformat()
                             })
@@ -277,17 +707,53 @@ async def websocket_endpoint(
                     elif message.get("type") == "test_suite_log":
                         await handle_test_suite_log(db, environment_id, message)
                     
+                    # 处理测试套批量日志
+                    elif message.get("type") == "test_suite_log_batch":
+                        await handle_test_suite_log_batch(db, environment_id, message)
+                    
+                    # 处理测试套本地排队状态
+                    elif message.get("type") == "test_suite_queued":
+                        await handle_test_suite_queued(db, environment_id, message)
+                    
                     # 处理测试套执行完成消息
                     elif message.get("type") == "test_suite_completed":
                         await handle_test_suite_completed(db, environment_id, message)
                     
+                    # 处理执行槽位释放通知（测试套进程树已退出）
+                    elif message.get("type") == "slot_released":
+                        await handle_slot_released(db, environment_id, message)
+                    
+                    # Agent认证消息（连接时已通过URL中的token认证，这里只记录Agent能力）
+                    elif message.get("type") == "auth":
+                        agent_info = message.get("agent_info") or {}
+                        manager.agent_capabilities[environment_id] = list(agent_info.get("capabilities") or [])
+                    
+                    # 处理工作空间文件流式传输和搜索消息（从Agent返回）
+                    elif message.get("type") in [
+                        "workspace_stream_start",
+                        "workspace_stream_chunk",
+                        "workspace_stream_ack",
+                        "workspace_stream_end",
+                        "workspace_search_start",
+                        "workspace_search_result",
+                        "workspace_search_end"
+                    ]:
+                        from api.v1.workspace import handle_workspace_stream_message
+                        try:
+                            handle_workspace_stream_message(message)
+                        except Exception as e:
+                            logger.exception(f"[WebSocket] 处理文件传输消息时出错: {e}")
+                    
                     # 处理工作空间响应（从Agent返回）
                     elif message.get("type") in [
                         "workspace_list_response",
                         "workspace_read_response",
                         "workspace_write_response",
                         "workspace_delete_response",
-                        "workspace_mkdir_response"
+                        "workspace_mkdir_response",
+                        "workspace_signature_response",
+                        "workspace_sync_apply_response",
+                        "suite_output_read_response"
                     ]:
                         # 转发响应到workspace API模块
                         logger.debug(f"[WebSocket] 收到工作空间响应: {message.get('type')}, request_id: {message.get('request_id')}")
@@ -299,22 +765,51 @@ async def websocket_endpoint(
                     
                     else:
                         logger.warning(f"[WebSocket] 收到未知消息类型: {message.get('type')}")
+                    
+                    # 可靠消息处理成功后记录并回复确认
+                    if pending_message is not None:
+                        pending_message = None
+                        manager.mark_message_processed(environment_id, message)
+                        await manager.send_ack(websocket, environment_id, message)
                         
                 except asyncio.TimeoutError:
                     # 超时，发送ping保持连接
                     logger.debug(f"[WebSocket] 接收消息超时，发送ping保持连接")
                     try:
-                        await websocket.send_json({"type": "ping"})
+                        await manager.send_frame(websocket, environment_id, {"type": "ping"})
                     except Exception as e:
                         logger.warning(f"[WebSocket] 发送ping失败，连接可能已断开: {e}")
                         break  # 退出循环
-                except json.JSONDecodeError as e:
-                    logger.warning(f"[WebSocket] 收到无效JSON: {data}, 错误: {e}")
+                except ValueError as e:
+                    logger.warning(f"[WebSocket] 收到无法解码的消息: {data[:200]}, 错误: {e}")
                 except WebSocketDisconnect:
                     # WebSocket断开连接，重新抛出让外层处理
                     logger.info(f"[WebSocket] 检测到WebSocket断开连接")
                     raise
                 except Exception as e:
+                    if pending_message is not None:
+                        # 可靠消息处理失败：确认是累计的，不能再确认后续消息，关闭连接让Agent从该消息重新补发；
+                        # 多次失败的消息确认后丢弃，避免阻塞之后的所有消息
+                        failed_message, pending_message = pending_message, None
+                        attempts = manager.record_message_failure(environment_id, failed_message)
+                        if attempts >= MAX_MESSAGE_ATTEMPTS:
+                            logger.error(
+                                f"[WebSocket] 可靠消息处理失败{attempts}次，丢弃: type={failed_message.get('type')}, "
+                                f"session={failed_message.get('session')}, seq={failed_message.get('seq')}, 错误: {e}"
+                            )
+                            manager.mark_message_processed(environment_id, failed_message)
+                            await manager.send_ack(websocket, environment_id, failed_message)
+                            continue
+                        logger.error(
+                            f"[WebSocket] 可靠消息处理失败，关闭连接等待Agent补发: type={failed_message.get('type')}, "
+                            f"session={failed_message.get('session')}, seq={failed_message.get('seq')}, 错误: {e}",
+                            exc_info=True
+                        )
+                        try:
+                            await websocket.close(code=1011, reason="message processing failed")
+                        except Exception:
+                            pass
+                        break
                     error_msg = str(e)
                     # 检查是否是断开连接相关的错误
                     if "disconnect" in error_msg.lower() or "receive" in error_msg.lower():
@@ -387,7 +882,7 @@ async def handle_test_suite_result(db: Session, environment_id: str, message: di
         
         # 获取测试套信息
         suite = db.query(TestSuite).filter(TestSuite.id == suite_id).first()
-        logger.info(f"suite plan id is {suite.plan_id}")
+        logger.info(f"suite plan id is {suite.plan_id if suite else None}")
         # 如果测试套关联了测试计划，更新 plan_case_relations 表的 execution_status
         if suite and suite.plan_id:
             try:
@@ -475,203 +970,233 @@ async def handle_test_suite_result(db: Session, environment_id: str, message: di
                             # 所有任务都完成了，根据最后执行结果设置状态
                             suite.status = "failed" if has_failed else "completed"
                         
-                        # 尝试执行队列中的下一个任务
-                        next_task = TaskQueueService.get_next_pending_task(db, environment_id)
-                        if next_task:
-                            # 检查是否可以执行
-                            if TaskQueueService.can_execute_immediately(db, environment_id):
-                                # 开始执行下一个任务
-                                TaskQueueService.start_task(db, next_task.execution_id)
-                                
-                                # 更新测试套状态为running
-                                next_suite = db.query(TestSuite).filter(TestSuite.id == next_task.suite_id).first()
-                                if next_suite:
-                                    # 检查该测试套是否还有其他正在运行的任务
-                                    next_running = db.query(TaskQueue).filter(
-                                        TaskQueue.suite_id == next_task.suite_id,
-                                        TaskQueue.status == "running"
-                                    ).count()
-                                    next_suite.status = "running" if next_running > 0 else "pending"
-                                
-                                # 构建执行任务消息
-                                git_enabled = next_suite.git_enabled == 'true' if hasattr(next_suite, 'git_enabled') and next_suite.git_enabled else False
-                                
-                                task_message = {
-                                    "type": "execute_test_suite",
-                                    "suite_id": next_suite.id,
-                                    "plan_id": next_suite.plan_id,
-                                    "execution_id": next_task.execution_id,
-                                    "git_repo_url": (next_suite.git_repo_url or None) if git_enabled else None,
-                                    "git_branch": (next_suite.git_branch or None) if git_enabled else None,
-                                    "git_token": (next_suite.git_token or None) if git_enabled else None,
-                                    "execution_command": next_suite.execution_command,
-                                    "case_ids": next_suite.case_ids,
-                                    "executor_id": next_task.executor_id
-                                }
-                                
-                                # 发送到Agent
-                                from api.v1.websocket import manager
-                                await manager.send_message(environment_id, task_message)
-                                logger.info(f"[WebSocket] 队列中的下一个任务已启动: suite_id={next_suite.id}, execution_id={next_task.execution_id}")
+                        # 尝试执行队列中的下一个任务（支持槽位释放通知的Agent在槽位实际空闲后再下发）
+                        if not manager.has_capability(environment_id, "slot_release"):
+                            await dispatch_next_queued_task(db, environment_id)
                     
                     db.commit()
                     logger.info(f"[WebSocket] 测试套执行完成: suite_id={suite_id}, status={suite.status}, 用例数: {len(executed_case_ids)}/{len(suite.case_ids)}")
         
     except Exception as e:
         logger.exception(f"[WebSocket] 处理测试套执行结果时出错: {e}")
+        db.rollback()
+        raise
 
 
 async def handle_test_suite_log(db: Session, environment_id: str, message: dict):
-    """处理测试套实时日志"""
-    from models.test_suite import TestSuite, TestSuiteLog
+    """
+    处理测试套实时日志（放入写入缓冲后立即返回，由后台任务批量落库并推送）
+    
+    日志的可靠投递止于写入缓冲：进入缓冲后即向Agent确认，之后落库连续失败的日志由缓冲丢弃。
+    """
+    suite_id = message.get("suite_id")
+    log_message = message.get("message", "")
+    timestamp = message.get("timestamp")
+    execution_id = message.get("execution_id")  # Agent发送的执行ID
+    
+    logger.debug(f"[WebSocket] 处理测试套日志: suite_id={suite_id}, execution_id={execution_id}, message_length={len(log_message) if log_message else 0}")
+    
+    if not suite_id:
+        logger.warning(f"[WebSocket] 测试套日志缺少suite_id: {message}")
+        return
+    
+    # 解析时间戳
+    log_timestamp = beijing_now()
+    if timestamp:
+        try:
+            # 处理ISO格式时间戳，支持带Z和不带Z的格式
+            if timestamp.endswith('Z'):
+                log_timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            else:
+                log_timestamp = datetime.fromisoformat(timestamp)
+        except Exception as e:
+            logger.warning(f"[WebSocket] 解析时间戳失败: {e}, 使用当前时间")
+            log_timestamp = beijing_now()
+    
+    await log_ingestion_buffer.add(suite_id, execution_id, log_message.split("\n"), log_timestamp)
+
+
+def store_suite_log(suite_id: str, execution_id: Optional[str], lines: List[str], log_timestamp: datetime) -> Optional[dict]:
+    """
+    将一批测试套日志写入数据库（由日志写入缓冲在线程池中调用，使用独立的数据库会话）
+    
+    Args:
+        suite_id: 测试套ID
+        execution_id: 执行ID
+        lines: 日志行
+        log_timestamp: 最后一行的时间
+    
+    Returns:
+        推送给前端的日志数据，测试套不存在时返回None
+    """
+    from database import SessionLocal
+    from models.test_suite import TestSuite
+    from services.suite_log_service import SuiteLogService
     
+    db = SessionLocal()
     try:
-        suite_id = message.get("suite_id")
-        log_message = message.get("message", "")
-        timestamp = message.get("timestamp")
-        execution_id = message.get("execution_id")  # Agent发送的执行ID
-        
-        logger.debug(f"[WebSocket] 处理测试套日志: suite_id={suite_id}, execution_id={execution_id}, message_length={len(log_message) if log_message else 0}")
-        
-        if not suite_id:
-            logger.warning(f"[WebSocket] 测试套日志缺少suite_id: {message}")
-            return
+        log_message = "\n".join(lines)
         
         # 验证测试套存在
         suite = db.query(TestSuite).filter(TestSuite.id == suite_id).first()
         if not suite:
             logger.warning(f"[WebSocket] 测试套不存在: suite_id={suite_id}")
-            return
+            return None
         
-        # 解析时间戳
-        log_timestamp = beijing_now()
-        if timestamp:
-            try:
-                # 处理ISO格式时间戳，支持带Z和不带Z的格式
-                if timestamp.endswith('Z'):
-                    log_timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                else:
-                    log_timestamp = datetime.fromisoformat(timestamp)
-            except Exception as e:
-                logger.warning(f"[WebSocket] 解析时间戳失败: {e}, 使用当前时间")
-                log_timestamp = beijing_now()
-        
-        # 查找或创建日志记录（每个execution_id只创建一条记录）
-        if execution_id:
-            log_entry = db.query(TestSuiteLog).filter(
-                TestSuiteLog.suite_id == suite_id,
-                TestSuiteLog.execution_id == execution_id
-            ).first()
-            
-            if log_entry:
-                # 如果已存在，追加日志消息（换行分隔）
-                if log_entry.message:
-                    log_entry.message += "\n" + log_message
-                else:
-                    log_entry.message = log_message
-                log_entry.timestamp = log_timestamp  # 更新最后时间戳
-            else:
-                # 如果不存在，创建新记录
-                # 计算序号：获取该测试套的最大序号，然后+1
-                from sqlalchemy import func
-                max_sequence = db.query(func.max(TestSuiteLog.sequence_number)).filter(
-                    TestSuiteLog.suite_id == suite_id,
-                ).scalar() or 0
-                sequence_number = max_sequence + 1
-                
-                log_entry = TestSuiteLog(
-                    suite_id=suite_id,
-                    execution_id=execution_id,
-                    sequence_number=sequence_number,
-                    message=log_message,
-                    timestamp=log_timestamp
-                )
-                db.add(log_entry)
-        else:
-            # 如果没有execution_id，记录警告并创建新记录
-            # 注意：正常情况下应该有execution_id，如果没有可能是旧版本Agent或配置问题
-            logger.warning(f"[WebSocket] 测试套日志缺少execution_id: suite_id={suite_id}, message={log_message[:50]}")
+        # 查找或创建日志记录（每个execution_id只创建一条记录），日志内容追加为新分段
+        if not execution_id:
+            # 正常情况下应该有execution_id，如果没有可能是旧版本Agent或配置问题
             # 创建新记录（不追加到旧记录，确保每次执行都有独立记录）
-            log_entry = TestSuiteLog(
-                suite_id=suite_id,
-                execution_id=None,
-                message=log_message,
-                timestamp=log_timestamp
-            )
-            db.add(log_entry)
+            logger.warning(f"[WebSocket] 测试套日志缺少execution_id: suite_id={suite_id}, message={log_message[:50]}")
+        log_entry = SuiteLogService.get_or_create_log(db, suite_id, execution_id, log_timestamp)
+        SuiteLogService.append_lines(db, log_entry, lines, log_timestamp)
         
         db.commit()
-        db.refresh(log_entry)
+        first_line = log_entry.line_count - len(lines)
         
-        # 构建日志数据（用于实时推送）
-        log_data = {
+        logger.debug(f"[WebSocket] 测试套日志已存储: suite_id={suite_id}, execution_id={execution_id}, lines={len(lines)}")
+        
+        # 构建日志数据（用于实时推送，只推送本批新的日志消息，行号用于前端断线续传）
+        return {
             "id": log_entry.id,
-            "message": log_message,  # 只推送新的日志消息
+            "message": log_message,
             "timestamp": log_entry.timestamp.isoformat(),
-            "execution_id": execution_id
+            "execution_id": execution_id,
+            "sequence_number": log_entry.sequence_number,
+            "first_line": first_line,
+            "line_count": len(lines)
         }
-        
-        # 推送给所有订阅该测试套日志的前端
-        await frontend_manager.broadcast_log(suite_id, log_data)
-        
-        # 如果日志消息包含"测试套执行已取消"或"执行完成"，计算执行耗时并保存到日志记录
-        if execution_id and ("测试套执行已取消" in log_message or "测试套执行完成" in log_message or "执行完成" in log_message):
-            # 从日志消息中解析时间戳来计算执行耗时
-            import re
-            
-            duration_seconds = 0
-            if log_entry.message:
-                # 匹配时间戳格式：[YYYY-MM-DD HH:mm:ss.SSS]
-                timestamp_pattern = r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\]'
-                timestamps = re.findall(timestamp_pattern, log_entry.message)
-                
-                if len(timestamps) >= 2:
-                    # 解析第一条和最后一条日志的时间戳
-                    try:
-                        first_ts_str = timestamps[0]
-                        last_ts_str = timestamps[-1]
-                        first_ts = datetime.strptime(first_ts_str, "%Y-%m-%d %H:%M:%S.%f")
-                        last_ts = datetime.strptime(last_ts_str, "%Y-%m-%d %H:%M:%S.%f")
-                        duration_seconds = (last_ts - first_ts).total_seconds()
-                    except (ValueError, AttributeError):
-                        # 如果解析失败，使用created_at和timestamp的差值作为备选
-                        if log_entry.created_at and log_entry.timestamp:
-                            duration_seconds = (log_entry.timestamp - log_entry.created_at).total_seconds()
-                elif len(timestamps) == 1:
-                    # 如果只有一条日志，使用created_at和timestamp的差值
-                    if log_entry.created_at and log_entry.timestamp:
-                        duration_seconds = (log_entry.timestamp - log_entry.created_at).total_seconds()
-                else:
-                    # 如果没有时间戳，使用created_at和timestamp的差值
-                    if log_entry.created_at and log_entry.timestamp:
-                        duration_seconds = (log_entry.timestamp - log_entry.created_at).total_seconds()
-            
-            # 格式化总耗时并保存到日志记录
-            if duration_seconds > 0:
-                hours = int(duration_seconds // 3600)
-                minutes = int((duration_seconds % 3600) // 60)
-                seconds = duration_seconds % 60
-                log_entry.duration = f"{hours}:{minutes:02d}:{seconds:05.2f}"
-                
-                # 如果是取消，更新测试套状态
-                if "测试套执行已取消" in log_message or "已取消" in log_message:
-                    suite.status = "pending"  # 取消后状态设为pending
-                
-                db.commit()
-                logger.info(f"[WebSocket] 测试套执行耗时已保存到日志: suite_id={suite_id}, execution_id={execution_id}, duration={log_entry.duration}, status={suite.status}")
-        
-        logger.debug(f"[WebSocket] 测试套日志已存储并推送: suite_id={suite_id}, execution_id={execution_id}, message={log_message[:50]}")
-        
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# 全局测试套日志写入缓冲（写入后推送给所有订阅该测试套日志的前端）
+log_ingestion_buffer = LogIngestionBuffer(
+    store=store_suite_log,
+    on_stored=frontend_manager.broadcast_log,
+    flush_interval=settings.LOG_FLUSH_INTERVAL_MS / 1000,
+    max_lines=settings.LOG_FLUSH_MAX_LINES,
+    max_bytes=settings.LOG_BUFFER_MAX_BYTES
+)
+
+
+async def handle_test_suite_log_batch(db: Session, environment_id: str, message: dict):
+    """处理测试套批量日志"""
+    lines = message.get("lines") or []
+    if not lines:
+        return
+    
+    await handle_test_suite_log(db, environment_id, {
+        "type": "test_suite_log",
+        "suite_id": message.get("suite_id"),
+        "execution_id": message.get("execution_id"),
+        "level": message.get("level", "info"),
+        "message": "\n".join(lines),
+        "timestamp": message.get("timestamp")
+    })
+
+
+async def handle_test_suite_queued(db: Session, environment_id: str, message: dict):
+    """处理测试套本地排队状态（Agent并发已满或资源不足时排队，获得槽位后清除）"""
+    suite_id = message.get("suite_id")
+    if not suite_id:
+        logger.warning(f"[WebSocket] 测试套排队消息缺少suite_id: {message}")
+        return
+    
+    if message.get("queued"):
+        logger.info(f"[WebSocket] 测试套在Agent本地排队: suite_id={suite_id}, position={message.get('position')}, reason={message.get('reason')}")
+        manager.set_agent_queued(environment_id, suite_id, {
+            "executionId": message.get("execution_id"),
+            "position": message.get("position"),
+            "reason": message.get("reason"),
+            "queuedAt": beijing_now().isoformat()
+        })
+    else:
+        logger.info(f"[WebSocket] 测试套已获得Agent执行槽位: suite_id={suite_id}")
+        manager.set_agent_queued(environment_id, suite_id, None)
+
+
+async def dispatch_next_queued_task(db: Session, environment_id: str) -> bool:
+    """
+    环境有空闲槽位时，下发任务队列中的下一个任务
+    
+    Args:
+        db: 数据库会话
+        environment_id: 环境ID
+    
+    Returns:
+        是否下发了任务
+    """
+    from services.task_queue_service import TaskQueueService
+    from models.task_queue import TaskQueue
+    from models.test_suite import TestSuite
+    
+    next_task = TaskQueueService.get_next_pending_task(db, environment_id)
+    if not next_task or not TaskQueueService.can_execute_immediately(db, environment_id):
+        return False
+    
+    # 开始执行下一个任务
+    TaskQueueService.start_task(db, next_task.execution_id)
+    
+    # 更新测试套状态为running
+    next_suite = db.query(TestSuite).filter(TestSuite.id == next_task.suite_id).first()
+    if not next_suite:
+        logger.warning(f"[WebSocket] 队列中任务的测试套不存在: suite_id={next_task.suite_id}")
+        db.commit()
+        return False
+    # 检查该测试套是否还有其他正在运行的任务
+    next_running = db.query(TaskQueue).filter(
+        TaskQueue.suite_id == next_task.suite_id,
+        TaskQueue.status == "running"
+    ).count()
+    next_suite.status = "running" if next_running > 0 else "pending"
+    
+    # 构建执行任务消息
+    git_enabled = next_suite.git_enabled == 'true' if hasattr(next_suite, 'git_enabled') and next_suite.git_enabled else False
+    
+    task_message = {
+        "type": "execute_test_suite",
+        "suite_id": next_suite.id,
+        "plan_id": next_suite.plan_id,
+        "execution_id": next_task.execution_id,
+        "git_repo_url": (next_suite.git_repo_url or None) if git_enabled else None,
+        "git_branch": (next_suite.git_branch or None) if git_enabled else None,
+        "git_token": (next_suite.git_token or None) if git_enabled else None,
+        "execution_command": next_suite.execution_command,
+        "case_ids": next_suite.case_ids,
+        "executor_id": next_task.executor_id
+    }
+    
+    # 发送到Agent
+    await manager.send_message(environment_id, task_message)
+    logger.info(f"[WebSocket] 队列中的下一个任务已启动: suite_id={next_suite.id}, execution_id={next_task.execution_id}")
+    db.commit()
+    return True
+
+
+async def handle_slot_released(db: Session, environment_id: str, message: dict):
+    """处理Agent执行槽位释放通知：测试套进程树已全部退出，立即下发队列中的下一个任务"""
+    try:
+        logger.info(
+            f"[WebSocket] Agent槽位已释放: suite_id={message.get('suite_id')}, execution_id={message.get('execution_id')}, "
+            f"运行中={message.get('running')}/{message.get('max_concurrent')}"
+        )
+        await dispatch_next_queued_task(db, environment_id)
     except Exception as e:
-        logger.exception(f"[WebSocket] 处理测试套日志时出错: {e}")
+        logger.exception(f"[WebSocket] 处理槽位释放消息时出错: {e}")
         db.rollback()
+        raise
 
 
 async def handle_test_suite_completed(db: Session, environment_id: str, message: dict):
     """处理测试套执行完成消息"""
     from services.task_queue_service import TaskQueueService
+    from services.suite_log_service import SuiteLogService
     from models.task_queue import TaskQueue
-    from models.test_suite import TestSuite
+    from models.test_suite import TestSuite, TestSuiteLog
     
     try:
         suite_id = message.get("suite_id")
@@ -687,6 +1212,16 @@ async def handle_test_suite_completed(db: Session, environment_id: str, message:
             return
         
         logger.info(f"[WebSocket] 收到测试套完成消息: suite_id={suite_id}, execution_id={execution_id}, status={status}")
+        # 完成（或取消）前的日志可能还在写入缓冲中，先全部落库，再根据首末行时间计算执行耗时
+        await log_ingestion_buffer.flush(suite_id, execution_id)
+        log_entry = db.query(TestSuiteLog).filter(
+            TestSuiteLog.suite_id == suite_id,
+            TestSuiteLog.execution_id == execution_id
+        ).first()
+        if log_entry:
+            log_entry.duration = SuiteLogService.get_duration(log_entry) or log_entry.duration
+            logger.info(f"[WebSocket] 测试套执行耗时已保存到日志: suite_id={suite_id}, execution_id={execution_id}, duration={log_entry.duration}")
+        manager.set_agent_queued(environment_id, suite_id, None)
         
         # 更新任务队列中的任务状态
         task_status_map = {
@@ -750,47 +1285,13 @@ async def handle_test_suite_completed(db: Session, environment_id: str, message:
         db.commit()
         logger.info(f"[WebSocket] 测试套状态已更新: suite_id={suite_id}, status={suite.status}, 任务状态={task_status}, 运行中任务={running_tasks}, 等待中任务={pending_tasks}")
         
-        # 尝试执行队列中的下一个任务
-        next_task = TaskQueueService.get_next_pending_task(db, environment_id)
-        if next_task:
-            # 检查是否可以执行
-            if TaskQueueService.can_execute_immediately(db, environment_id):
-                # 开始执行下一个任务
-                TaskQueueService.start_task(db, next_task.execution_id)
-                
-                # 更新测试套状态为running
-                next_suite = db.query(TestSuite).filter(TestSuite.id == next_task.suite_id).first()
-                if next_suite:
-                    # 检查该测试套是否还有其他正在运行的任务
-                    next_running = db.query(TaskQueue).filter(
-                        TaskQueue.suite_id == next_task.suite_id,
-                        TaskQueue.status == "running"
-                    ).count()
-                    next_suite.status = "running" if next_running > 0 else "pending"
-                
-                # 构建执行任务消息
-                git_enabled = next_suite.git_enabled == 'true' if hasattr(next_suite, 'git_enabled') and next_suite.git_enabled else False
-                
-                task_message = {
-                    "type": "execute_test_suite",
-                    "suite_id": next_suite.id,
-                    "plan_id": next_suite.plan_id,
-                    "execution_id": next_task.execution_id,
-                    "git_repo_url": (next_suite.git_repo_url or None) if git_enabled else None,
-                    "git_branch": (next_suite.git_branch or None) if git_enabled else None,
-                    "git_token": (next_suite.git_token or None) if git_enabled else None,
-                    "execution_command": next_suite.execution_command,
-                    "case_ids": next_suite.case_ids,
-                    "executor_id": next_task.executor_id
-                }
-                
-                # 发送到Agent
-                from api.v1.websocket import manager
-                await manager.send_message(environment_id, task_message)
-                logger.info(f"[WebSocket] 队列中的下一个任务已启动: suite_id={next_suite.id}, execution_id={next_task.execution_id}")
-                db.commit()
+        # 尝试执行队列中的下一个任务（支持槽位释放通知的Agent在进程树退出、槽位实际空闲后再下发）。
+        # 取消和失败时槽位释放通知可能先于完成消息到达，那时任务仍计为运行中、下发被跳过，因此这里总是再尝试一次
+        if status in ("cancelled", "failed") or not manager.has_capability(environment_id, "slot_release"):
+            await dispatch_next_queued_task(db, environment_id)
         
     except Exception as e:
         logger.exception(f"[WebSocket] 处理测试套完成消息时出错: {e}")
         db.rollback()
+        raise
 
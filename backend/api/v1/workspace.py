@@ -1,5 +1,6 @@
 """工作空间API - 通过WebSocket与Agent通信"""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database import get_db
 from models.user import User
@@ -8,15 +9,93 @@ from api.v1.websocket import manager
 from services.environment_service import EnvironmentService
 from schemas.common import APIResponse, ResponseStatus
 from core.logger import logger
+from utils.delta_sync import compute_delta, split_delta
 import uuid
 import asyncio
-from typing import Dict, Any, Optional
+import hashlib
+import json
+import mimetypes
+import re
+import urllib.parse
+import zipfile
+from typing import Dict, Any, List, Optional, Tuple
 
 router = APIRouter()
 
 # 存储待响应的请求: {request_id: (event, response_data)}
 pending_requests: Dict[str, tuple] = {}
 
+# 每个环境同时进行的工作空间请求数上限，超出的请求等待（避免压垮Agent）
+WORKSPACE_MAX_CONCURRENT_REQUESTS = 4
+workspace_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_workspace_semaphore(environment_id: str) -> asyncio.Semaphore:
+    """获取环境的工作空间请求并发限制"""
+    semaphore = workspace_semaphores.get(environment_id)
+    if semaphore is None:
+        semaphore = workspace_semaphores[environment_id] = asyncio.Semaphore(WORKSPACE_MAX_CONCURRENT_REQUESTS)
+    return semaphore
+
+# 流式传输参数
+STREAM_CHUNK_SIZE = 256 * 1024  # 单个数据块大小
+STREAM_WINDOW = 8  # 未确认的数据块上限（流量控制窗口）
+STREAM_START_TIMEOUT = 10.0  # 等待Agent开始传输的超时时间（秒）
+STREAM_IDLE_TIMEOUT = 60.0  # 传输过程中等待数据块/确认的超时时间（秒）
+
+# 增量同步参数
+SYNC_MAX_MESSAGE_BYTES = 512 * 1024  # 每条同步消息中字面数据的最大字节数（Agent端单帧上限为1MB）
+SYNC_MAX_TOTAL_BYTES = 1024 * 1024 * 1024  # 压缩包解压后的总大小上限
+SYNC_REQUEST_TIMEOUT = 120.0  # 计算签名/应用每批增量的超时时间（秒）
+
+
+class WorkspaceStream:
+    """一次工作空间流式请求（文件传输或搜索）的服务端状态"""
+    
+    def __init__(self, environment_id: str, request_id: str, cancel_type: str = "workspace_stream_cancel"):
+        self.environment_id = environment_id
+        self.request_id = request_id
+        self.cancel_type = cancel_type
+        self.started: asyncio.Future = asyncio.get_event_loop().create_future()  # 开始消息（下载为文件信息，上传为就绪确认）
+        self.finished: asyncio.Future = asyncio.get_event_loop().create_future()  # 结束消息
+        self.chunks: asyncio.Queue = asyncio.Queue()  # 下载的数据块或搜索结果，None表示结束
+        self.acked = -1  # Agent已确认的最大数据块序号（上传）
+        self.window = STREAM_WINDOW
+        self.ack_event = asyncio.Event()
+    
+    def on_start(self, message: Dict[str, Any]) -> None:
+        if not self.started.done():
+            self.started.set_result(message)
+    
+    def on_ack(self, message: Dict[str, Any]) -> None:
+        index = message.get("index", -1)
+        if index == -1:
+            self.window = message.get("window") or self.window
+            self.on_start(message)
+        self.acked = max(self.acked, index)
+        self.ack_event.set()
+    
+    def on_end(self, message: Dict[str, Any]) -> None:
+        # 传输失败也可能发生在开始之前
+        if not message.get("success"):
+            self.on_start(message)
+        if not self.finished.done():
+            self.finished.set_result(message)
+        self.chunks.put_nowait(None)
+        self.ack_event.set()
+    
+    async def wait_window(self, index: int) -> None:
+        """等待直到序号为index的数据块可以发送"""
+        while index - self.acked > self.window:
+            if self.finished.done():
+                return
+            self.ack_event.clear()
+            await asyncio.wait_for(self.ack_event.wait(), timeout=STREAM_IDLE_TIMEOUT)
+
+
+# 进行中的流式传输: {request_id: WorkspaceStream}
+active_streams: Dict[str, WorkspaceStream] = {}
+
 
 async def send_workspace_request(
     environment_id: str,
@@ -36,45 +115,63 @@ async def send_workspace_request(
     Returns:
         响应数据
     """
-    # 生成请求ID
-    request_id = str(uuid.uuid4())
-    
-    # 创建事件用于等待响应
-    event = asyncio.Event()
-    response_data: Optional[Dict[str, Any]] = None
-    
-    # 存储请求
-    pending_requests[request_id] = (event, response_data)
-    
-    # 构建消息
-    message = {
-        "type": message_type,
-        "request_id": request_id,
-        **data
-    }
-    
-    # 发送消息
-    logger.info(f"[Workspace] 发送请求到环境 {environment_id}: {message_type}, request_id: {request_id}")
-    success = await manager.send_message(environment_id, message)
-    if not success:
-        del pending_requests[request_id]
+    # 每个环境的并发请求数受限，排队时间计入超时
+    semaphore = get_workspace_semaphore(environment_id)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=timeout)
+    except asyncio.TimeoutError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Agent未连接或无法发送消息"
+            detail="该环境的工作空间请求过多，请稍后重试"
         )
     
-    logger.debug(f"[Workspace] 消息已发送，等待响应...")
-    # 等待响应（带超时）
     try:
-        await asyncio.wait_for(event.wait(), timeout=timeout)
-        logger.info(f"[Workspace] 收到响应，request_id: {request_id}")
-    except asyncio.TimeoutError:
-        logger.warning(f"[Workspace] 等待响应超时，request_id: {request_id}")
-        del pending_requests[request_id]
-        raise HTTPException(
-            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
-            detail="等待Agent响应超时"
-        )
+        # 生成请求ID
+        request_id = str(uuid.uuid4())
+        
+        # 创建事件用于等待响应
+        event = asyncio.Event()
+        response_data: Optional[Dict[str, Any]] = None
+        
+        # 存储请求
+        pending_requests[request_id] = (event, response_data)
+        
+        # 构建消息
+        message = {
+            "type": message_type,
+            "request_id": request_id,
+            **data
+        }
+        
+        # 发送消息
+        logger.info(f"[Workspace] 发送请求到环境 {environment_id}: {message_type}, request_id: {request_id}")
+        success = await manager.send_message(environment_id, message)
+        if not success:
+            del pending_requests[request_id]
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Agent未连接或无法发送消息"
+            )
+        
+        logger.debug(f"[Workspace] 消息已发送，等待响应...")
+        # 等待响应（带超时）
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            logger.info(f"[Workspace] 收到响应，request_id: {request_id}")
+        except asyncio.TimeoutError:
+            logger.warning(f"[Workspace] 等待响应超时，request_id: {request_id}")
+            del pending_requests[request_id]
+            # 通知Agent取消仍在排队或执行中的操作
+            await manager.send_message(environment_id, {
+                "type": "workspace_cancel",
+                "request_id": request_id
+            })
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="等待Agent响应超时"
+            )
+    finally:
+        semaphore.release()
     
     # 获取响应数据
     _, response_data = pending_requests.pop(request_id, (None, None))
@@ -119,14 +216,129 @@ def handle_workspace_response(message: Dict[str, Any]) -> None:
     event.set()
 
 
+def handle_workspace_stream_message(message: Dict[str, Any]) -> None:
+    """
+    处理来自Agent的流式请求消息
+    
+    Args:
+        message: workspace_stream_start/chunk/ack/end 或 workspace_search_start/result/end消息
+    """
+    stream = active_streams.get(message.get("request_id"))
+    if not stream:
+        return
+    
+    msg_type = message.get("type")
+    if msg_type in ("workspace_stream_start", "workspace_search_start"):
+        stream.on_start(message)
+    elif msg_type == "workspace_stream_chunk":
+        stream.chunks.put_nowait((message.get("index"), message.get("data") or b""))
+    elif msg_type == "workspace_search_result":
+        stream.chunks.put_nowait(message.get("matches") or [])
+    elif msg_type == "workspace_stream_ack":
+        stream.on_ack(message)
+    elif msg_type in ("workspace_stream_end", "workspace_search_end"):
+        stream.on_end(message)
+
+
+async def open_workspace_stream(
+    environment_id: str,
+    message_type: str,
+    data: Dict[str, Any],
+    capability: str = "workspace_stream",
+    cancel_type: str = "workspace_stream_cancel"
+) -> Tuple[WorkspaceStream, Dict[str, Any]]:
+    """
+    向Agent发起流式请求并等待开始消息
+    
+    Args:
+        environment_id: 环境ID
+        message_type: workspace_stream_read、workspace_stream_write 或 workspace_search
+        data: 请求数据
+        capability: Agent需要具备的能力
+        cancel_type: 取消请求时发送的消息类型
+    
+    Returns:
+        (请求状态, 开始消息)
+    """
+    if not manager.has_capability(environment_id, capability):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Agent版本不支持该操作，请升级Agent"
+        )
+    
+    request_id = str(uuid.uuid4())
+    stream = WorkspaceStream(environment_id, request_id, cancel_type)
+    active_streams[request_id] = stream
+    
+    message = {
+        "type": message_type,
+        "request_id": request_id,
+        **data
+    }
+    logger.info(f"[Workspace] 发起流式传输到环境 {environment_id}: {message_type}, request_id: {request_id}")
+    if not await manager.send_message(environment_id, message):
+        active_streams.pop(request_id, None)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agent未连接或无法发送消息"
+        )
+    
+    try:
+        start = await asyncio.wait_for(asyncio.shield(stream.started), timeout=STREAM_START_TIMEOUT)
+    except asyncio.TimeoutError:
+        await close_workspace_stream(stream, cancel=True)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="等待Agent响应超时"
+        )
+    
+    if start.get("success") is False:
+        active_streams.pop(request_id, None)
+        error = start.get("error", "未知错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Agent处理失败: {error}"
+        )
+    return stream, start
+
+
+async def close_workspace_stream(stream: WorkspaceStream, cancel: bool = False) -> None:
+    """结束流式请求，cancel为True时通知Agent取消"""
+    active_streams.pop(stream.request_id, None)
+    if cancel and not stream.finished.done():
+        await manager.send_message(stream.environment_id, {
+            "type": stream.cancel_type,
+            "request_id": stream.request_id
+        })
+
+
+def parse_range_header(range_header: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    解析HTTP Range请求头（只支持单个范围）
+    
+    Returns:
+        (起始偏移, 结束偏移或None)，后缀范围（bytes=-N）返回(-N, None)，无法解析时返回None
+    """
+    if not range_header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header)
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if not match.group(1):
+        return -int(match.group(2)), None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
 @router.get("/{environment_id}/workspace/list", response_model=APIResponse)
 async def list_workspace_files(
     environment_id: str,
     path: str = "",
+    offset: int = 0,
+    limit: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """列出工作空间文件"""
+    """列出工作空间文件（指定limit时分页返回items/total/offset/limit）"""
     # 检查环境是否存在
     environment = EnvironmentService.get_environment(db, environment_id)
     if not environment:
@@ -146,7 +358,7 @@ async def list_workspace_files(
         data = await send_workspace_request(
             environment_id,
             "workspace_list",
-            {"path": path}
+            {"path": path, "offset": offset, "limit": limit} if limit is not None else {"path": path}
         )
         
         return APIResponse(
@@ -233,7 +445,8 @@ async def delete_workspace_file(
         data = await send_workspace_request(
             environment_id,
             "workspace_delete",
-            {"path": path}
+            {"path": path},
+            timeout=120.0  # 删除大目录耗时较长，超时会中止删除
         )
         
         return APIResponse(
@@ -293,3 +506,489 @@ async def create_workspace_directory(
             detail=f"创建文件夹失败: {str(e)}"
         )
 
+
+@router.get("/{environment_id}/workspace/suite-output", response_model=APIResponse)
+async def read_suite_output(
+    environment_id: str,
+    suite_id: str,
+    execution_id: Optional[str] = None,
+    offset: int = 0,
+    length: int = 1024 * 1024,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """按字节偏移量读取测试套执行输出（Agent端落盘文件）"""
+    environment = EnvironmentService.get_environment(db, environment_id)
+    if not environment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="环境不存在"
+        )
+    
+    if not environment.get("isOnline"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="环境离线，无法访问工作空间"
+        )
+    
+    try:
+        data = await send_workspace_request(
+            environment_id,
+            "suite_output_read",
+            {
+                "suite_id": suite_id,
+                "execution_id": execution_id,
+                "offset": offset,
+                "length": length
+            }
+        )
+        
+        return APIResponse(
+            status=ResponseStatus.SUCCESS,
+            message="读取执行输出成功",
+            data=data
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("读取执行输出失败")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"读取执行输出失败: {str(e)}"
+        )
+
+
+@router.get("/{environment_id}/workspace/download")
+async def download_workspace_file(
+    environment_id: str,
+    path: str,
+    request: Request,
+    offset: int = 0,
+    length: int = -1,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """流式下载工作空间文件（不限文件大小，支持Range请求头或offset/length范围读取）"""
+    environment = EnvironmentService.get_environment(db, environment_id)
+    if not environment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="环境不存在"
+        )
+    
+    if not environment.get("isOnline"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="环境离线，无法访问工作空间"
+        )
+    
+    byte_range = parse_range_header(request.headers.get("range"))
+    if byte_range:
+        start, end = byte_range
+        if start < 0:
+            # 后缀范围需要先知道文件大小，交给Agent按文件末尾计算
+            offset, length = start, -1
+        else:
+            offset = start
+            length = end - start + 1 if end is not None else -1
+    
+    stream, start_message = await open_workspace_stream(
+        environment_id,
+        "workspace_stream_read",
+        {
+            "path": path,
+            "offset": offset,
+            "length": length,
+            "chunk_size": STREAM_CHUNK_SIZE,
+            "window": STREAM_WINDOW
+        }
+    )
+    file_info = start_message.get("data") or {}
+    
+    async def iter_chunks():
+        completed = False
+        try:
+            while True:
+                item = await asyncio.wait_for(stream.chunks.get(), timeout=STREAM_IDLE_TIMEOUT)
+                if item is None:
+                    end_message = stream.finished.result() if stream.finished.done() else {}
+                    if not end_message.get("success"):
+                        logger.warning(f"[Workspace] 流式下载失败: {end_message.get('error')}, request_id: {stream.request_id}")
+                    else:
+                        completed = True
+                    break
+                index, data = item
+                yield data
+                # 数据已交给HTTP客户端，确认后Agent才继续发送（流量控制）
+                await manager.send_message(environment_id, {
+                    "type": "workspace_stream_ack",
+                    "request_id": stream.request_id,
+                    "index": index
+                })
+        finally:
+            await close_workspace_stream(stream, cancel=not completed)
+    
+    filename = file_info.get("name") or path.rsplit("/", 1)[-1]
+    encoded_filename = urllib.parse.quote(filename, safe='')
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+        "Content-Length": str(file_info.get("length", 0)),
+        "Accept-Ranges": "bytes"
+    }
+    status_code = status.HTTP_200_OK
+    if byte_range:
+        range_start = file_info.get("offset", 0)
+        range_end = range_start + file_info.get("length", 0) - 1
+        headers["Content-Range"] = f"bytes {range_start}-{range_end}/{file_info.get('size', 0)}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+    
+    return StreamingResponse(
+        iter_chunks(),
+        status_code=status_code,
+        media_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers=headers
+    )
+
+
+@router.put("/{environment_id}/workspace/upload", response_model=APIResponse)
+async def upload_workspace_file(
+    environment_id: str,
+    path: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """流式上传工作空间文件（请求体为文件原始内容，不限文件大小）"""
+    environment = EnvironmentService.get_environment(db, environment_id)
+    if not environment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="环境不存在"
+        )
+    
+    if not environment.get("isOnline"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="环境离线，无法访问工作空间"
+        )
+    
+    stream, _ = await open_workspace_stream(
+        environment_id,
+        "workspace_stream_write",
+        {"path": path, "window": STREAM_WINDOW}
+    )
+    
+    completed = False
+    try:
+        index = 0
+        offset = 0
+        buffer = bytearray()
+        
+        async def send_chunk(data: bytes) -> None:
+            nonlocal index, offset
+            await stream.wait_window(index)
+            if stream.finished.done():
+                return  # Agent已报错结束
+            if not await manager.send_message(environment_id, {
+                "type": "workspace_stream_chunk",
+                "request_id": stream.request_id,
+                "index": index,
+                "offset": offset,
+                "data": data
+            }):
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Agent连接中断"
+                )
+            index += 1
+            offset += len(data)
+        
+        async for piece in request.stream():
+            buffer.extend(piece)
+            while len(buffer) >= STREAM_CHUNK_SIZE and not stream.finished.done():
+                await send_chunk(bytes(buffer[:STREAM_CHUNK_SIZE]))
+                del buffer[:STREAM_CHUNK_SIZE]
+            if stream.finished.done():
+                break
+        if buffer and not stream.finished.done():
+            await send_chunk(bytes(buffer))
+        
+        if not stream.finished.done():
+            await manager.send_message(environment_id, {
+                "type": "workspace_stream_end",
+                "request_id": stream.request_id
+            })
+        end_message = await asyncio.wait_for(asyncio.shield(stream.finished), timeout=STREAM_IDLE_TIMEOUT)
+        completed = True
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="等待Agent响应超时"
+        )
+    finally:
+        await close_workspace_stream(stream, cancel=not completed)
+    
+    if not end_message.get("success"):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Agent处理失败: {end_message.get('error', '未知错误')}"
+        )
+    
+    return APIResponse(
+        status=ResponseStatus.SUCCESS,
+        message="上传文件成功",
+        data=end_message.get("data", {})
+    )
+
+
+def _read_sync_archive(archive: zipfile.ZipFile) -> Dict[str, zipfile.ZipInfo]:
+    """
+    校验同步压缩包并返回其中的文件
+    
+    Args:
+        archive: zip压缩包
+        
+    Returns:
+        {相对路径（/分隔）: ZipInfo}
+    """
+    entries: Dict[str, zipfile.ZipInfo] = {}
+    total_size = 0
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        name = info.filename.replace("\\", "/")
+        parts = [part for part in name.split("/") if part not in ("", ".")]
+        if name.startswith("/") or ".." in parts or not parts:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"压缩包中包含非法路径: {info.filename}"
+            )
+        total_size += info.file_size
+        if total_size > SYNC_MAX_TOTAL_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="压缩包解压后大小超过限制"
+            )
+        entries["/".join(parts)] = info
+    return entries
+
+
+@router.post("/{environment_id}/workspace/sync", response_model=APIResponse)
+async def sync_workspace_directory(
+    environment_id: str,
+    path: str = Query("", description="工作空间中的目标目录"),
+    delete: bool = Query(False, description="是否删除目标目录中压缩包里不存在的文件"),
+    file: UploadFile = File(..., description="目录内容的zip压缩包"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    增量同步目录到工作空间（rsync风格）
+    
+    Agent先返回目标目录下各文件的块签名，服务端只发送内容变化的数据块和新增的文件，
+    Agent在临时文件中重建并校验后原子替换。整个目录树一次同步完成。
+    """
+    environment = EnvironmentService.get_environment(db, environment_id)
+    if not environment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="环境不存在"
+        )
+    
+    if not environment.get("isOnline"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="环境离线，无法访问工作空间"
+        )
+    
+    if not manager.has_capability(environment_id, "workspace_sync"):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Agent版本不支持该操作，请升级Agent"
+        )
+    
+    try:
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上传的文件不是有效的zip压缩包"
+        )
+    
+    sync_id: Optional[str] = None
+    completed = False
+    try:
+        entries = _read_sync_archive(archive)
+        
+        signature_data = await send_workspace_request(
+            environment_id,
+            "workspace_signature",
+            {"path": path},
+            timeout=SYNC_REQUEST_TIMEOUT
+        )
+        signatures: Dict[str, Dict[str, Any]] = signature_data.get("files") or {}
+        
+        sync_id = uuid.uuid4().hex
+        stats = {
+            "files": len(entries),
+            "changed": 0,
+            "unchanged": 0,
+            "deleted": 0,
+            "bytes_total": 0,
+            "bytes_sent": 0,
+            "bytes_written": 0
+        }
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        
+        async def flush(deletes: Optional[List[str]] = None) -> None:
+            nonlocal batch, batch_bytes
+            if not batch and not deletes:
+                return
+            result = await send_workspace_request(
+                environment_id,
+                "workspace_sync_apply",
+                {"path": path, "sync_id": sync_id, "files": batch, "deletes": deletes or []},
+                timeout=SYNC_REQUEST_TIMEOUT
+            )
+            stats["bytes_written"] += result.get("written", 0)
+            stats["deleted"] += result.get("deleted", 0)
+            batch, batch_bytes = [], 0
+        
+        loop = asyncio.get_event_loop()
+        for relative_path, info in sorted(entries.items()):
+            data = await loop.run_in_executor(None, archive.read, info)
+            stats["bytes_total"] += len(data)
+            sha256 = hashlib.sha256(data).hexdigest()
+            signature = signatures.get(relative_path)
+            if signature and signature.get("sha256") == sha256:
+                stats["unchanged"] += 1
+                continue
+            
+            # 计算增量（CPU密集，放到线程池中执行）
+            ops = await loop.run_in_executor(None, compute_delta, data, signature or {})
+            parts = split_delta(ops, SYNC_MAX_MESSAGE_BYTES)
+            stats["changed"] += 1
+            for index, (part_ops, literal_bytes) in enumerate(parts):
+                if batch and batch_bytes + literal_bytes > SYNC_MAX_MESSAGE_BYTES:
+                    await flush()
+                final = index == len(parts) - 1
+                batch.append({
+                    "path": relative_path,
+                    "ops": part_ops,
+                    "block_size": (signature or {}).get("block_size"),
+                    "final": final,
+                    "sha256": sha256 if final else None
+                })
+                batch_bytes += literal_bytes
+                stats["bytes_sent"] += literal_bytes
+        
+        deletes = sorted(set(signatures) - set(entries)) if delete else []
+        await flush(deletes)
+        completed = True
+        
+        logger.info(
+            f"[Workspace] 环境 {environment_id} 增量同步完成: {path or '/'}，"
+            f"变化 {stats['changed']} 个文件，发送 {stats['bytes_sent']}/{stats['bytes_total']} 字节"
+        )
+        return APIResponse(
+            status=ResponseStatus.SUCCESS,
+            message="同步成功",
+            data=stats
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("增量同步失败")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"增量同步失败: {str(e)}"
+        )
+    finally:
+        archive.close()
+        if sync_id and not completed:
+            # 同步失败、超时或客户端断开：通知Agent删除未完成文件的临时文件
+            try:
+                await manager.send_message(environment_id, {
+                    "type": "workspace_sync_abort",
+                    "path": path,
+                    "sync_id": sync_id
+                })
+            except Exception as e:
+                logger.warning(f"[Workspace] 发送增量同步中止通知失败: {e}")
+
+
+@router.get("/{environment_id}/workspace/search")
+async def search_workspace_files(
+    environment_id: str,
+    pattern: str,
+    path: str = "",
+    regex: bool = False,
+    ignore_case: bool = False,
+    include: Optional[List[str]] = Query(None),
+    exclude: Optional[List[str]] = Query(None),
+    max_file_size: int = 1024 * 1024 * 1024,
+    max_hits: int = 1000,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    在Agent上搜索工作空间文件内容（逐行grep，文件内容不经过网络）
+    
+    以NDJSON流式返回：每行一个匹配（path, line, column, text），
+    最后一行为汇总（type=summary，包含扫描文件数、匹配数、是否截断或错误信息）。
+    """
+    environment = EnvironmentService.get_environment(db, environment_id)
+    if not environment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="环境不存在"
+        )
+    
+    if not environment.get("isOnline"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="环境离线，无法访问工作空间"
+        )
+    
+    stream, _ = await open_workspace_stream(
+        environment_id,
+        "workspace_search",
+        {
+            "pattern": pattern,
+            "path": path,
+            "regex": regex,
+            "ignore_case": ignore_case,
+            "include": include or [],
+            "exclude": exclude or [],
+            "max_file_size": max_file_size,
+            "max_hits": max_hits
+        },
+        capability="workspace_search",
+        cancel_type="workspace_search_cancel"
+    )
+    
+    async def iter_matches():
+        completed = False
+        try:
+            while True:
+                try:
+                    matches = await asyncio.wait_for(stream.chunks.get(), timeout=STREAM_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    yield json.dumps({"type": "summary", "success": False, "error": "等待Agent搜索结果超时"}, ensure_ascii=False) + "\n"
+                    break
+                if matches is None:
+                    end_message = stream.finished.result() if stream.finished.done() else {}
+                    completed = True
+                    yield json.dumps({
+                        "type": "summary",
+                        "success": bool(end_message.get("success")),
+                        "error": end_message.get("error"),
+                        **(end_message.get("data") or {})
+                    }, ensure_ascii=False) + "\n"
+                    break
+                yield "".join(json.dumps(match, ensure_ascii=False) + "\n" for match in matches)
+        finally:
+            await close_workspace_stream(stream, cancel=not completed)
+    
+    return StreamingResponse(iter_matches(), media_type="application/x-ndjson")
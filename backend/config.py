@@ -60,6 +60,11 @@ class Settings(BaseSettings):
     WEBSOCKET_PORT: int = 8000
     WEBSOCKET_PATH: str = "/ws/agent"
     
+    # 测试套日志写入缓冲配置
+    LOG_FLUSH_INTERVAL_MS: int = 200  # 定时批量写入间隔（毫秒）
+    LOG_FLUSH_MAX_LINES: int = 500  # 单个执行积累多少行时立即写入
+    LOG_BUFFER_MAX_BYTES: int = 64 * 1024 * 1024  # 缓冲上限，超过后Agent接收循环等待写入（64MB）
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -11,7 +11,7 @@ import traceback
 from config import settings
 from database import engine, Base, SessionLocal
 from api.v1 import auth, users, dashboard, projects, environments, test_cases, test_plans, executions, workspace, test_suites
-from api.v1.websocket import websocket_endpoint, frontend_manager
+from api.v1.websocket import websocket_endpoint, frontend_manager, log_ingestion_buffer, parse_log_cursors
 from core.security import verify_token
 from models import User
 from core.logger import logger
@@ -219,11 +219,16 @@ async def frontend_websocket_route(websocket: WebSocket):
             db.close()
             return
         
-        # 注册连接
-        await frontend_manager.connect(websocket, suite_id)
+        # 断线续传：sequence为前端已有日志记录的最大序号，cursors为各记录已接收到的行号（log_id:行号,...）
+        sequence = websocket.query_params.get("sequence")
+        try:
+            sequence = int(sequence) if sequence is not None else None
+        except ValueError:
+            sequence = None
+        cursors = parse_log_cursors(websocket.query_params.get("cursors"))
         
-        # 发送连接成功消息
-        await websocket.send_json({
+        # 注册连接（之后的消息都通过订阅者的发送队列发送）：先发送连接成功消息，指定了sequence时再回放缺失的日志
+        subscriber = await frontend_manager.connect(websocket, suite_id, sequence, cursors, greeting={
             "type": "connected",
             "message": f"已连接到测试套 {suite_id} 的日志流"
         })
@@ -236,15 +241,14 @@ async def frontend_websocket_route(websocket: WebSocket):
                 try:
                     message = json.loads(data)
                     if message.get("type") == "ping":
-                        await websocket.send_json({"type": "pong"})
+                        subscriber.send({"type": "pong"})
                 except json.JSONDecodeError:
                     pass
             except asyncio.TimeoutError:
-                # 发送心跳
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except:
+                # 发送心跳（发送失败或要求重新同步后订阅者会关闭）
+                if subscriber.closed:
                     break
+                subscriber.send({"type": "ping"})
             except WebSocketDisconnect:
                 break
                 
@@ -272,16 +276,24 @@ async def health_check():
     return {
         "status": "healthy",
         "service": settings.PROJECT_NAME,
-        "version": settings.PROJECT_VERSION
+        "version": settings.PROJECT_VERSION,
+        "log_ingestion": log_ingestion_buffer.stats()
     }
 
 
+@app.on_event("shutdown")
+async def flush_log_ingestion():
+    """关闭前写入缓冲中的测试套日志"""
+    await log_ingestion_buffer.close()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.ENVIRONMENT == "development"
+        reload=settings.ENVIRONMENT == "development",
+        ws_per_message_deflate=True  # 与Agent协商permessage-deflate压缩
     )
 
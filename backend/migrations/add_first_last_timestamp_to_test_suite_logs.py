@@ -0,0 +1,84 @@
+"""添加first_timestamp、last_timestamp字段到test_suite_logs表（用于计算执行耗时）"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from database import engine
+
+
+def upgrade():
+    """执行迁移"""
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if 'test_suite_logs' not in inspector.get_table_names():
+            print("✗ test_suite_logs表不存在，跳过迁移")
+            return
+
+        try:
+            columns = [col['name'] for col in inspector.get_columns('test_suite_logs')]
+            if 'first_timestamp' not in columns:
+                conn.execute(text("""
+                    ALTER TABLE test_suite_logs
+                    ADD COLUMN first_timestamp DATETIME(6) NULL COMMENT '第一行日志的时间'
+                    AFTER segment_count
+                """))
+                print("✓ 成功添加first_timestamp字段到test_suite_logs表")
+            if 'last_timestamp' not in columns:
+                conn.execute(text("""
+                    ALTER TABLE test_suite_logs
+                    ADD COLUMN last_timestamp DATETIME(6) NULL COMMENT '最后一行日志的时间'
+                    AFTER first_timestamp
+                """))
+                print("✓ 成功添加last_timestamp字段到test_suite_logs表")
+            conn.commit()
+
+            # 根据已有分段回填首末行时间
+            if 'test_suite_log_segments' in inspector.get_table_names():
+                result = conn.execute(text("""
+                    UPDATE test_suite_logs l
+                    INNER JOIN (
+                        SELECT log_id,
+                               MIN(first_timestamp) AS first_ts,
+                               MAX(last_timestamp) AS last_ts
+                        FROM test_suite_log_segments
+                        GROUP BY log_id
+                    ) s ON l.id = s.log_id
+                    SET l.first_timestamp = s.first_ts,
+                        l.last_timestamp = s.last_ts
+                    WHERE l.first_timestamp IS NULL
+                """))
+                conn.commit()
+                print(f"✓ 成功为 {result.rowcount} 条日志记录回填首末行时间")
+            else:
+                print("✗ test_suite_log_segments表不存在，跳过回填（请先执行add_test_suite_log_segments.py）")
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ 迁移失败: {e}")
+            raise
+
+
+def downgrade():
+    """回滚迁移"""
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if 'test_suite_logs' not in inspector.get_table_names():
+            print("✗ test_suite_logs表不存在，跳过回滚")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('test_suite_logs')]
+        try:
+            for column in ('last_timestamp', 'first_timestamp'):
+                if column in columns:
+                    conn.execute(text(f"ALTER TABLE test_suite_logs DROP COLUMN {column}"))
+                    print(f"✓ 成功移除{column}字段")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ 回滚失败: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,21 @@
+-- 添加first_timestamp、last_timestamp字段到test_suite_logs表（用于计算执行耗时）
+ALTER TABLE test_suite_logs
+ADD COLUMN first_timestamp DATETIME(6) NULL COMMENT '第一行日志的时间'
+AFTER segment_count;
+
+ALTER TABLE test_suite_logs
+ADD COLUMN last_timestamp DATETIME(6) NULL COMMENT '最后一行日志的时间'
+AFTER first_timestamp;
+
+-- 根据已有分段回填首末行时间（需先执行 add_test_suite_log_segments）
+UPDATE test_suite_logs l
+INNER JOIN (
+    SELECT log_id,
+           MIN(first_timestamp) AS first_ts,
+           MAX(last_timestamp) AS last_ts
+    FROM test_suite_log_segments
+    GROUP BY log_id
+) s ON l.id = s.log_id
+SET l.first_timestamp = s.first_ts,
+    l.last_timestamp = s.last_ts
+WHERE l.first_timestamp IS NULL;
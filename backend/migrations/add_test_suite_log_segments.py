@@ -0,0 +1,192 @@
+"""测试套日志改为分段存储：创建test_suite_log_segments表，并把旧记录的message迁移为分段"""
+import sys
+import os
+import re
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from database import engine
+
+# 与 services/suite_log_service.py 保持一致
+SEGMENT_MAX_CHARS = 16000
+LINE_TIMESTAMP_PATTERN = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\]')
+BATCH_SIZE = 200
+
+
+def _line_timestamp(line, fallback):
+    """解析日志行前缀中的时间戳，没有时返回fallback"""
+    match = LINE_TIMESTAMP_PATTERN.match(line)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S.%f")
+        except ValueError:
+            pass
+    return fallback
+
+
+def _chunk_lines(lines):
+    """按SEGMENT_MAX_CHARS拆分行（超长的单行会被截断）"""
+    chunk = []
+    size = 0
+    for line in lines:
+        if len(line) > SEGMENT_MAX_CHARS:
+            line = line[:SEGMENT_MAX_CHARS - 16] + " ...[已截断]"
+        if chunk and size + len(line) + 1 > SEGMENT_MAX_CHARS:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield chunk
+
+
+def _create_table(conn):
+    """创建分段表"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS test_suite_log_segments (
+            id VARCHAR(36) PRIMARY KEY,
+            log_id VARCHAR(36) NOT NULL,
+            execution_id VARCHAR(36) NULL COMMENT '执行ID（冗余自日志记录，便于按执行查询）',
+            segment_no INT NOT NULL COMMENT '分段序号，从0开始',
+            first_line INT NOT NULL COMMENT '分段第一行在整个日志中的行号，从0开始',
+            line_count INT NOT NULL COMMENT '分段行数',
+            message TEXT NOT NULL COMMENT '分段日志内容（多行，用换行符分隔）',
+            first_timestamp DATETIME(6) NULL COMMENT '分段第一行的时间',
+            last_timestamp DATETIME(6) NULL COMMENT '分段最后一行的时间',
+            created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            UNIQUE KEY uq_log_segment_no (log_id, segment_no),
+            INDEX idx_log_id (log_id),
+            INDEX idx_execution_segment (execution_id, segment_no),
+            FOREIGN KEY (log_id) REFERENCES test_suite_logs(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='测试套日志分段表'
+    """))
+
+
+def _migrate_messages(conn):
+    """把旧记录的message拆分为分段，迁移后清空message"""
+    migrated = 0
+    while True:
+        records = conn.execute(text("""
+            SELECT id, execution_id, message, created_at, timestamp
+            FROM test_suite_logs
+            WHERE segment_count = 0 AND message <> ''
+            LIMIT :limit
+        """), {"limit": BATCH_SIZE}).fetchall()
+        if not records:
+            break
+
+        for log_id, execution_id, message, created_at, last_time in records:
+            segment_no = 0
+            first_line = 0
+            for chunk in _chunk_lines(message.split("\n")):
+                conn.execute(text("""
+                    INSERT INTO test_suite_log_segments
+                        (id, log_id, execution_id, segment_no, first_line, line_count, message, first_timestamp, last_timestamp)
+                    VALUES
+                        (:id, :log_id, :execution_id, :segment_no, :first_line, :line_count, :message, :first_timestamp, :last_timestamp)
+                """), {
+                    "id": str(uuid.uuid4()),
+                    "log_id": log_id,
+                    "execution_id": execution_id,
+                    "segment_no": segment_no,
+                    "first_line": first_line,
+                    "line_count": len(chunk),
+                    "message": "\n".join(chunk),
+                    "first_timestamp": _line_timestamp(chunk[0], created_at),
+                    "last_timestamp": _line_timestamp(chunk[-1], last_time)
+                })
+                segment_no += 1
+                first_line += len(chunk)
+
+            conn.execute(text("""
+                UPDATE test_suite_logs
+                SET message = '', line_count = :line_count, segment_count = :segment_count
+                WHERE id = :id
+            """), {"id": log_id, "line_count": first_line, "segment_count": segment_no})
+
+        conn.commit()
+        migrated += len(records)
+        print(f"  已迁移 {migrated} 条日志记录")
+    return migrated
+
+
+def upgrade():
+    """执行迁移"""
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if 'test_suite_logs' not in inspector.get_table_names():
+            print("✗ test_suite_logs表不存在，跳过迁移")
+            return
+
+        try:
+            columns = [col['name'] for col in inspector.get_columns('test_suite_logs')]
+            if 'line_count' not in columns:
+                conn.execute(text("""
+                    ALTER TABLE test_suite_logs
+                    ADD COLUMN line_count INT NOT NULL DEFAULT 0 COMMENT '日志总行数'
+                    AFTER message
+                """))
+                print("✓ 成功添加line_count字段到test_suite_logs表")
+            if 'segment_count' not in columns:
+                conn.execute(text("""
+                    ALTER TABLE test_suite_logs
+                    ADD COLUMN segment_count INT NOT NULL DEFAULT 0 COMMENT '日志分段数'
+                    AFTER line_count
+                """))
+                print("✓ 成功添加segment_count字段到test_suite_logs表")
+
+            _create_table(conn)
+            conn.commit()
+            print("✓ test_suite_log_segments表已就绪")
+
+            migrated = _migrate_messages(conn)
+            print(f"✓ 成功将 {migrated} 条旧日志记录迁移为分段")
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ 迁移失败: {e}")
+            raise
+
+
+def downgrade():
+    """回滚迁移：把分段拼接回test_suite_logs.message，删除分段表和新增字段"""
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if 'test_suite_log_segments' not in inspector.get_table_names():
+            print("✓ test_suite_log_segments表不存在，跳过回滚")
+            return
+
+        try:
+            log_ids = [row[0] for row in conn.execute(text(
+                "SELECT DISTINCT log_id FROM test_suite_log_segments"
+            )).fetchall()]
+            for log_id in log_ids:
+                segments = conn.execute(text("""
+                    SELECT message FROM test_suite_log_segments
+                    WHERE log_id = :log_id
+                    ORDER BY segment_no ASC
+                """), {"log_id": log_id}).fetchall()
+                conn.execute(text("UPDATE test_suite_logs SET message = :message WHERE id = :id"), {
+                    "id": log_id,
+                    "message": "\n".join(segment[0] for segment in segments)
+                })
+            conn.commit()
+            print(f"✓ 成功将 {len(log_ids)} 条日志记录的分段拼接回message")
+
+            conn.execute(text("DROP TABLE test_suite_log_segments"))
+            columns = [col['name'] for col in inspector.get_columns('test_suite_logs')]
+            for column in ('segment_count', 'line_count'):
+                if column in columns:
+                    conn.execute(text(f"ALTER TABLE test_suite_logs DROP COLUMN {column}"))
+            conn.commit()
+            print("✓ 成功删除test_suite_log_segments表及line_count、segment_count字段")
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ 回滚失败: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    upgrade()
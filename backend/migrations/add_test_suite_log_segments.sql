@@ -0,0 +1,30 @@
+-- 测试套日志改为分段存储
+ALTER TABLE test_suite_logs
+ADD COLUMN line_count INT NOT NULL DEFAULT 0 COMMENT '日志总行数'
+AFTER message;
+
+ALTER TABLE test_suite_logs
+ADD COLUMN segment_count INT NOT NULL DEFAULT 0 COMMENT '日志分段数'
+AFTER line_count;
+
+-- 创建测试套日志分段表（只追加，写入后不再修改）
+CREATE TABLE IF NOT EXISTS test_suite_log_segments (
+    id VARCHAR(36) PRIMARY KEY,
+    log_id VARCHAR(36) NOT NULL,
+    execution_id VARCHAR(36) NULL COMMENT '执行ID（冗余自日志记录，便于按执行查询）',
+    segment_no INT NOT NULL COMMENT '分段序号，从0开始',
+    first_line INT NOT NULL COMMENT '分段第一行在整个日志中的行号，从0开始',
+    line_count INT NOT NULL COMMENT '分段行数',
+    message TEXT NOT NULL COMMENT '分段日志内容（多行，用换行符分隔）',
+    first_timestamp DATETIME(6) NULL COMMENT '分段第一行的时间',
+    last_timestamp DATETIME(6) NULL COMMENT '分段最后一行的时间',
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    UNIQUE KEY uq_log_segment_no (log_id, segment_no),
+    INDEX idx_log_id (log_id),
+    INDEX idx_execution_segment (execution_id, segment_no),
+    FOREIGN KEY (log_id) REFERENCES test_suite_logs(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='测试套日志分段表';
+
+-- 旧记录的message迁移为分段需要按行拆分并解析时间戳，请使用Python迁移脚本：
+--   python migrations/add_test_suite_log_segments.py
+-- 未迁移的旧记录仍可正常读取（读取时作为第0段处理）
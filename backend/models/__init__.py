@@ -8,7 +8,7 @@ from .test_case import TestCase, CaseAttachment
 from .filter_field import FilterField
 from .test_plan import TestPlan, PlanCaseRelation
 from .test_execution import TestExecution, ExecutionAttachment
-from .test_suite import TestSuite, TestSuiteExecution, TestSuiteLog
+from .test_suite import TestSuite, TestSuiteExecution, TestSuiteLog, TestSuiteLogSegment
 from .test_report import TestReport
 from .environment import Environment
 from .notification import Notification
@@ -31,6 +31,7 @@ __all__ = [
     "TestSuite",
     "TestSuiteExecution",
     "TestSuiteLog",
+    "TestSuiteLogSegment",
     "Environment",
     "Notification",
     "Role",
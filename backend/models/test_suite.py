@@ -1,5 +1,5 @@
 """测试套模型"""
-from sqlalchemy import Column, String, Text, ForeignKey, DateTime, JSON, Integer, func
+from sqlalchemy import Column, String, Text, ForeignKey, DateTime, JSON, Integer, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 from database import Base
@@ -68,14 +68,52 @@ class TestSuiteLog(Base):
     suite_id = Column(String(36), ForeignKey("test_suites.id", ondelete="CASCADE"), nullable=False, index=True)
     execution_id = Column(String(36), nullable=True, index=True, comment="执行ID，用于关联同一次执行的所有日志")
     sequence_number = Column(Integer, nullable=True, index=True, comment="序号，从1开始自增")
-    message = Column(Text, nullable=False, comment="日志消息（多行，用换行符分隔）")
+    message = Column(Text, nullable=False, default="", comment="旧版日志消息（已迁移到分段表，新记录为空）")
+    line_count = Column(Integer, nullable=False, default=0, comment="日志总行数")
+    segment_count = Column(Integer, nullable=False, default=0, comment="日志分段数")
+    first_timestamp = Column(DateTime(timezone=True), nullable=True, comment="第一行日志的时间")
+    last_timestamp = Column(DateTime(timezone=True), nullable=True, comment="最后一行日志的时间")
     duration = Column(String(20), nullable=True, comment="执行耗时")
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # 关系
     suite = relationship("TestSuite", back_populates="logs")
+    segments = relationship(
+        "TestSuiteLogSegment",
+        back_populates="log",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="dynamic",
+        order_by="TestSuiteLogSegment.segment_no"
+    )
     
     def __repr__(self):
         return f"<TestSuiteLog(id={self.id}, suite_id={self.suite_id})>"
 
+
+class TestSuiteLogSegment(Base):
+    """测试套日志分段表（只追加，写入后不再修改）"""
+    __tablename__ = "test_suite_log_segments"
+    __table_args__ = (
+        UniqueConstraint("log_id", "segment_no", name="uq_log_segment_no"),
+        Index("idx_execution_segment", "execution_id", "segment_no"),
+    )
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    log_id = Column(String(36), ForeignKey("test_suite_logs.id", ondelete="CASCADE"), nullable=False, index=True)
+    execution_id = Column(String(36), nullable=True, comment="执行ID（冗余自日志记录，便于按执行查询）")
+    segment_no = Column(Integer, nullable=False, comment="分段序号，从0开始")
+    first_line = Column(Integer, nullable=False, comment="分段第一行在整个日志中的行号，从0开始")
+    line_count = Column(Integer, nullable=False, comment="分段行数")
+    message = Column(Text, nullable=False, comment="分段日志内容（多行，用换行符分隔）")
+    first_timestamp = Column(DateTime(timezone=True), nullable=True, comment="分段第一行的时间")
+    last_timestamp = Column(DateTime(timezone=True), nullable=True, comment="分段最后一行的时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    # 关系
+    log = relationship("TestSuiteLog", back_populates="segments")
+    
+    def __repr__(self):
+        return f"<TestSuiteLogSegment(log_id={self.log_id}, segment_no={self.segment_no})>"
+
@@ -209,7 +209,7 @@ class EnvironmentService:
         node_info: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
         """
-        更新节点信息（由agent调用）
+        更新节点信息（由agent调用，支持只包含部分字段的增量更新）
         
         Args:
             environment_id: 环境ID
@@ -220,18 +220,21 @@ class EnvironmentService:
                 - disk_info: 磁盘信息
                 - memory_info: 内存信息
                 - cpu_info: CPU信息
+                - workspace_gc: 工作空间清理结果（保存在disk_info中）
         """
         environment = db.query(Environment).filter(Environment.id == environment_id).first()
         if not environment:
             return None
         
-        # 更新节点信息
-        environment.node_ip = node_info.get('node_ip')
-        environment.os_type = node_info.get('os_type')
-        environment.os_version = node_info.get('os_version')
-        environment.disk_info = node_info.get('disk_info')
-        environment.memory_info = node_info.get('memory_info')
-        environment.cpu_info = node_info.get('cpu_info')
+        # 更新节点信息（Agent心跳只携带变化的字段，未携带的字段保持原值）
+        previous_gc = (environment.disk_info or {}).get('workspace_gc')
+        for field in ('node_ip', 'os_type', 'os_version', 'disk_info', 'memory_info', 'cpu_info'):
+            if field in node_info:
+                setattr(environment, field, node_info[field])
+        # 工作空间清理结果随磁盘信息保存（磁盘信息更新时保留上一次的清理结果）
+        workspace_gc = node_info.get('workspace_gc') or previous_gc
+        if workspace_gc:
+            environment.disk_info = {**(environment.disk_info or {}), 'workspace_gc': workspace_gc}
         environment.is_online = True
         environment.last_heartbeat = beijing_now()
         
@@ -0,0 +1,242 @@
+"""测试套日志写入缓冲 - 日志先进入内存缓冲，由后台任务按执行批量写入数据库"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
+from core.logger import logger
+
+
+# (suite_id, execution_id)
+BufferKey = Tuple[str, Optional[str]]
+
+# 写入函数（在线程池中执行）：(suite_id, execution_id, lines, timestamp) -> 推送数据，返回None表示无需推送
+StoreFunc = Callable[[str, Optional[str], List[str], datetime], Optional[Dict[str, Any]]]
+
+# 写入完成回调（在事件循环中执行）：(suite_id, 推送数据)
+StoredFunc = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+MAX_STORE_ATTEMPTS = 3  # 写入失败的最大重试次数，超过后丢弃该批日志
+
+
+class _PendingLog:
+    """单个执行待写入的日志"""
+
+    __slots__ = ("lines", "bytes", "timestamp", "since", "attempts")
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.bytes = 0
+        self.timestamp: Optional[datetime] = None
+        self.since = time.monotonic()  # 最早一行进入缓冲的时间
+        self.attempts = 0
+
+
+class LogIngestionBuffer:
+    """测试套日志写入缓冲
+
+    Agent接收循环只把日志行放入内存缓冲即返回，后台任务每隔 ``flush_interval`` 秒
+    （或某个执行积累了 ``max_lines`` 行时立即）按执行合并写入数据库，
+    写入在线程池中进行，数据库变慢不会阻塞事件循环。
+
+    缓冲的总字节数超过 ``max_bytes`` 时，``add`` 会等待后台写入腾出空间（反压），
+    而不是丢弃日志。测试套完成或取消时调用 ``flush`` 确保该执行的日志已全部落库。
+    """
+
+    def __init__(
+        self,
+        store: StoreFunc,
+        on_stored: Optional[StoredFunc] = None,
+        flush_interval: float = 0.2,
+        max_lines: int = 500,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        初始化日志写入缓冲
+
+        Args:
+            store: 写入函数，在线程池中执行
+            on_stored: 写入完成回调（如推送给前端）
+            flush_interval: 定时写入间隔（秒）
+            max_lines: 单个执行积累多少行时立即写入
+            max_bytes: 缓冲的最大字节数
+        """
+        self._store = store
+        self._on_stored = on_stored
+        self.flush_interval = flush_interval
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+
+        self._pending: Dict[BufferKey, _PendingLog] = {}
+        self._pending_bytes = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self._flushed_lines = 0
+        self._flush_count = 0
+        self._last_flush_duration = 0.0
+        self._last_flush_lag = 0.0
+        self._backpressure_waits = 0
+        self._errors = 0
+        self._dropped_lines = 0
+
+    async def add(self, suite_id: str, execution_id: Optional[str], lines: List[str], timestamp: datetime) -> None:
+        """
+        添加日志行（通常立即返回，缓冲已满时等待写入腾出空间）
+
+        Args:
+            suite_id: 测试套ID
+            execution_id: 执行ID
+            lines: 日志行
+            timestamp: 最后一行的时间
+        """
+        if not lines:
+            return
+        self._ensure_started()
+
+        size = sum(len(line) + 1 for line in lines)
+        if self._pending_bytes + size > self.max_bytes and self._pending_bytes > 0:
+            self._backpressure_waits += 1
+            logger.warning(f"[LogIngestion] 日志缓冲已满（{self._pending_bytes} 字节），等待写入数据库")
+            while self._pending_bytes + size > self.max_bytes and self._pending_bytes > 0:
+                self._drained.clear()
+                self._wakeup.set()
+                await self._drained.wait()
+
+        key = (suite_id, execution_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _PendingLog()
+        pending.lines.extend(lines)
+        pending.bytes += size
+        pending.timestamp = timestamp
+        self._pending_bytes += size
+
+        if len(pending.lines) >= self.max_lines:
+            self._wakeup.set()
+
+    async def flush(self, suite_id: Optional[str] = None, execution_id: Optional[str] = None) -> None:
+        """
+        立即写入缓冲中的日志
+
+        Args:
+            suite_id: 只写入该测试套的日志，为空时写入全部
+            execution_id: 只写入该执行的日志（需同时指定suite_id）
+        """
+        if suite_id is None:
+            keys = None
+        elif execution_id is None:
+            keys = [key for key in self._pending if key[0] == suite_id]
+        else:
+            keys = [(suite_id, execution_id)]
+        await self._flush(keys)
+
+    async def close(self) -> None:
+        """停止后台任务并写入剩余日志"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓冲统计
+
+        Returns:
+            pending_lines, pending_bytes, pending_executions, lag_seconds（最早未写入日志的等待时间）,
+            last_flush_lag_seconds, last_flush_duration_seconds, flushed_lines, flush_count,
+            backpressure_waits, errors, dropped_lines
+        """
+        now = time.monotonic()
+        oldest = min((pending.since for pending in self._pending.values()), default=now)
+        return {
+            "pending_lines": sum(len(pending.lines) for pending in self._pending.values()),
+            "pending_bytes": self._pending_bytes,
+            "pending_executions": len(self._pending),
+            "lag_seconds": round(now - oldest, 3),
+            "last_flush_lag_seconds": round(self._last_flush_lag, 3),
+            "last_flush_duration_seconds": round(self._last_flush_duration, 3),
+            "flushed_lines": self._flushed_lines,
+            "flush_count": self._flush_count,
+            "backpressure_waits": self._backpressure_waits,
+            "errors": self._errors,
+            "dropped_lines": self._dropped_lines
+        }
+
+    def _ensure_started(self) -> None:
+        """首次添加日志时启动后台写入任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """后台写入循环"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"[LogIngestion] 写入日志出错: {e}")
+
+    async def _flush(self, keys: Optional[List[BufferKey]]) -> None:
+        """取出指定执行（None表示全部）的缓冲日志并写入数据库，各执行并行写入"""
+        async with self._flush_lock:
+            batch: List[Tuple[BufferKey, _PendingLog]] = []
+            for key in (list(self._pending) if keys is None else keys):
+                pending = self._pending.pop(key, None)
+                if pending is not None:
+                    batch.append((key, pending))
+            if not batch:
+                return
+
+            started = time.monotonic()
+            self._last_flush_lag = started - min(pending.since for _, pending in batch)
+            await asyncio.gather(*(self._store_pending(key, pending) for key, pending in batch))
+            self._last_flush_duration = time.monotonic() - started
+            self._flush_count += 1
+            self._drained.set()
+
+    async def _store_pending(self, key: BufferKey, pending: _PendingLog) -> None:
+        """写入一个执行的缓冲日志，失败时放回缓冲等待重试"""
+        suite_id, execution_id = key
+        loop = asyncio.get_event_loop()
+        try:
+            log_data = await loop.run_in_executor(
+                None, self._store, suite_id, execution_id, pending.lines, pending.timestamp
+            )
+        except Exception as e:
+            self._errors += 1
+            pending.attempts += 1
+            if pending.attempts >= MAX_STORE_ATTEMPTS:
+                self._pending_bytes -= pending.bytes
+                self._dropped_lines += len(pending.lines)
+                logger.error(f"[LogIngestion] 写入日志失败，已重试 {pending.attempts} 次，丢弃 {len(pending.lines)} 行: suite_id={suite_id}, execution_id={execution_id}, error={e}")
+                return
+            logger.warning(f"[LogIngestion] 写入日志失败，稍后重试: suite_id={suite_id}, execution_id={execution_id}, error={e}")
+            # 放回缓冲头部，保持行顺序
+            newer = self._pending.pop(key, None)
+            if newer is not None:
+                pending.lines.extend(newer.lines)
+                pending.bytes += newer.bytes
+                pending.timestamp = newer.timestamp
+            self._pending[key] = pending
+            return
+
+        self._pending_bytes -= pending.bytes
+        self._flushed_lines += len(pending.lines)
+        if log_data is not None and self._on_stored:
+            try:
+                await self._on_stored(suite_id, log_data)
+            except Exception as e:
+                logger.error(f"[LogIngestion] 推送日志失败: {e}")
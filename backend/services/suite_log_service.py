@@ -0,0 +1,316 @@
+"""测试套日志服务 - 日志以只追加的分段存储，读取时按需拼接"""
+import re
+from datetime import datetime
+from typing import Optional, List, Iterator, Dict, Any
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.test_suite import TestSuiteLog, TestSuiteLogSegment
+from utils.serializer import serialize_model
+
+
+# 单个分段的最大字符数（MySQL TEXT上限65535字节，utf8mb4每字符最多4字节）
+SEGMENT_MAX_CHARS = 16000
+
+# 日志行前缀时间戳：[YYYY-MM-DD HH:mm:ss.SSS]
+LINE_TIMESTAMP_PATTERN = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\]')
+
+
+def parse_line_timestamp(line: str) -> Optional[datetime]:
+    """
+    解析日志行前缀中的时间戳
+
+    Args:
+        line: 日志行
+
+    Returns:
+        时间戳，没有前缀时返回None
+    """
+    match = LINE_TIMESTAMP_PATTERN.match(line)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S.%f")
+    except ValueError:
+        return None
+
+
+def _chunk_lines(lines: List[str]) -> Iterator[List[str]]:
+    """按SEGMENT_MAX_CHARS把行拆分为多个分段（超长的单行会被截断）"""
+    chunk: List[str] = []
+    size = 0
+    for line in lines:
+        if len(line) > SEGMENT_MAX_CHARS:
+            line = line[:SEGMENT_MAX_CHARS - 16] + " ...[已截断]"
+        if chunk and size + len(line) + 1 > SEGMENT_MAX_CHARS:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield chunk
+
+
+class SuiteLogService:
+    """测试套日志服务类
+
+    每次执行对应一条 ``TestSuiteLog`` 记录（头部：行数、分段数、首末行时间、耗时等），
+    日志内容按批次写入 ``TestSuiteLogSegment``，分段写入后不再修改，
+    因此追加日志的开销与已有日志长度无关。
+    迁移前的旧记录内容仍在 ``TestSuiteLog.message`` 中，读取时作为第0段兼容处理。
+    """
+
+    @staticmethod
+    def get_or_create_log(
+        db: Session,
+        suite_id: str,
+        execution_id: Optional[str],
+        timestamp: datetime
+    ) -> TestSuiteLog:
+        """
+        获取执行对应的日志记录，不存在时创建（未提交）
+
+        没有execution_id时总是创建新记录。
+
+        Args:
+            db: 数据库会话
+            suite_id: 测试套ID
+            execution_id: 执行ID
+            timestamp: 日志时间
+
+        Returns:
+            日志记录
+        """
+        if execution_id:
+            log_entry = db.query(TestSuiteLog).filter(
+                TestSuiteLog.suite_id == suite_id,
+                TestSuiteLog.execution_id == execution_id
+            ).first()
+            if log_entry:
+                return log_entry
+
+            # 序号：该测试套的最大序号+1
+            max_sequence = db.query(func.max(TestSuiteLog.sequence_number)).filter(
+                TestSuiteLog.suite_id == suite_id,
+            ).scalar() or 0
+            sequence_number = max_sequence + 1
+        else:
+            sequence_number = None
+
+        log_entry = TestSuiteLog(
+            suite_id=suite_id,
+            execution_id=execution_id,
+            sequence_number=sequence_number,
+            message="",
+            line_count=0,
+            segment_count=0,
+            timestamp=timestamp
+        )
+        db.add(log_entry)
+        db.flush()
+        return log_entry
+
+    @staticmethod
+    def append_lines(
+        db: Session,
+        log_entry: TestSuiteLog,
+        lines: List[str],
+        timestamp: datetime
+    ) -> List[TestSuiteLogSegment]:
+        """
+        追加一批日志行（写入新分段并更新头部的行数、分段数和首末行时间，未提交）
+
+        Args:
+            db: 数据库会话
+            log_entry: 日志记录
+            lines: 日志行
+            timestamp: 本批日志的时间（行没有时间戳前缀时使用）
+
+        Returns:
+            新写入的分段
+        """
+        if not log_entry.segment_count and log_entry.message:
+            # 未迁移的旧记录，先把原有内容转为分段，保证行号连续
+            lines = log_entry.message.split("\n") + list(lines)
+            log_entry.message = ""
+
+        fallback = timestamp.replace(tzinfo=None) if timestamp else None
+        segments = []
+        for chunk in _chunk_lines(lines):
+            first_ts = parse_line_timestamp(chunk[0]) or fallback
+            last_ts = parse_line_timestamp(chunk[-1]) or fallback
+            segment = TestSuiteLogSegment(
+                log_id=log_entry.id,
+                execution_id=log_entry.execution_id,
+                segment_no=log_entry.segment_count or 0,
+                first_line=log_entry.line_count or 0,
+                line_count=len(chunk),
+                message="\n".join(chunk),
+                first_timestamp=first_ts,
+                last_timestamp=last_ts
+            )
+            db.add(segment)
+            segments.append(segment)
+            log_entry.segment_count = (log_entry.segment_count or 0) + 1
+            log_entry.line_count = (log_entry.line_count or 0) + len(chunk)
+            if log_entry.first_timestamp is None:
+                log_entry.first_timestamp = first_ts
+            if last_ts is not None:
+                log_entry.last_timestamp = last_ts
+        if timestamp:
+            log_entry.timestamp = timestamp
+        return segments
+
+    @staticmethod
+    def iter_segments(
+        db: Session,
+        log_entry: TestSuiteLog,
+        from_line: int = 0,
+        batch_size: int = 100
+    ) -> Iterator[TestSuiteLogSegment]:
+        """
+        按顺序逐批读取分段（不会一次性加载全部日志）
+
+        Args:
+            db: 数据库会话
+            log_entry: 日志记录
+            from_line: 起始行号，只返回包含该行及之后行的分段
+            batch_size: 每次从数据库读取的分段数
+
+        Yields:
+            分段
+        """
+        query = db.query(TestSuiteLogSegment).filter(
+            TestSuiteLogSegment.log_id == log_entry.id
+        )
+        if from_line > 0:
+            query = query.filter(
+                TestSuiteLogSegment.first_line + TestSuiteLogSegment.line_count > from_line
+            )
+        yield from query.order_by(TestSuiteLogSegment.segment_no.asc()).yield_per(batch_size)
+
+    @staticmethod
+    def iter_lines(
+        db: Session,
+        log_entry: TestSuiteLog,
+        from_line: int = 0
+    ) -> Iterator[str]:
+        """
+        按顺序逐行读取日志
+
+        Args:
+            db: 数据库会话
+            log_entry: 日志记录
+            from_line: 起始行号（从0开始）
+
+        Yields:
+            日志行
+        """
+        if not log_entry.segment_count and log_entry.message:
+            # 未迁移的旧记录
+            yield from log_entry.message.split("\n")[from_line:]
+            return
+
+        for segment in SuiteLogService.iter_segments(db, log_entry, from_line):
+            lines = segment.message.split("\n")
+            yield from lines[max(0, from_line - segment.first_line):]
+
+    @staticmethod
+    def get_log_text(db: Session, log_entry: TestSuiteLog, from_line: int = 0) -> str:
+        """
+        拼接日志全文
+
+        Args:
+            db: 数据库会话
+            log_entry: 日志记录
+            from_line: 起始行号（从0开始）
+
+        Returns:
+            日志内容（多行，用换行符分隔）
+        """
+        return "\n".join(SuiteLogService.iter_lines(db, log_entry, from_line))
+
+    @staticmethod
+    def serialize_log(db: Session, log_entry: TestSuiteLog) -> Dict[str, Any]:
+        """序列化日志记录，message为拼接后的全文，lineCount为实际返回的行数（作为前端续传游标）"""
+        data = serialize_model(log_entry, camel_case=True)
+        lines = list(SuiteLogService.iter_lines(db, log_entry))
+        data["message"] = "\n".join(lines)
+        data["lineCount"] = len(lines)
+        return data
+
+    @staticmethod
+    def get_duration(log_entry: TestSuiteLog) -> Optional[str]:
+        """
+        计算执行耗时（最后一行时间 - 第一行时间）
+
+        Args:
+            log_entry: 日志记录
+
+        Returns:
+            耗时（H:MM:SS.ss），无法计算时返回None
+        """
+        duration_seconds = 0
+        if log_entry.first_timestamp and log_entry.last_timestamp:
+            duration_seconds = (log_entry.last_timestamp - log_entry.first_timestamp).total_seconds()
+        elif log_entry.created_at and log_entry.timestamp:
+            # 未迁移的旧记录没有首末行时间，使用created_at和timestamp的差值作为备选
+            try:
+                duration_seconds = (log_entry.timestamp - log_entry.created_at).total_seconds()
+            except TypeError:
+                duration_seconds = 0
+        if duration_seconds <= 0:
+            return None
+
+        hours = int(duration_seconds // 3600)
+        minutes = int((duration_seconds % 3600) // 60)
+        seconds = duration_seconds % 60
+        return f"{hours}:{minutes:02d}:{seconds:05.2f}"
+
+    @staticmethod
+    def execution_log_contains(db: Session, suite_id: str, execution_id: str, keyword: str) -> bool:
+        """
+        判断某次执行的日志是否包含关键字（同时检查分段和未迁移的旧记录）
+
+        Args:
+            db: 数据库会话
+            suite_id: 测试套ID
+            execution_id: 执行ID
+            keyword: 关键字
+
+        Returns:
+            是否包含
+        """
+        pattern = f"%{keyword}%"
+        segment = db.query(TestSuiteLogSegment.id).join(
+            TestSuiteLog, TestSuiteLogSegment.log_id == TestSuiteLog.id
+        ).filter(
+            TestSuiteLog.suite_id == suite_id,
+            TestSuiteLogSegment.execution_id == execution_id,
+            TestSuiteLogSegment.message.like(pattern)
+        ).first()
+        if segment:
+            return True
+        legacy = db.query(TestSuiteLog.id).filter(
+            TestSuiteLog.suite_id == suite_id,
+            TestSuiteLog.execution_id == execution_id,
+            TestSuiteLog.message.like(pattern)
+        ).first()
+        return legacy is not None
+
+    @staticmethod
+    def delete_segments(db: Session, log_ids: List[str]) -> int:
+        """
+        删除日志记录的所有分段（未提交）
+
+        Args:
+            db: 数据库会话
+            log_ids: 日志记录ID
+
+        Returns:
+            删除的分段数
+        """
+        if not log_ids:
+            return 0
+        return db.query(TestSuiteLogSegment).filter(
+            TestSuiteLogSegment.log_id.in_(log_ids)
+        ).delete(synchronize_session=False)
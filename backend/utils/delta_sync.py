@@ -0,0 +1,171 @@
+"""增量同步工具 - 根据Agent返回的块签名计算rsync风格的增量
+
+校验和算法必须与Agent端 agent/delta_sync.py 保持一致。
+"""
+import base64
+import hashlib
+from itertools import accumulate
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def weak_checksum(block: bytes) -> int:
+    """
+    计算弱校验和（rsync滚动校验和：a为字节和，b为前缀和之和，各取低16位）
+
+    Args:
+        block: 数据块
+
+    Returns:
+        32位弱校验和
+    """
+    a = sum(block) & 0xFFFF
+    b = sum(accumulate(block)) & 0xFFFF
+    return a | (b << 16)
+
+
+def strong_checksum(block: bytes) -> str:
+    """计算强校验和（MD5前16位十六进制，仅用于确认弱校验和命中）"""
+    return hashlib.md5(block).hexdigest()[:16]
+
+
+# 逐字节滚动查找在Python中很慢（约每字节1微秒），以下限制保证完全变化的大文件也只需有限的CPU时间
+ROLLING_RUN_BLOCKS = 4                  # 单次滚动查找最多连续未命中的块数
+ROLLING_RUN_MIN_BYTES = 64 * 1024       # 单次滚动查找的最小范围
+ROLLING_RETRY_BLOCKS = 64               # 滚动查找未命中后，先按块对齐探测这么多块再重新滚动
+ROLLING_BYTES_LIMIT = 2 * 1024 * 1024   # 单个文件逐字节滚动的总字节数上限，超过后只做块对齐探测
+
+
+def compute_delta(data: bytes, signature: Dict[str, Any]) -> List[List[Any]]:
+    """
+    计算新内容相对于Agent端原文件的增量
+
+    先在当前位置按块对齐直接比较强校验和（命中时连续复制，开销接近计算一遍MD5），
+    未命中时才逐字节滑动窗口计算滚动校验和查找错位的块。滚动查找有范围和总量限制：
+    连续未命中超过限制后改为按块对齐探测一段再重试，总量用完后只做块对齐探测，
+    因此完全变化的文件基本按字面数据整体发送。命中的块输出copy操作（相邻的会合并），
+    其余部分作为字面数据输出。
+
+    Args:
+        data: 新文件内容
+        signature: Agent返回的原文件签名（block_size, blocks）
+
+    Returns:
+        操作列表：["copy", 起始块序号, 块数] 或 ["data", 原始字节]
+    """
+    block_size = signature.get("block_size") or 0
+    blocks = signature.get("blocks") or []
+    if not block_size or not blocks or len(data) < block_size:
+        return [["data", data]] if data else []
+
+    # 弱校验和 -> {强校验和: 块序号}；强校验和 -> 块序号
+    weak_table: Dict[int, Dict[str, int]] = {}
+    strong_table: Dict[str, int] = {}
+    for index, (weak, strong) in enumerate(blocks):
+        weak_table.setdefault(weak, {}).setdefault(strong, index)
+        strong_table.setdefault(strong, index)
+
+    ops: List[List[Any]] = []
+    size = len(data)
+    run_limit = max(ROLLING_RUN_BLOCKS * block_size, ROLLING_RUN_MIN_BYTES)
+    rolling_budget = ROLLING_BYTES_LIMIT
+    probe_until = 0  # 该位置之前只做块对齐探测
+    literal_start = 0
+    pos = 0
+
+    while pos + block_size <= size:
+        index = strong_table.get(strong_checksum(data[pos:pos + block_size]))
+        if index is None:
+            if pos < probe_until or rolling_budget <= 0:
+                pos += block_size
+                continue
+            start = pos
+            pos, index = _roll(data, pos, block_size, weak_table, min(run_limit, rolling_budget))
+            rolling_budget -= pos - start
+            if index is None:
+                probe_until = pos + ROLLING_RETRY_BLOCKS * block_size
+                continue
+
+        if literal_start < pos:
+            ops.append(["data", data[literal_start:pos]])
+        last = ops[-1] if ops else None
+        if last and last[0] == "copy" and last[1] + last[2] == index:
+            last[2] += 1
+        else:
+            ops.append(["copy", index, 1])
+        pos += block_size
+        literal_start = pos
+
+    if literal_start < size:
+        ops.append(["data", data[literal_start:]])
+    return ops
+
+
+def _roll(
+    data: bytes,
+    start: int,
+    block_size: int,
+    weak_table: Dict[int, Dict[str, int]],
+    limit: int
+) -> Tuple[int, Optional[int]]:
+    """
+    从start的下一个字节开始逐字节滑动窗口，查找与原文件某块相同的位置
+
+    Args:
+        data: 新文件内容
+        start: 起始位置（该位置已确认未命中）
+        block_size: 块大小
+        weak_table: 弱校验和 -> {强校验和: 块序号}
+        limit: 最多滑动的字节数
+
+    Returns:
+        (命中位置, 块序号)；未命中时返回(下一个未检查的位置, None)
+    """
+    checksum = weak_checksum(data[start:start + block_size])
+    a, b = checksum & 0xFFFF, checksum >> 16
+    end = min(start + limit, len(data) - block_size)
+    pos = start
+    while pos < end:
+        # 窗口后移一个字节
+        out_byte = data[pos]
+        in_byte = data[pos + block_size]
+        a = (a - out_byte + in_byte) & 0xFFFF
+        b = (b - block_size * out_byte + a) & 0xFFFF
+        pos += 1
+        candidates = weak_table.get(a | (b << 16))
+        if candidates:
+            index = candidates.get(strong_checksum(data[pos:pos + block_size]))
+            if index is not None:
+                return pos, index
+    return pos + 1, None
+
+
+def split_delta(ops: List[List[Any]], max_literal_bytes: int) -> List[Tuple[List[List[Any]], int]]:
+    """
+    将增量拆分为多个部分，每部分字面数据不超过max_literal_bytes，字面数据编码为base64
+
+    Args:
+        ops: compute_delta返回的操作列表
+        max_literal_bytes: 每部分字面数据的最大字节数
+
+    Returns:
+        [(操作列表, 该部分字面数据字节数)]，至少包含一个部分
+    """
+    parts: List[Tuple[List[List[Any]], int]] = []
+    current: List[List[Any]] = []
+    current_bytes = 0
+    for op in ops:
+        if op[0] != "data":
+            current.append(op)
+            continue
+        literal = op[1]
+        offset = 0
+        while offset < len(literal):
+            if current_bytes >= max_literal_bytes:
+                parts.append((current, current_bytes))
+                current, current_bytes = [], 0
+            piece = literal[offset:offset + max_literal_bytes - current_bytes]
+            current.append(["data", base64.b64encode(piece).decode("ascii")])
+            current_bytes += len(piece)
+            offset += len(piece)
+    parts.append((current, current_bytes))
+    return parts
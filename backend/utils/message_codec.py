@@ -0,0 +1,143 @@
+"""Agent消息编解码工具（JSON/msgpack）"""
+import json
+import struct
+from typing import Dict, Any, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack为可选依赖，未安装时只使用JSON
+    msgpack = None
+
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+# 文件传输数据块使用独立的二进制帧（与协商的编码无关）：
+# 魔数(4字节) + 头部长度(2字节) + JSON头部{request_id, index, offset} + 原始数据
+CHUNK_MESSAGE_TYPE = "workspace_stream_chunk"
+CHUNK_FRAME_MAGIC = b"ATSC"
+_CHUNK_PREFIX = struct.Struct("!4sH")
+
+
+def supported_encodings(allow_binary: bool = True) -> List[str]:
+    """
+    本端支持的编码（按优先顺序）
+
+    Args:
+        allow_binary: 是否允许二进制编码
+
+    Returns:
+        编码名称列表
+    """
+    if allow_binary and msgpack is not None:
+        return [ENCODING_MSGPACK, ENCODING_JSON]
+    return [ENCODING_JSON]
+
+
+def select_encoding(offered: Optional[str]) -> str:
+    """
+    从对端提供的编码列表中选择双方都支持的编码
+
+    Args:
+        offered: 逗号分隔的编码列表（按对端优先顺序），为空表示只支持JSON
+
+    Returns:
+        选中的编码名称
+    """
+    supported = supported_encodings()
+    for name in (offered or "").split(","):
+        name = name.strip().lower()
+        if name in supported:
+            return name
+    return ENCODING_JSON
+
+
+def encode_message(message: Dict[str, Any], encoding: str = ENCODING_JSON) -> Union[str, bytes]:
+    """
+    编码消息
+
+    Args:
+        message: 消息字典
+        encoding: 编码名称
+
+    Returns:
+        JSON编码返回文本帧内容，msgpack编码返回二进制帧内容
+    """
+    if message.get("type") == CHUNK_MESSAGE_TYPE:
+        return encode_chunk_frame(message)
+    if encoding == ENCODING_MSGPACK and msgpack is not None:
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    return json.dumps(message, ensure_ascii=False)
+
+
+def decode_message(frame: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    解码消息（按帧类型判断编码：二进制帧为msgpack，文本帧为JSON）
+
+    Args:
+        frame: WebSocket帧内容
+
+    Returns:
+        消息字典
+
+    Raises:
+        ValueError: 内容无法解码
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        if frame[:4] == CHUNK_FRAME_MAGIC:
+            return decode_chunk_frame(frame)
+        if msgpack is None:
+            raise ValueError("收到二进制消息，但未安装msgpack")
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except Exception as e:
+            raise ValueError(f"msgpack解码失败: {e}") from e
+    return json.loads(frame)
+
+
+def encode_chunk_frame(message: Dict[str, Any]) -> bytes:
+    """
+    编码文件传输数据块
+
+    Args:
+        message: 数据块消息，包含request_id、index、offset和data（bytes）
+
+    Returns:
+        二进制帧内容
+    """
+    header = json.dumps({
+        "request_id": message["request_id"],
+        "index": message["index"],
+        "offset": message.get("offset", 0)
+    }).encode("utf-8")
+    return _CHUNK_PREFIX.pack(CHUNK_FRAME_MAGIC, len(header)) + header + bytes(message["data"])
+
+
+def decode_chunk_frame(frame: Union[bytes, bytearray]) -> Dict[str, Any]:
+    """
+    解码文件传输数据块
+
+    Args:
+        frame: 二进制帧内容
+
+    Returns:
+        数据块消息（type为workspace_stream_chunk，data为bytes）
+
+    Raises:
+        ValueError: 帧格式错误
+    """
+    if len(frame) < _CHUNK_PREFIX.size:
+        raise ValueError("数据块帧长度不足")
+    _, header_size = _CHUNK_PREFIX.unpack_from(frame)
+    header_end = _CHUNK_PREFIX.size + header_size
+    try:
+        header = json.loads(bytes(frame[_CHUNK_PREFIX.size:header_end]).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"数据块头部解析失败: {e}") from e
+    return {
+        "type": CHUNK_MESSAGE_TYPE,
+        "request_id": header.get("request_id"),
+        "index": header.get("index"),
+        "offset": header.get("offset", 0),
+        "data": bytes(frame[header_end:])
+    }
@@ -90,6 +90,21 @@ export const environmentApi = {
     })
     return response || { content: '', encoding: 'utf-8', size: 0 }
   },
+  // 流式下载工作空间文件（不限文件大小）
+  downloadWorkspaceFile: async (id: string, path: string): Promise<Blob> => {
+    const response = await apiClient.getInstance().get(
+      `environments/${id}/workspace/download`,
+      { params: { path }, responseType: 'blob' }
+    )
+    return response.data
+  },
+  // 流式上传工作空间文件（请求体为文件原始内容）
+  uploadWorkspaceFile: async (id: string, path: string, file: Blob): Promise<{ size: number; path: string }> => {
+    return apiClient.put(`/environments/${id}/workspace/upload`, file, {
+      params: { path },
+      headers: { 'Content-Type': 'application/octet-stream' }
+    })
+  },
   deleteWorkspaceFile: async (id: string, path: string): Promise<void> => {
     await apiClient.post(`/environments/${id}/workspace/delete`, null, {
       params: { path }
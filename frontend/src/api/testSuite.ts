@@ -110,7 +110,7 @@ export const testSuiteApi = {
   },
 
   // 获取测试套日志
-  getSuiteLogs: async (suiteId: string, params?: { skip?: number; limit?: number; executionId?: string; logId?: string }): Promise<PaginationResponse<{ id: string; level?: string; message: string; timestamp: string; createdAt: string; execution_id?: string }>> => {
+  getSuiteLogs: async (suiteId: string, params?: { skip?: number; limit?: number; executionId?: string; logId?: string }): Promise<PaginationResponse<{ id: string; level?: string; message: string; timestamp: string; createdAt: string; execution_id?: string; executionId?: string; sequenceNumber?: number | null; lineCount?: number }>> => {
     const queryParams = new URLSearchParams()
     if (params) {
       Object.entries(params).forEach(([key, value]) => {
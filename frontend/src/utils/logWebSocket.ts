@@ -1,19 +1,29 @@
 import { useUserStore } from '@/stores/user'
 
 export interface LogMessage {
-  type: 'test_suite_log' | 'connected' | 'ping' | 'pong'
+  type: 'test_suite_log' | 'connected' | 'ping' | 'pong' | 'resync'
   suite_id?: string
   data?: {
     id: string
     message: string
     timestamp: string
     execution_id?: string
+    sequence_number?: number | null
+    first_line?: number // 本条消息第一行在该日志记录中的行号（从0开始）
+    line_count?: number
   }
   message?: string
+  reason?: string // resync: 服务端因推送积压断开连接的原因，需重新拉取日志
 }
 
 export type LogMessageHandler = (message: LogMessage) => void
 
+export interface LogCursorSource {
+  id: string
+  sequenceNumber?: number | null
+  lineCount?: number
+}
+
 class LogWebSocketManager {
   private ws: WebSocket | null = null
   private suiteId: string | null = null
@@ -22,6 +32,10 @@ class LogWebSocketManager {
   private maxReconnectAttempts: number = 5
   private reconnectDelay: number = 3000
   private shouldReconnect: boolean = true
+  // 断线续传游标：已接收日志记录的最大序号，以及每条记录已接收到的行号
+  private cursorSuiteId: string | null = null
+  private sequence: number | null = null
+  private cursors: Map<string, number> = new Map()
 
   /**
    * 连接到日志WebSocket
@@ -48,7 +62,12 @@ class LogWebSocketManager {
 
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
     const host = window.location.host
-    const wsUrl = `${protocol}//${host}/ws/client?token=${encodeURIComponent(token)}&suite_id=${suiteId}`
+    let wsUrl = `${protocol}//${host}/ws/client?token=${encodeURIComponent(token)}&suite_id=${suiteId}`
+    if (this.cursorSuiteId === suiteId && this.sequence !== null) {
+      // 带上游标，服务端先回放缺失的日志再推送实时日志
+      const cursors = Array.from(this.cursors.entries()).map(([id, line]) => `${id}:${line}`).join(',')
+      wsUrl += `&sequence=${this.sequence}&cursors=${encodeURIComponent(cursors)}`
+    }
 
     return new Promise((resolve) => {
       try {
@@ -109,6 +128,63 @@ class LogWebSocketManager {
     this.handlers.clear()
   }
 
+  /**
+   * 设置断线续传游标（通过接口加载历史日志后调用，之后随收到的日志自动推进）
+   */
+  setCursors(suiteId: string, logs: LogCursorSource[]) {
+    this.cursorSuiteId = suiteId
+    this.sequence = 0
+    this.cursors = new Map()
+    for (const log of logs) {
+      this.cursors.set(log.id, log.lineCount || 0)
+      if (log.sequenceNumber && log.sequenceNumber > this.sequence) {
+        this.sequence = log.sequenceNumber
+      }
+    }
+  }
+
+  /**
+   * 清除断线续传游标
+   */
+  clearCursors() {
+    this.cursorSuiteId = null
+    this.sequence = null
+    this.cursors = new Map()
+  }
+
+  /**
+   * 按游标裁掉已接收过的行并推进游标，全部行都已接收过时返回null
+   */
+  private applyCursor(message: LogMessage): LogMessage | null {
+    const data = message.data
+    if (message.type !== 'test_suite_log' || !data || data.first_line === undefined || message.suite_id !== this.cursorSuiteId) {
+      return message
+    }
+    const lineCount = data.line_count || 0
+    const end = data.first_line + lineCount
+    const cursor = this.cursors.get(data.id)
+    if (data.sequence_number && this.sequence !== null && data.sequence_number > this.sequence) {
+      this.sequence = data.sequence_number
+    }
+    if (cursor !== undefined && cursor > data.first_line) {
+      if (end <= cursor) {
+        return null
+      }
+      const skip = cursor - data.first_line
+      message = {
+        ...message,
+        data: {
+          ...data,
+          message: data.message.split('\n').slice(skip).join('\n'),
+          first_line: cursor,
+          line_count: lineCount - skip
+        }
+      }
+    }
+    this.cursors.set(data.id, Math.max(end, cursor || 0))
+    return message
+  }
+
   /**
    * 注册消息处理器
    */
@@ -127,6 +203,11 @@ class LogWebSocketManager {
    * 处理消息
    */
   private handleMessage(message: LogMessage) {
+    const applied = this.applyCursor(message)
+    if (!applied) {
+      return
+    }
+    message = applied
     this.handlers.forEach(handler => {
       try {
         handler(message)
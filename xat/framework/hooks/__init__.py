@@ -16,6 +16,7 @@ from framework.hooks.impl import (
     TestTeardownLogHook,
     TestReportHook,
     TestResultCollectorHook,
+    TestBoundaryHook,
     AllureConfigHook,
     AllureTestSetupHook,
     AllureTestTeardownHook,
@@ -61,6 +62,7 @@ def setup_hooks() -> HookRegistry:
     registry.register(test_setup_hook)
     registry.register(test_teardown_hook)
     registry.register(test_result_collector)  # 注册结果收集Hook
+    registry.register(TestBoundaryHook())  # 用例边界Hook（结果流通道）
     registry.register(AllureTestSetupHook())
     registry.register(AllureTestTeardownHook())
     
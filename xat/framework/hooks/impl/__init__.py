@@ -21,6 +21,7 @@ from .test_hooks import (
     TestTeardownLogHook,
     TestReportHook,
     TestResultCollectorHook,
+    TestBoundaryHook,
 )
 from .allure_hooks import (
     AllureConfigHook,
@@ -44,6 +45,7 @@ __all__ = [
     "TestTeardownLogHook",
     "TestReportHook",
     "TestResultCollectorHook",
+    "TestBoundaryHook",
     "AllureConfigHook",
     "AllureTestSetupHook",
     "AllureTestTeardownHook",
@@ -2,6 +2,7 @@
 """Collection类Hook实现"""
 import pytest
 import json
+import os
 from typing import List, Optional
 from pathlib import Path
 from framework.hooks.base import CollectionHook
@@ -111,6 +112,9 @@ class TestCaseFilterHook(CollectionHook):
             Path("test_cases.json"),  # 当前工作目录
             Path(__file__).parent.parent.parent / "test_cases.json",  # xat根目录
         ]
+        # Agent分片执行时通过环境变量为每个工作进程指定各自的用例文件
+        if os.environ.get("ATS_TEST_CASES_FILE"):
+            possible_paths = [Path(os.environ["ATS_TEST_CASES_FILE"])]
         
         for json_file in possible_paths:
             if json_file.exists():
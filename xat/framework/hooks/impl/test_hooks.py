@@ -2,6 +2,8 @@
 """测试用例相关Hook实现"""
 import pytest
 import json
+import os
+import socket
 import time
 import threading
 from typing import Optional
@@ -10,6 +12,80 @@ from framework.hooks.base import TestSetupHook, TestTeardownHook
 from framework.logger import get_logger
 
 
+# Agent导出的结果Socket路径环境变量
+RESULT_SOCKET_ENV = "ATS_RESULT_SOCKET"
+# Agent分片执行时为每个工作进程指定的用例筛选文件和结果文件
+TEST_CASES_FILE_ENV = "ATS_TEST_CASES_FILE"
+RESULTS_FILE_ENV = "ATS_RESULTS_FILE"
+
+
+class ResultChannel:
+    """结果流通道 - 通过Agent提供的Unix Socket逐行发送JSON消息"""
+    
+    def __init__(self, socket_path: Optional[str] = None):
+        self._socket_path = socket_path
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        if socket_path:
+            self._connect()
+    
+    def _connect(self):
+        """连接Agent的结果Socket"""
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self._socket_path)
+            self._sock = sock
+            get_logger().debug(f"[Hook] 已连接结果Socket: {self._socket_path}")
+        except Exception as e:
+            self._sock = None
+            get_logger().warning(f"[Hook] 连接结果Socket失败，回退到结果文件: {e}")
+    
+    @property
+    def connected(self) -> bool:
+        """是否已连接"""
+        return self._sock is not None
+    
+    def send(self, message: dict) -> bool:
+        """
+        发送一条消息（单行JSON）
+        
+        Returns:
+            是否发送成功，失败后通道关闭，调用方应回退到结果文件
+        """
+        if self._sock is None:
+            return False
+        
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                self._sock.sendall(data)
+                return True
+            except Exception as e:
+                get_logger().warning(f"[Hook] 发送结果消息失败，回退到结果文件: {e}")
+                self.close()
+                return False
+    
+    def close(self):
+        """关闭通道"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+_result_channel: Optional[ResultChannel] = None
+
+
+def get_result_channel() -> ResultChannel:
+    """获取全局结果流通道（未设置环境变量时为未连接状态）"""
+    global _result_channel
+    if _result_channel is None:
+        _result_channel = ResultChannel(os.environ.get(RESULT_SOCKET_ENV))
+    return _result_channel
+
+
 class TestSetupLogHook(TestSetupHook):
     """测试用例开始日志Hook"""
     
@@ -72,6 +148,24 @@ class TestTeardownLogHook(TestTeardownHook):
         logger.log_test_end(test_name, status="COMPLETED", duration=duration)
 
 
+class TestBoundaryHook(TestSetupHook):
+    """测试用例边界Hook - 通过结果流通道通知Agent用例开始"""
+    
+    def __init__(self):
+        super().__init__("TestBoundary")
+    
+    def execute(self, item: pytest.Item) -> None:
+        """发送用例开始事件"""
+        if not self.enabled:
+            return
+        
+        get_result_channel().send({
+            "type": "test_start",
+            "test_name": item.nodeid,
+            "timestamp": time.time()
+        })
+
+
 class TestReportHook(TestTeardownHook):
     """测试报告Hook - 记录测试结果"""
     
@@ -96,15 +190,29 @@ class TestReportHook(TestTeardownHook):
 
 
 class TestResultCollectorHook(TestReportHook):
-    """测试结果收集Hook - 增量收集测试结果并写入JSON文件"""
+    """测试结果收集Hook - 增量收集测试结果并追加写入JSONL文件"""
     
     def __init__(self):
         super().__init__()
         self._case_ids_map: dict = {}  # case_code -> case_id
         self._result_file: Optional[Path] = None
+        self._result_fd: Optional[int] = None  # 结果文件描述符（O_APPEND）
         self._file_lock = threading.Lock()  # 文件写入锁
         self._load_case_ids_map()
-        self._init_result_file()
+        # 存在结果流通道时结果直接发送给Agent，结果文件仅在通道不可用时使用
+        if not get_result_channel().connected:
+            self._init_result_file()
+    
+    def execute(self, item: pytest.Item) -> None:
+        """用例teardown结束后发送用例结束事件"""
+        if not self.enabled:
+            return
+        
+        get_result_channel().send({
+            "type": "test_end",
+            "test_name": item.nodeid,
+            "timestamp": time.time()
+        })
     
     def _load_case_ids_map(self):
         """从test_cases.json文件加载case_code到case_id的映射"""
@@ -112,6 +220,8 @@ class TestResultCollectorHook(TestReportHook):
             Path("test_cases.json"),
             Path(__file__).parent.parent.parent / "test_cases.json",
         ]
+        if os.environ.get(TEST_CASES_FILE_ENV):
+            possible_paths = [Path(os.environ[TEST_CASES_FILE_ENV])]
         
         for json_file in possible_paths:
             if json_file.exists():
@@ -132,18 +242,20 @@ class TestResultCollectorHook(TestReportHook):
                     logger.warning(f"[Hook] {self.name}: 读取用例映射失败: {e}")
     
     def _init_result_file(self):
-        """初始化结果文件（创建空JSON数组）"""
+        """初始化结果文件（创建空的JSONL文件，每行一条结果）"""
         possible_paths = [
-            Path("test_results.json"),
-            Path(__file__).parent.parent.parent / "test_results.json",
+            Path("test_results.jsonl"),
+            Path(__file__).parent.parent.parent / "test_results.jsonl",
         ]
+        if os.environ.get(RESULTS_FILE_ENV):
+            possible_paths = [Path(os.environ[RESULTS_FILE_ENV])]
         
         for result_file in possible_paths:
             try:
-                # 创建空JSON数组文件
-                with open(result_file, 'w', encoding='utf-8') as f:
-                    json.dump([], f, ensure_ascii=False, indent=2)
+                # 截断/创建文件，之后以O_APPEND方式追加
+                fd = os.open(str(result_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
                 self._result_file = result_file
+                self._result_fd = fd
                 logger = get_logger()
                 logger.debug(f"[Hook] {self.name}: 初始化结果文件: {result_file}")
                 break
@@ -197,38 +309,29 @@ class TestResultCollectorHook(TestReportHook):
             "timestamp": time.time()  # 添加时间戳
         }
         
-        # 立即写入文件（增量追加）
-        self._append_result_to_file(result_data)
+        # 优先通过结果流通道发送，失败时写入文件（增量追加）
+        if not get_result_channel().send({"type": "result", **result_data}):
+            self._append_result_to_file(result_data)
     
     def _append_result_to_file(self, result_data: dict):
-        """将结果追加到JSON数组文件"""
-        if not self._result_file:
-            return
+        """将结果作为一行追加到JSONL文件
+        
+        每条结果编码为单行后通过一次os.write写入O_APPEND文件，
+        读取方不会看到交错的半行，也无需重写已有内容。
+        """
+        if self._result_fd is None:
+            # 结果流通道中途断开时才需要初始化结果文件
+            self._init_result_file()
+            if self._result_fd is None:
+                return
         
         try:
+            line = (json.dumps(result_data, ensure_ascii=False) + "\n").encode("utf-8")
             with self._file_lock:
-                # 读取现有结果数组
-                results = []
-                if self._result_file.exists():
-                    try:
-                        with open(self._result_file, 'r', encoding='utf-8') as f:
-                            results = json.load(f)
-                            if not isinstance(results, list):
-                                results = []
-                    except (json.JSONDecodeError, IOError):
-                        results = []
-                
-                # 追加新结果
-                results.append(result_data)
-                
-                # 写回整个数组
-                with open(self._result_file, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
-                    f.flush()  # 立即刷新到磁盘
+                os.write(self._result_fd, line)
             
             logger = get_logger()
             logger.debug(f"[Hook] {self.name}: 已追加测试结果: {result_data.get('test_name')}")
         except Exception as e:
             logger = get_logger()
             logger.error(f"[Hook] {self.name}: 写入测试结果失败: {e}")
-